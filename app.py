@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request, redirect
+from flask import Flask, jsonify, request, redirect, Response, stream_with_context, has_request_context, g, make_response
 import sqlite3
 import os
 from dotenv import load_dotenv
@@ -13,7 +13,28 @@ import requests
 import secrets
 import base64
 import urllib.parse
-from cryptography.fernet import Fernet
+import re
+import hmac
+import random
+import threading
+import mmap
+import mimetypes
+import time
+import unicodedata
+import atexit
+import csv
+import io
+import functools
+import gzip
+import shutil
+import struct
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # admission control needs flock (Linux/macOS); disabled elsewhere
 
 app = Flask(__name__)
 
@@ -23,6 +44,9 @@ DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', '
 # Ensure instance directory exists
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
+# Bump whenever init_database() changes: create_app() only runs it when PRAGMA user_version is older
+SCHEMA_VERSION = 4
+
 # API key from environment
 VALID_API_KEY = os.environ.get('API_KEY')
 if not VALID_API_KEY:
@@ -35,9 +59,14 @@ ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY')
 if not ENCRYPTION_KEY:
     print("WARNING: No ENCRYPTION_KEY found in environment. Please set it in .env file.")
     print("Generate one with: python -c \"from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())\"")
-    # Use a default for testing only - NEVER use in production
-    ENCRYPTION_KEY = Fernet.generate_key().decode()
-fernet = Fernet(ENCRYPTION_KEY.encode() if isinstance(ENCRYPTION_KEY, str) else ENCRYPTION_KEY)
+    # Use a default for testing only - NEVER use in production (same format as Fernet.generate_key())
+    ENCRYPTION_KEY = base64.urlsafe_b64encode(os.urandom(32)).decode()
+
+@functools.lru_cache(maxsize=None)
+def get_fernet():
+    """Fernet cipher for stored tokens, built on first use"""
+    from cryptography.fernet import Fernet
+    return Fernet(ENCRYPTION_KEY.encode() if isinstance(ENCRYPTION_KEY, str) else ENCRYPTION_KEY)
 
 # Twitter API credentials
 TWITTER_CLIENT_ID = os.environ.get('TWITTER_CLIENT_ID')
@@ -59,9 +88,314 @@ MOCK_TWITTER_POSTING = False
 # Allow runtime toggle
 mock_mode_override = {'enabled': False}
 
+# Duplicate content policy: reject, warn or allow
+DUPLICATE_POLICY = os.environ.get('DUPLICATE_POLICY', 'reject').lower()
+if DUPLICATE_POLICY not in ('reject', 'warn', 'allow'):
+    print(f"WARNING: Unknown DUPLICATE_POLICY '{DUPLICATE_POLICY}', using 'reject'")
+    DUPLICATE_POLICY = 'reject'
+# Identical content is allowed again after this many days (0 = never)
+DUPLICATE_WINDOW_DAYS = int(os.environ.get('DUPLICATE_WINDOW_DAYS', '0'))
+
+# Tweet length limits (Twitter weighted counting, see validate_tweet_text)
+TWEET_MAX_WEIGHTED_LENGTH = int(os.environ.get('TWEET_MAX_WEIGHTED_LENGTH', '280'))
+TWEET_URL_LENGTH = 23
+BULK_TWEET_LIMIT = int(os.environ.get('BULK_TWEET_LIMIT', '1000'))
+
+# Dispatch scheduling defaults for post-pending (0 = no per-account cap)
+DISPATCH_BATCH_SIZE = int(os.environ.get('DISPATCH_BATCH_SIZE', '100'))
+DISPATCH_ACCOUNT_CAP = int(os.environ.get('DISPATCH_ACCOUNT_CAP', '0'))
+
+# Last account served per priority lane, so consecutive runs rotate through accounts
+dispatch_rotation = {}
+
+# Concurrent posts per broadcast
+BROADCAST_MAX_WORKERS = int(os.environ.get('BROADCAST_MAX_WORKERS', '16'))
+
+# Media storage and chunked upload settings
+MEDIA_DIR = os.path.join(os.path.dirname(DB_PATH), 'media')
+MEDIA_CHUNK_SIZE = int(os.environ.get('MEDIA_CHUNK_SIZE', str(4 * 1024 * 1024)))
+MEDIA_MAX_BYTES = int(os.environ.get('MEDIA_MAX_BYTES', str(512 * 1024 * 1024)))
+MEDIA_UPLOAD_WORKERS = int(os.environ.get('MEDIA_UPLOAD_WORKERS', '4'))
+MEDIA_UPLOAD_URL = 'https://api.twitter.com/2/media/upload'
+MAX_MEDIA_PER_TWEET = 4
+
+# Outbound webhooks (durable outbox delivered by a background worker)
+WEBHOOK_EVENTS = ('tweet.posted', 'tweet.failed', 'list.member_added', 'account.token_expired')
+WEBHOOK_WORKER_ENABLED = os.environ.get('WEBHOOK_WORKER_ENABLED', 'true').lower() == 'true'
+WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', '100'))
+WEBHOOK_COALESCE_MS = int(os.environ.get('WEBHOOK_COALESCE_MS', '250'))
+WEBHOOK_POLL_SECONDS = float(os.environ.get('WEBHOOK_POLL_SECONDS', '5'))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', '8'))
+WEBHOOK_BACKOFF_SECONDS = 5
+WEBHOOK_MAX_BACKOFF_SECONDS = 3600
+WEBHOOK_TIMEOUT_SECONDS = 10
+# Rows stuck in "sending" longer than this (e.g. worker killed mid-delivery) are retried
+WEBHOOK_CLAIM_TIMEOUT_SECONDS = 300
+# Delivered events are kept this long (0 = forever); dead ones stay until redelivered or the webhook is deleted
+WEBHOOK_RETENTION_DAYS = int(os.environ.get('WEBHOOK_RETENTION_DAYS', '7'))
+WEBHOOK_PRUNE_INTERVAL_SECONDS = 3600
+
+webhook_wakeup = threading.Event()
+webhook_worker = {'thread': None, 'pruned_at': 0.0}
+
+# Threads posted in parallel by threads/post-pending, and max tweets per thread
+THREAD_MAX_WORKERS = int(os.environ.get('THREAD_MAX_WORKERS', '8'))
+THREAD_MAX_TWEETS = int(os.environ.get('THREAD_MAX_TWEETS', '25'))
+# A thread stuck in "posting" longer than this is considered abandoned and can be resumed
+THREAD_STALE_MINUTES = 10
+
+# Job progress events (append-only NDJSON log shared by all gunicorn workers, streamed over SSE)
+EVENT_LOG_PATH = os.path.join(os.path.dirname(DB_PATH), 'events.ndjson')
+EVENT_LOG_MAX_BYTES = int(os.environ.get('EVENT_LOG_MAX_BYTES', str(16 * 1024 * 1024)))
+# Streams are closed after this long so sync workers are released; clients reconnect with Last-Event-ID.
+# A sync worker streaming a response does not heartbeat, so keep this well below gunicorn's --timeout (120)
+EVENT_STREAM_MAX_SECONDS = int(os.environ.get('EVENT_STREAM_MAX_SECONDS', '60'))
+EVENT_HEARTBEAT_SECONDS = 15
+# How long a stream sleeps before re-checking the log for writes from other processes
+EVENT_POLL_SECONDS = 0.5
+
+event_written = threading.Condition()
+
+# Rows deleted per transaction by tweets/cleanup
+CLEANUP_CHUNK_SIZE = 1000
+
+# Audit log (separate SQLite file so it never bloats the main DB, written by a group-commit buffer)
+AUDIT_DB_PATH = os.path.join(os.path.dirname(DB_PATH), 'audit.db')
+AUDIT_FLUSH_MS = int(os.environ.get('AUDIT_FLUSH_MS', '50'))
+AUDIT_FLUSH_SIZE = int(os.environ.get('AUDIT_FLUSH_SIZE', '200'))
+AUDIT_RETENTION_DAYS = int(os.environ.get('AUDIT_RETENTION_DAYS', '90'))
+# Pruned entries are moved to monthly audit-YYYY-MM.db files here; empty drops them
+AUDIT_ARCHIVE_DIR = os.environ.get('AUDIT_ARCHIVE_DIR', '')
+AUDIT_PRUNE_INTERVAL_SECONDS = 3600
+AUDIT_MAX_BUFFER = 10000
+
+audit_buffer = []
+audit_lock = threading.Lock()
+audit_pending = threading.Event()
+audit_writer = {'thread': None, 'last_prune': 0}
+audit_context = threading.local()
+
+# SQL tracing: X-DB-Queries / X-DB-Time headers (also on in debug mode) and a slow query log (0 = off)
+SQL_TRACE = os.environ.get('SQL_TRACE', 'false').lower() == 'true'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '0'))
+SLOW_QUERY_LOG = os.path.join(os.path.dirname(DB_PATH), 'slow_queries.log')
+
+slow_query_lock = threading.Lock()
+
+# Admission control: max concurrent requests per endpoint class across all workers (0 = unlimited).
+# Keep bulk + single + stream below gunicorn's workers x threads so health checks and reads
+# always find a free worker.
+ADMISSION_LIMITS = {
+    'bulk': int(os.environ.get('ADMISSION_BULK_LIMIT', '1')),
+    'single': int(os.environ.get('ADMISSION_SINGLE_LIMIT', '1')),
+    'stream': int(os.environ.get('ADMISSION_STREAM_LIMIT', '1')),
+    'read': int(os.environ.get('ADMISSION_READ_LIMIT', '0'))
+}
+ADMISSION_RETRY_AFTER = {'bulk': 30, 'single': 5, 'stream': 5, 'read': 1}
+# A full class is re-checked once after this long before shedding (GET /admission probes hold slots briefly)
+ADMISSION_RECHECK_MS = 20
+ADMISSION_DIR = os.path.join(os.path.dirname(DB_PATH), 'admission')
+# bulk is long-running, single calls Twitter, stream holds a worker for the whole SSE stream;
+# other GETs are "read", everything else (local writes) is not limited
+ENDPOINT_CLASSES = {
+    'post_pending_tweets': 'bulk',
+    'broadcast_tweet': 'bulk',
+    'post_pending_threads': 'bulk',
+    'add_list_members': 'bulk',
+    'reconcile_lists': 'bulk',
+    'set_list_members': 'bulk',
+    'cleanup_inactive_accounts': 'bulk',
+    'cleanup_tweets': 'bulk',
+    'delete_tweets_remote': 'bulk',
+    'probe_accounts': 'bulk',
+    'collect_metrics': 'bulk',
+    'import_data': 'bulk',
+    'create_tweets_bulk': 'bulk',
+    'create_backup': 'bulk',
+    'post_tweet': 'single',
+    'post_thread_endpoint': 'single',
+    'delete_tweet': 'single',
+    'create_list': 'single',
+    'update_list': 'single',
+    'delete_list': 'single',
+    'remove_list_member': 'single',
+    'auth_callback': 'single',
+    'auth_callback_redirect': 'single',
+    'get_events': 'stream',
+    'get_job_events': 'stream'
+}
+# Never limited: the health check and the admission report
+ADMISSION_EXEMPT = {'health', 'get_admission', 'static'}
+
+# Read-through cache of GET responses, invalidated by per-scope version counters in SQLite
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1024'))
+
+response_cache = OrderedDict()
+response_cache_lock = threading.Lock()
+
+# Account credential prober (GET /2/users/me per token, jittered schedule, shared across workers)
+ACCOUNT_PROBE_ENABLED = os.environ.get('ACCOUNT_PROBE_ENABLED', 'true').lower() == 'true'
+ACCOUNT_PROBE_INTERVAL_HOURS = float(os.environ.get('ACCOUNT_PROBE_INTERVAL_HOURS', '6'))
+ACCOUNT_PROBE_JITTER = 0.2
+ACCOUNT_PROBE_BATCH_SIZE = int(os.environ.get('ACCOUNT_PROBE_BATCH_SIZE', '50'))
+ACCOUNT_PROBE_MAX_WORKERS = int(os.environ.get('ACCOUNT_PROBE_MAX_WORKERS', '8'))
+ACCOUNT_PROBE_POLL_SECONDS = 60
+ACCOUNT_PROBE_TIMEOUT_SECONDS = 10
+# Statuses set by the prober (or a 401 while posting); the dispatcher skips these accounts
+BROKEN_ACCOUNT_STATUSES = ('token_expired', 'suspended', 'locked')
+
+account_prober = {'thread': None}
+
+# Streaming import: rows per transaction, and how many row errors are kept in the report
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '500'))
+IMPORT_MAX_ERRORS = 100
+IMPORT_COUNTERS = ('accounts', 'accounts_updated', 'tweets', 'list_members', 'list_members_existing')
+
+# Remote tweet deletion (DELETE /2/tweets/:id): accounts run in parallel, each account's tweets one at a time
+REMOTE_DELETE_MAX_WORKERS = int(os.environ.get('REMOTE_DELETE_MAX_WORKERS', '8'))
+REMOTE_DELETE_BATCH_SIZE = int(os.environ.get('REMOTE_DELETE_BATCH_SIZE', '1000'))
+REMOTE_DELETE_TIMEOUT_SECONDS = 10
+# Tweets stuck in "deleting" longer than this (e.g. worker killed mid-run) are claimed again
+REMOTE_DELETE_STALE_MINUTES = 10
+
+# List membership reconciliation (GET /2/lists/:id/members, 100 members per page)
+LIST_SYNC_MAX_WORKERS = int(os.environ.get('LIST_SYNC_MAX_WORKERS', '4'))
+LIST_SYNC_PAGE_SIZE = 100
+LIST_SYNC_TIMEOUT_SECONDS = 10
+# Concurrent member adds/removes for PUT /lists/<id>/members
+LIST_MEMBERS_MAX_WORKERS = int(os.environ.get('LIST_MEMBERS_MAX_WORKERS', '8'))
+
+# Public metrics collector (GET /2/tweets?ids=, 100 ids per request). A tweet is fetched again after
+# METRICS_DECAY_FACTOR x its age, between the min and max interval, and not at all after METRICS_MAX_AGE_DAYS
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_BATCH_SIZE = 100
+METRICS_MAX_WORKERS = int(os.environ.get('METRICS_MAX_WORKERS', '4'))
+METRICS_MIN_INTERVAL_MINUTES = int(os.environ.get('METRICS_MIN_INTERVAL_MINUTES', '15'))
+METRICS_MAX_INTERVAL_HOURS = int(os.environ.get('METRICS_MAX_INTERVAL_HOURS', '168'))
+METRICS_MAX_AGE_DAYS = int(os.environ.get('METRICS_MAX_AGE_DAYS', '90'))
+METRICS_DECAY_FACTOR = 0.25
+METRICS_POLL_SECONDS = 60
+METRICS_TIMEOUT_SECONDS = 10
+METRIC_FIELDS = ('like_count', 'retweet_count', 'reply_count', 'quote_count', 'impression_count', 'bookmark_count')
+
+metrics_collector = {'thread': None}
+
+# Capacity planner: tweets an account may post per day, and the POST /2/tweets window assumed
+# until rate-limit headers have been seen for an account
+ACCOUNT_DAILY_TWEET_CAP = int(os.environ.get('ACCOUNT_DAILY_TWEET_CAP', '2400'))
+TWEET_RATE_WINDOW_MINUTES = 15
+TWEET_RATE_WINDOW_LIMIT = int(os.environ.get('TWEET_RATE_WINDOW_LIMIT', '200'))
+# Days of posting history used for the observed posting rate
+CAPACITY_HISTORY_DAYS = 7
+
+# Group commit for POST /tweet: inserts are queued and written by one thread per process, up to
+# GROUP_COMMIT_MAX_ROWS per transaction, waiting at most GROUP_COMMIT_MAX_WAIT_MS for a batch to fill.
+# Batches only form from concurrent requests in one process: use threaded workers (gunicorn --threads),
+# a sync worker serves one request at a time and would only add the wait
+TWEET_GROUP_COMMIT = os.environ.get('TWEET_GROUP_COMMIT', 'false').lower() == 'true'
+GROUP_COMMIT_MAX_ROWS = int(os.environ.get('GROUP_COMMIT_MAX_ROWS', '200'))
+GROUP_COMMIT_MAX_WAIT_MS = float(os.environ.get('GROUP_COMMIT_MAX_WAIT_MS', '5'))
+GROUP_COMMIT_TIMEOUT_SECONDS = 10
+# WAL lets readers run while a batch is being written (set once, stored in the database file)
+SQLITE_WAL = os.environ.get('SQLITE_WAL', 'false').lower() == 'true'
+
+tweet_write_buffer = []
+tweet_write_lock = threading.Lock()
+tweet_write_pending = threading.Event()
+tweet_write_full = threading.Event()
+tweet_writer = {'thread': None}
+
+# Standalone dispatcher (python dispatcher.py): posts pending tweets from one asyncio loop with up to
+# DISPATCHER_CONCURRENCY requests in flight. With DISPATCHER_DAEMON=true the web tier only enqueues
+DISPATCHER_DAEMON = os.environ.get('DISPATCHER_DAEMON', 'false').lower() == 'true'
+DISPATCHER_CONCURRENCY = int(os.environ.get('DISPATCHER_CONCURRENCY', '200'))
+# Posts in flight per account; 1 keeps an account's tweets in order
+DISPATCHER_PER_ACCOUNT = int(os.environ.get('DISPATCHER_PER_ACCOUNT', '1'))
+DISPATCHER_POLL_SECONDS = float(os.environ.get('DISPATCHER_POLL_SECONDS', '2'))
+# Results are written in one transaction per DISPATCHER_WRITE_BATCH rows or DISPATCHER_WRITE_MAX_WAIT_MS
+DISPATCHER_WRITE_BATCH = int(os.environ.get('DISPATCHER_WRITE_BATCH', '100'))
+DISPATCHER_WRITE_MAX_WAIT_MS = float(os.environ.get('DISPATCHER_WRITE_MAX_WAIT_MS', '50'))
+# On SIGTERM, requests already sent get this long to finish
+DISPATCHER_DRAIN_SECONDS = float(os.environ.get('DISPATCHER_DRAIN_SECONDS', '30'))
+DISPATCHER_TIMEOUT_SECONDS = 15
+# Tweets left "posting" longer than this (dispatcher killed mid-request) are claimed again
+DISPATCHER_STALE_MINUTES = 10
+
+# Online backups (sqlite3 backup API), copied BACKUP_PAGES_PER_STEP pages at a time with a pause
+# between steps so writers get the database in between
+BACKUP_DIR = os.environ.get('BACKUP_DIR') or os.path.join(os.path.dirname(os.path.dirname(DB_PATH)), 'backups')
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', '7'))
+BACKUP_PAGES_PER_STEP = int(os.environ.get('BACKUP_PAGES_PER_STEP', '256'))
+BACKUP_STEP_SLEEP_MS = float(os.environ.get('BACKUP_STEP_SLEEP_MS', '5'))
+# Without WAL every write restarts a paced copy; after this many restarts the rest is copied in one step
+BACKUP_MAX_RESTARTS = 3
+# An incremental snapshot that changes more than this share of the pages is written as a full backup
+BACKUP_DELTA_MAX_RATIO = 0.5
+
+# Guards threads of one process; backup.lock in BACKUP_DIR (flock) guards workers and the cron CLI
+backup_lock = threading.Lock()
+
+# Code point ranges that count as one character; everything else (CJK, emoji, ...) counts as two
+LIGHT_CHAR_RANGES = ((0x0000, 0x10FF), (0x2000, 0x200D), (0x2010, 0x201F), (0x2032, 0x2037))
+INVALID_TWEET_CHARS = {'\uFFFE', '\uFEFF', '\uFFFF'}
+URL_PATTERN = re.compile(r'(?:https?://|www\.)[^\s<>"]+', re.IGNORECASE)
+
+class TracedConnection(sqlite3.Connection):
+    """sqlite3 connection that counts and times statements for the current request"""
+    
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.record(sql, parameters, started)
+    
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.record(sql, None, started)
+    
+    def record(self, sql, parameters, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.trace['queries'] += 1
+        self.trace['time_ms'] += elapsed_ms
+        if SLOW_QUERY_MS and elapsed_ms >= SLOW_QUERY_MS:
+            log_slow_query(self, sql, parameters, elapsed_ms)
+
+def log_slow_query(conn, sql, parameters, elapsed_ms):
+    """Append a slow statement and its query plan to the slow query log"""
+    plan = []
+    if parameters is not None and sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT'):
+        try:
+            rows = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+            plan = [row[3] for row in rows]
+        except sqlite3.Error as e:
+            plan = [f'(no plan: {e})']
+    
+    entry = {
+        'at': datetime.utcnow().isoformat(),
+        'endpoint': f'{request.method} {request.path}' if has_request_context() else None,
+        'ms': round(elapsed_ms, 2),
+        'sql': ' '.join(sql.split()),
+        'params': [str(p)[:100] for p in parameters] if isinstance(parameters, (list, tuple)) else parameters,
+        'plan': plan
+    }
+    try:
+        with slow_query_lock, open(SLOW_QUERY_LOG, 'a') as f:
+            f.write(json.dumps(entry, default=str) + '\n')
+    except OSError as e:
+        print(f"Failed to write slow query log: {e}")
+
 def get_db():
     """Get database connection"""
-    conn = sqlite3.connect(DB_PATH)
+    if (SQL_TRACE or SLOW_QUERY_MS or app.debug) and has_request_context():
+        conn = sqlite3.connect(DB_PATH, factory=TracedConnection)
+        conn.trace = g.setdefault('db_trace', {'queries': 0, 'time_ms': 0.0})
+    else:
+        conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -75,595 +409,4548 @@ def check_api_key():
         return False
     return True
 
+def bump_cache_version(conn, *scopes):
+    """Invalidate cached responses for scopes; commits with the caller's transaction"""
+    for scope in scopes:
+        conn.execute(
+            'INSERT INTO cache_version (scope, version) VALUES (?, 1) '
+            'ON CONFLICT(scope) DO UPDATE SET version = version + 1',
+            (scope,)
+        )
+
+def cached_response(*scopes):
+    """Serve a GET from the per-process cache while the scopes' versions are unchanged"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not RESPONSE_CACHE_ENABLED or not check_api_key():
+                return fn(*args, **kwargs)
+            
+            conn = get_db()
+            placeholders = ','.join('?' * len(scopes))
+            rows = dict(conn.execute(
+                f'SELECT scope, version FROM cache_version WHERE scope IN ({placeholders})',
+                scopes
+            ).fetchall())
+            conn.close()
+            versions = tuple(rows.get(scope, 0) for scope in scopes)
+            key = (request.path, tuple(sorted((k, v) for k, v in request.args.items(multi=True) if k != 'api_key')))
+            
+            with response_cache_lock:
+                entry = response_cache.get(key)
+                if entry is not None and entry[0] == versions:
+                    response_cache.move_to_end(key)
+            if entry is not None and entry[0] == versions:
+                return Response(entry[1], status=entry[2], mimetype='application/json', headers={'X-Cache': 'HIT'})
+            
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code in (200, 404):
+                with response_cache_lock:
+                    response_cache[key] = (versions, response.get_data(), response.status_code)
+                    response_cache.move_to_end(key)
+                    while len(response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+                        response_cache.popitem(last=False)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
 def decrypt_token(encrypted_token):
     """Decrypt an encrypted token"""
     try:
-        return fernet.decrypt(encrypted_token.encode()).decode()
+        return get_fernet().decrypt(encrypted_token.encode()).decode()
     except:
         return encrypted_token  # Return as-is if decryption fails
 
-def post_to_twitter(account_id, tweet_text):
-    """Post a tweet to Twitter using the account's credentials"""
-    conn = get_db()
+def content_hash(text):
+    """Hash of normalized tweet text used for duplicate detection"""
+    normalized = re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def find_duplicate(conn, account_id, chash, statuses, exclude_id=None):
+    """Find a tweet from the same account with the same content hash inside the duplicate window"""
+    placeholders = ','.join('?' * len(statuses))
+    query = f'''
+        SELECT id, status, created_at, posted_at FROM tweet
+        WHERE twitter_account_id = ? AND content_hash = ? AND status IN ({placeholders})
+    '''
+    params = [account_id, chash] + list(statuses)
+
+    if exclude_id is not None:
+        query += ' AND id != ?'
+        params.append(exclude_id)
+
+    if DUPLICATE_WINDOW_DAYS > 0:
+        cutoff = (datetime.utcnow() - timedelta(days=DUPLICATE_WINDOW_DAYS)).isoformat()
+        query += ' AND COALESCE(posted_at, created_at) >= ?'
+        params.append(cutoff)
+
+    return conn.execute(query + ' LIMIT 1', params).fetchone()
+
+def check_dispatch_duplicate(conn, tweet):
+    """Return an error message if the tweet duplicates one already posted from the same account"""
+    if DUPLICATE_POLICY == 'allow' or not (tweet['content'] or '').strip():
+        return None  # media-only tweets have no text to compare
+    chash = tweet['content_hash'] or content_hash(tweet['content'])
+    duplicate = find_duplicate(conn, tweet['twitter_account_id'], chash, ('posted',), exclude_id=tweet['id'])
+    if duplicate:
+        return f"Duplicate content: already posted as tweet {duplicate['id']}"
+    return None
+
+def tweet_weighted_length(text):
+    """Length of tweet text as Twitter counts it (NFC, URLs = 23, CJK/emoji = 2)"""
+    text = unicodedata.normalize('NFC', text)
+    length = 0
+    position = 0
     
-    # Get account credentials
-    account = conn.execute(
-        'SELECT * FROM twitter_account WHERE id = ?', 
-        (account_id,)
-    ).fetchone()
+    for match in URL_PATTERN.finditer(text):
+        url = match.group(0).rstrip('.,;:!?)\'"')
+        length += _weighted_span_length(text[position:match.start()])
+        length += TWEET_URL_LENGTH * 100
+        position = match.start() + len(url)
+    length += _weighted_span_length(text[position:])
     
-    if not account:
-        conn.close()
-        return False, "Account not found"
+    return length // 100
+
+def _weighted_span_length(text):
+    """Weighted length of text without URLs, scaled by 100"""
+    length = 0
+    previous = None
+    for char in text:
+        cp = ord(char)
+        if cp in (0x200D, 0xFE0E, 0xFE0F) or 0x1F3FB <= cp <= 0x1F3FF or previous == 0x200D:
+            # Zero width joiners, variation selectors and skin tones are part of the preceding emoji
+            weight = 0
+        elif 0x1F1E6 <= cp <= 0x1F1FF and previous is not None and 0x1F1E6 <= previous <= 0x1F1FF:
+            # Second regional indicator of a flag
+            weight = 0
+            cp = None
+        elif any(start <= cp <= end for start, end in LIGHT_CHAR_RANGES):
+            weight = 100
+        else:
+            weight = 200
+        length += weight
+        previous = cp
+    return length
+
+def validate_tweet_text(text, allow_empty=False):
+    """Validate tweet text locally; returns (weighted_length, errors)"""
+    if allow_empty and text is None:
+        text = ''
+    if not isinstance(text, str):
+        return 0, [{'field': 'text', 'code': 'invalid_type', 'message': 'text must be a string'}]
     
-    # Check if mock mode
-    if mock_mode_override['enabled']:
-        conn.close()
-        mock_tweet_id = f"mock_{datetime.now().timestamp()}"
-        print(f"[MOCK MODE] Would post tweet for {account['username']}: {tweet_text}")
-        return True, mock_tweet_id
+    errors = []
+    if not text.strip() and not allow_empty:
+        errors.append({'field': 'text', 'code': 'empty', 'message': 'text must not be empty'})
     
-    try:
-        # Decrypt tokens
-        access_token = decrypt_token(account['access_token'])
-        access_token_secret = decrypt_token(account['access_token_secret']) if account['access_token_secret'] else None
-        
-        print(f"Posting tweet for account: {account['username']}")
-        print(f"OAuth type: {'OAuth 2.0' if not access_token_secret or not access_token_secret.strip() else 'OAuth 1.0a'}")
-        
-        # Check if OAuth 2.0 (no secret) or OAuth 1.0a (with secret)
-        if access_token_secret and access_token_secret.strip():
-            # OAuth 1.0a - use direct API call (tweepy has Python 3.13 issues)
-            conn.close()
-            return False, "OAuth 1.0a not supported. Please re-authorize with OAuth 2.0."
-        else:
-            # OAuth 2.0 - direct API call
-            headers = {
-                'Authorization': f'Bearer {access_token}',
-                'Content-Type': 'application/json'
-            }
-            
-            data = {'text': tweet_text}
-            
-            response = requests.post(
-                'https://api.twitter.com/2/tweets',
-                headers=headers,
-                json=data
+    invalid = sorted({f'U+{ord(c):04X}' for c in text if c in INVALID_TWEET_CHARS})
+    if invalid:
+        errors.append({
+            'field': 'text',
+            'code': 'invalid_characters',
+            'message': f"text contains invalid characters: {', '.join(invalid)}"
+        })
+    
+    weighted_length = tweet_weighted_length(text)
+    if weighted_length > TWEET_MAX_WEIGHTED_LENGTH:
+        errors.append({
+            'field': 'text',
+            'code': 'too_long',
+            'message': f'text is {weighted_length} characters, maximum is {TWEET_MAX_WEIGHTED_LENGTH}',
+            'weighted_length': weighted_length,
+            'max_length': TWEET_MAX_WEIGHTED_LENGTH
+        })
+    
+    return weighted_length, errors
+
+def pending_accounts_in_lane(conn, priority):
+    """Accounts with pending tweets at a priority, via an index skip-scan (one seek per account)"""
+    rows = conn.execute('''
+        WITH RECURSIVE lane_account(account_id) AS (
+            SELECT MIN(twitter_account_id) FROM tweet
+            WHERE status = 'pending' AND priority = ? AND thread_id IS NULL
+            UNION ALL
+            SELECT (
+                SELECT MIN(twitter_account_id) FROM tweet
+                WHERE status = 'pending' AND priority = ? AND thread_id IS NULL
+                  AND twitter_account_id > lane_account.account_id
             )
+            FROM lane_account WHERE account_id IS NOT NULL
+        )
+        SELECT account_id FROM lane_account WHERE account_id IS NOT NULL
+    ''', (priority, priority)).fetchall()
+    return [row['account_id'] for row in rows]
+
+def select_dispatch_batch(conn, limit, per_account_cap=0, weights=None):
+    """Pick the next pending tweets to post.
+    
+    Thread tweets are left to the thread poster and accounts in a broken status are
+    skipped. Priority lanes are served from highest to lowest. Within a lane accounts are
+    served weighted round-robin (weights default to 1), oldest tweets first, and
+    no account gets more than per_account_cap tweets per run (0 = no cap). Every
+    query is an index seek, so the cost grows with the batch, not the queue.
+    """
+    weights = weights or {}
+    batch = []
+    taken = {}
+    broken = broken_account_ids(conn)
+    
+    lane = conn.execute("SELECT MAX(priority) FROM tweet WHERE status = 'pending' AND thread_id IS NULL").fetchone()[0]
+    while lane is not None and len(batch) < limit:
+        accounts = [a for a in pending_accounts_in_lane(conn, lane) if a not in broken]
+        
+        # Start after the account served last in this lane
+        last = dispatch_rotation.get(lane)
+        if last is not None:
+            accounts = [a for a in accounts if a > last] + [a for a in accounts if a <= last]
+        
+        def capacity(account_id):
+            if not per_account_cap:
+                return limit
+            return per_account_cap - taken.get(account_id, 0)
+        
+        active = [a for a in accounts if capacity(a) > 0 and weights.get(a, 1) > 0]
+        cursors = {}
+        
+        while active and len(batch) < limit:
+            total_weight = sum(weights.get(a, 1) for a in active)
+            rounds = -(-(limit - len(batch)) // total_weight)
             
-            if response.status_code != 201:
-                conn.close()
-                error_msg = f"Twitter API error (status {response.status_code}): {response.text}"
-                print(error_msg)
-                return False, error_msg
+            # Fetch just enough rows per account for the rounds needed to fill the batch
+            queues = {}
+            for account_id in active:
+                wanted = min(weights.get(account_id, 1) * rounds, capacity(account_id))
+                query = '''
+                    SELECT * FROM tweet
+                    WHERE status = 'pending' AND priority = ? AND twitter_account_id = ? AND thread_id IS NULL
+                '''
+                params = [lane, account_id]
+                if account_id in cursors:
+                    query += ' AND (created_at > ? OR (created_at = ? AND id > ?))'
+                    params.extend([cursors[account_id][0], cursors[account_id][0], cursors[account_id][1]])
+                query += ' ORDER BY created_at, id LIMIT ?'
+                params.append(wanted)
+                queues[account_id] = (conn.execute(query, params).fetchall(), wanted)
             
-            tweet_id = response.json()['data']['id']
-        
-        conn.close()
-        print(f"Successfully posted tweet with ID: {tweet_id}")
-        return True, tweet_id
-        
+            # Interleave: each round every account contributes up to its weight
+            positions = {account_id: 0 for account_id in active}
+            for _ in range(rounds):
+                for account_id in active:
+                    rows = queues[account_id][0]
+                    for _ in range(weights.get(account_id, 1)):
+                        if len(batch) >= limit or positions[account_id] >= len(rows):
+                            break
+                        row = rows[positions[account_id]]
+                        positions[account_id] += 1
+                        batch.append(row)
+                        taken[account_id] = taken.get(account_id, 0) + 1
+                        cursors[account_id] = (row['created_at'], row['id'])
+                        dispatch_rotation[lane] = account_id
+            
+            # Accounts that returned fewer rows than asked for are drained (or capped)
+            active = [
+                a for a in active
+                if len(queues[a][0]) == queues[a][1] and capacity(a) > 0
+            ]
+        
+        lane = conn.execute(
+            "SELECT MAX(priority) FROM tweet WHERE status = 'pending' AND priority < ? AND thread_id IS NULL",
+            (lane,)
+        ).fetchone()[0]
+    
+    return batch
+
+def claim_dispatch_batch(conn, limit, per_account_cap=0):
+    """Pick the next dispatch batch and mark it "posting" so no other dispatcher takes it too"""
+    now = datetime.utcnow()
+    stale_before = (now - timedelta(minutes=DISPATCHER_STALE_MINUTES)).isoformat()
+    
+    # While a tweet is "posting", claimed_at holds the claim time
+    conn.execute('BEGIN IMMEDIATE')
+    conn.execute(
+        "UPDATE tweet SET status = 'pending', claimed_at = NULL WHERE status = 'posting' AND claimed_at < ?",
+        (stale_before,)
+    )
+    # Accounts with an exhausted window get weight 0, which select_dispatch_batch skips
+    limited = conn.execute(
+        "SELECT account_id FROM rate_limit WHERE endpoint = 'tweets' AND remaining <= 0 AND reset_at > ?",
+        (now.isoformat(),)
+    ).fetchall()
+    batch = select_dispatch_batch(conn, limit, per_account_cap, {row['account_id']: 0 for row in limited})
+    
+    if batch:
+        conn.execute(
+            f"UPDATE tweet SET status = 'posting', claimed_at = ? WHERE id IN ({','.join('?' * len(batch))})",
+            [now.isoformat()] + [tweet['id'] for tweet in batch]
+        )
+    conn.commit()
+    return batch
+
+def release_dispatch_claims(conn, tweet_ids):
+    """Put claimed tweets back in the queue (not sent, or deferred by a rate limit)"""
+    if tweet_ids:
+        conn.execute(
+            f"UPDATE tweet SET status = 'pending', claimed_at = NULL WHERE status = 'posting' AND id IN ({','.join('?' * len(tweet_ids))})",
+            list(tweet_ids)
+        )
+
+def record_dispatch_results(conn, results):
+    """Write a group of dispatcher outcomes (posted, failed, unauthorized or deferred) in one transaction"""
+    expired = set()
+    for item in results:
+        if item['response'] is not None:
+            record_rate_limit(conn, item['account_id'], 'tweets', item['response'], commit=False)
+        if item['outcome'] == 'deferred':
+            release_dispatch_claims(conn, [item['tweet_id']])
+            continue
+        if item['outcome'] == 'unauthorized' and item['account_id'] not in expired:
+            expire_account_token(conn, item['account_id'], item['username'])
+            expired.add(item['account_id'])
+        record_post_result(conn, item['tweet_id'], item['outcome'] == 'posted', item['result'])
+    conn.commit()
+
+def parse_priority(value):
+    """Validate a tweet priority (higher is posted first)"""
+    if value is None:
+        return 0, None
+    if isinstance(value, bool) or not isinstance(value, int):
+        return None, {'field': 'priority', 'code': 'invalid_type', 'message': 'priority must be an integer'}
+    return value, None
+
+def record_rate_limit(conn, account_id, endpoint, response, commit=True):
+    """Remember the rate-limit headers Twitter returned for an account and endpoint"""
+    remaining = response.headers.get('x-rate-limit-remaining')
+    reset = response.headers.get('x-rate-limit-reset')
+    if remaining is None or reset is None:
+        return
+    conn.execute('''
+        INSERT INTO rate_limit (account_id, endpoint, limit_total, remaining, reset_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(account_id, endpoint) DO UPDATE SET
+            limit_total = excluded.limit_total,
+            remaining = excluded.remaining,
+            reset_at = excluded.reset_at,
+            updated_at = excluded.updated_at
+    ''', (
+        account_id,
+        endpoint,
+        int(response.headers.get('x-rate-limit-limit') or 0) or None,
+        int(remaining),
+        datetime.utcfromtimestamp(int(reset)).isoformat(),
+        datetime.utcnow().isoformat()
+    ))
+    if commit:
+        conn.commit()
+
+def rate_limited_accounts(conn, account_ids, endpoint):
+    """Accounts whose last known rate-limit window for an endpoint is exhausted, with reset times"""
+    if not account_ids:
+        return {}
+    placeholders = ','.join('?' * len(account_ids))
+    rows = conn.execute(f'''
+        SELECT account_id, reset_at FROM rate_limit
+        WHERE endpoint = ? AND remaining <= 0 AND reset_at > ? AND account_id IN ({placeholders})
+    ''', [endpoint, datetime.utcnow().isoformat()] + list(account_ids)).fetchall()
+    return {row['account_id']: row['reset_at'] for row in rows}
+
+def emit_event(conn, event_type, data):
+    """Queue an event for every subscribed webhook in the caller's transaction"""
+    webhooks = conn.execute('SELECT id, events FROM webhook WHERE is_active = 1').fetchall()
+    now = datetime.utcnow().isoformat()
+    rows = [
+        (webhook['id'], event_type, json.dumps(data), now, now)
+        for webhook in webhooks
+        if webhook['events'] == '*' or event_type in webhook['events'].split(',')
+    ]
+    if rows:
+        conn.executemany(
+            '''INSERT INTO webhook_outbox (webhook_id, event_type, payload, status, next_attempt_at, created_at)
+               VALUES (?, ?, ?, 'pending', ?, ?)''',
+            rows
+        )
+        webhook_wakeup.set()
+
+def record_post_result(conn, tweet_id, success, result):
+    """Store the outcome of a posting attempt on the tweet row"""
+    if success:
+        now = datetime.utcnow()
+        conn.execute(
+            'UPDATE tweet SET status = ?, twitter_id = ?, posted_at = ?, next_metrics_at = ? WHERE id = ?',
+            ('posted', result, now.isoformat(), next_metrics_time(now.isoformat(), now), tweet_id)
+        )
+    else:
+        conn.execute(
+            'UPDATE tweet SET status = ? WHERE id = ?',
+            ('failed', tweet_id)
+        )
+    
+    tweet = conn.execute('SELECT twitter_account_id FROM tweet WHERE id = ?', (tweet_id,)).fetchone()
+    event = {'tweet_id': tweet_id, 'account_id': tweet['twitter_account_id'] if tweet else None}
+    if success:
+        event['twitter_id'] = result
+        emit_event(conn, 'tweet.posted', event)
+    else:
+        event['error'] = result
+        emit_event(conn, 'tweet.failed', event)
+    audit('tweet.posted' if success else 'tweet.failed', 'tweet', tweet_id, event)
+
+def sign_webhook_payload(secret, timestamp, body):
+    """HMAC-SHA256 signature sent in X-Webhook-Signature"""
+    message = f'{timestamp}.'.encode() + body
+    return 'sha256=' + hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+def deliver_webhook_batch(conn, webhook):
+    """Claim and deliver one batch of due events for a webhook; returns the number delivered"""
+    now = datetime.utcnow()
+    
+    # Claim the batch atomically so several workers never send the same events
+    conn.execute('BEGIN IMMEDIATE')
+    rows = conn.execute('''
+        SELECT id, event_type, payload, attempts, created_at FROM webhook_outbox
+        WHERE webhook_id = ? AND status = 'pending' AND next_attempt_at <= ?
+        ORDER BY id
+        LIMIT ?
+    ''', (webhook['id'], now.isoformat(), WEBHOOK_BATCH_SIZE)).fetchall()
+    if not rows:
+        conn.commit()
+        return 0
+    ids = [row['id'] for row in rows]
+    placeholders = ','.join('?' * len(ids))
+    conn.execute(
+        f"UPDATE webhook_outbox SET status = 'sending', claimed_at = ? WHERE id IN ({placeholders})",
+        [now.isoformat()] + ids
+    )
+    conn.commit()
+    
+    body = json.dumps({
+        'webhook_id': webhook['id'],
+        'events': [{
+            'id': row['id'],
+            'type': row['event_type'],
+            'created_at': row['created_at'],
+            'data': json.loads(row['payload'])
+        } for row in rows]
+    }).encode()
+    timestamp = str(int(time.time()))
+    
+    try:
+        response = requests.post(webhook['url'], data=body, timeout=WEBHOOK_TIMEOUT_SECONDS, headers={
+            'Content-Type': 'application/json',
+            'X-Webhook-Id': str(webhook['id']),
+            'X-Webhook-Timestamp': timestamp,
+            'X-Webhook-Signature': sign_webhook_payload(decrypt_token(webhook['secret']), timestamp, body)
+        })
+        error = None if 200 <= response.status_code < 300 else f'HTTP {response.status_code}: {response.text[:200]}'
     except Exception as e:
+        error = str(e)
+    
+    done = datetime.utcnow().isoformat()
+    if not error:
+        conn.execute(
+            f"UPDATE webhook_outbox SET status = 'delivered', delivered_at = ?, attempts = attempts + 1 WHERE id IN ({placeholders})",
+            [done] + ids
+        )
+        conn.execute('UPDATE webhook SET last_success_at = ?, last_error = NULL WHERE id = ?', (done, webhook['id']))
+        conn.commit()
+        return len(ids)
+    
+    # Exponential backoff with jitter; give up after WEBHOOK_MAX_ATTEMPTS
+    attempts = max(row['attempts'] for row in rows) + 1
+    delay = min(WEBHOOK_BACKOFF_SECONDS * 2 ** (attempts - 1), WEBHOOK_MAX_BACKOFF_SECONDS)
+    next_attempt = (datetime.utcnow() + timedelta(seconds=delay * random.uniform(0.8, 1.2))).isoformat()
+    status = 'dead' if attempts >= WEBHOOK_MAX_ATTEMPTS else 'pending'
+    conn.execute(
+        f"""UPDATE webhook_outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?
+            WHERE id IN ({placeholders})""",
+        [status, attempts, next_attempt, error] + ids
+    )
+    conn.execute('UPDATE webhook SET last_error = ? WHERE id = ?', (error, webhook['id']))
+    conn.commit()
+    print(f"Webhook {webhook['id']} delivery failed (attempt {attempts}): {error}")
+    return 0
+
+def run_webhook_deliveries():
+    """Deliver all due webhook events once"""
+    conn = get_db()
+    conn.isolation_level = None  # explicit transactions for claiming
+    try:
+        # Release claims left behind by a worker that died mid-delivery
+        stale = (datetime.utcnow() - timedelta(seconds=WEBHOOK_CLAIM_TIMEOUT_SECONDS)).isoformat()
+        conn.execute("UPDATE webhook_outbox SET status = 'pending' WHERE status = 'sending' AND claimed_at < ?", (stale,))
+        
+        delivered = 0
+        webhooks = conn.execute('''
+            SELECT DISTINCT w.* FROM webhook w
+            JOIN webhook_outbox o ON o.webhook_id = w.id
+            WHERE o.status = 'pending' AND o.next_attempt_at <= ?
+        ''', (datetime.utcnow().isoformat(),)).fetchall()
+        for webhook in webhooks:
+            while True:
+                sent = deliver_webhook_batch(conn, webhook)
+                delivered += sent
+                if sent < WEBHOOK_BATCH_SIZE:
+                    break
+        
+        if time.monotonic() - webhook_worker['pruned_at'] >= WEBHOOK_PRUNE_INTERVAL_SECONDS:
+            webhook_worker['pruned_at'] = time.monotonic()
+            prune_webhook_outbox(conn)
+        return delivered
+    finally:
         conn.close()
-        error_msg = f"Exception during posting: {str(e)}"
-        print(error_msg)
-        return False, error_msg
 
-# WORKING ENDPOINTS
+def prune_webhook_outbox(conn):
+    """Delete delivered events older than WEBHOOK_RETENTION_DAYS, CLEANUP_CHUNK_SIZE rows per transaction"""
+    if WEBHOOK_RETENTION_DAYS <= 0:
+        return 0
+    cutoff = (datetime.utcnow() - timedelta(days=WEBHOOK_RETENTION_DAYS)).isoformat()
+    pruned = 0
+    while True:
+        deleted = conn.execute('''
+            DELETE FROM webhook_outbox WHERE id IN (
+                SELECT id FROM webhook_outbox WHERE status = 'delivered' AND delivered_at < ? LIMIT ?
+            )
+        ''', (cutoff, CLEANUP_CHUNK_SIZE)).rowcount
+        conn.commit()
+        pruned += deleted
+        if deleted < CLEANUP_CHUNK_SIZE:
+            return pruned
 
-@app.route('/api/v1/health', methods=['GET'])
-def health():
-    """Health check - no auth required"""
-    return jsonify({
-        'status': 'healthy',
-        'timestamp': datetime.utcnow().isoformat(),
-        'version': '2.0.0-simple'
-    })
+def webhook_worker_loop():
+    """Background loop: wait for new events (or the poll interval), coalesce briefly, deliver"""
+    while True:
+        webhook_wakeup.wait(WEBHOOK_POLL_SECONDS)
+        webhook_wakeup.clear()
+        # Let events from the same burst land in one batch
+        time.sleep(WEBHOOK_COALESCE_MS / 1000)
+        try:
+            run_webhook_deliveries()
+        except Exception as e:
+            print(f"Webhook worker error: {e}")
 
-@app.route('/api/v1/test', methods=['GET'])
-def test():
-    """Test endpoint with API key"""
-    if not check_api_key():
-        return jsonify({'error': 'Invalid API key'}), 401
+def start_webhook_worker():
+    """Start the webhook delivery thread once per process"""
+    if not WEBHOOK_WORKER_ENABLED or webhook_worker['thread'] is not None:
+        return
+    thread = threading.Thread(target=webhook_worker_loop, name='webhook-worker', daemon=True)
+    webhook_worker['thread'] = thread
+    thread.start()
+
+def next_probe_time(now):
+    """When to probe an account again, jittered so probes spread out instead of bunching up"""
+    hours = ACCOUNT_PROBE_INTERVAL_HOURS * random.uniform(1 - ACCOUNT_PROBE_JITTER, 1 + ACCOUNT_PROBE_JITTER)
+    return (now + timedelta(hours=hours)).isoformat()
+
+def claim_probe_batch(conn, limit, account_ids=None):
+    """Pick accounts due for a probe and push their next_verify_at forward so other workers skip them"""
+    now = datetime.utcnow()
+    conn.execute('BEGIN IMMEDIATE')
+    if account_ids:
+        placeholders = ','.join('?' * len(account_ids))
+        accounts = conn.execute(
+            f'SELECT id, username, access_token, status FROM twitter_account WHERE id IN ({placeholders})',
+            list(account_ids)
+        ).fetchall()
+    else:
+        statuses = ('active',) + BROKEN_ACCOUNT_STATUSES
+        accounts = conn.execute(f'''
+            SELECT id, username, access_token, status FROM twitter_account
+            WHERE status IN ({','.join('?' * len(statuses))})
+              AND (next_verify_at IS NULL OR next_verify_at <= ?)
+            ORDER BY next_verify_at
+            LIMIT ?
+        ''', statuses + (now.isoformat(), limit)).fetchall()
+    conn.executemany(
+        'UPDATE twitter_account SET next_verify_at = ? WHERE id = ?',
+        [(next_probe_time(now), account['id']) for account in accounts]
+    )
+    conn.commit()
+    return accounts
+
+def probe_account(account):
+    """Check one account's token with GET /2/users/me; returns (status or None if inconclusive, error, response)"""
+    if mock_mode_override['enabled']:
+        return 'active', None, None
+    try:
+        response = requests.get(
+            'https://api.twitter.com/2/users/me',
+            headers={'Authorization': f'Bearer {decrypt_token(account["access_token"])}'},
+            timeout=ACCOUNT_PROBE_TIMEOUT_SECONDS
+        )
+    except requests.RequestException as e:
+        return None, f'Request failed: {e}', None
     
-    return jsonify({
-        'status': 'success',
-        'message': 'API key validated!'
-    })
+    if response.status_code == 200:
+        return 'active', None, response
+    if response.status_code == 401:
+        return 'token_expired', 'Token rejected (401)', response
+    if response.status_code == 403:
+        detail = response.text.lower()
+        if 'suspend' in detail:
+            return 'suspended', 'Account suspended (403)', response
+        if 'lock' in detail:
+            return 'locked', 'Account locked (403)', response
+    return None, f'Twitter API error (status {response.status_code}): {response.text[:200]}', response
 
-@app.route('/api/v1/accounts', methods=['GET'])
-def get_accounts():
-    """Get all Twitter accounts"""
-    if not check_api_key():
-        return jsonify({'error': 'Invalid API key'}), 401
+def run_account_probes(account_ids=None, progress=None):
+    """Probe a batch of accounts in parallel and store the results; returns a summary"""
+    conn = get_db()
+    accounts = claim_probe_batch(conn, ACCOUNT_PROBE_BATCH_SIZE, account_ids)
+    if progress is not None:
+        progress.set_total(conn, len(accounts))
     
-    account_type = request.args.get('type')
+    summary = {'probed': len(accounts), 'verified': 0, 'broken': 0, 'inconclusive': 0, 'changed': []}
+    if not accounts:
+        conn.close()
+        return summary
+    
+    with ThreadPoolExecutor(max_workers=min(ACCOUNT_PROBE_MAX_WORKERS, len(accounts))) as executor:
+        futures = {executor.submit(probe_account, account): account for account in accounts}
+        for future in as_completed(futures):
+            account = futures[future]
+            status, error, response = future.result()
+            now = datetime.utcnow().isoformat()
+            
+            if response is not None:
+                record_rate_limit(conn, account['id'], 'users_me', response)
+            
+            # Only touch statuses the prober owns; manual ones (inactive, failed, ...) stay as they are
+            managed = account['status'] in ('active',) + BROKEN_ACCOUNT_STATUSES
+            if status is None:
+                summary['inconclusive'] += 1
+                conn.execute('UPDATE twitter_account SET verify_error = ? WHERE id = ?', (error, account['id']))
+            else:
+                summary['verified' if status == 'active' else 'broken'] += 1
+                new_status = status if managed else account['status']
+                conn.execute(
+                    'UPDATE twitter_account SET status = ?, last_verified_at = ?, verify_error = ?, updated_at = ? WHERE id = ?',
+                    (new_status, now, error, now, account['id'])
+                )
+                if status == 'active' and response is not None:
+                    conn.execute(
+                        'UPDATE twitter_account SET twitter_user_id = ? WHERE id = ?',
+                        (response.json().get('data', {}).get('id'), account['id'])
+                    )
+                if new_status != account['status']:
+                    change = {
+                        'account_id': account['id'],
+                        'username': account['username'],
+                        'from': account['status'],
+                        'to': new_status
+                    }
+                    summary['changed'].append(change)
+                    if new_status == 'token_expired':
+                        emit_event(conn, 'account.token_expired', {'account_id': account['id'], 'username': account['username']})
+                    audit('account.status_changed', 'account', account['id'], change)
+            # Every branch wrote verify_error (and maybe last_verified_at/status), which the cached account views return
+            bump_cache_version(conn, 'accounts')
+            conn.commit()
+            
+            if progress is not None:
+                progress.item(status is not None, {
+                    'account_id': account['id'],
+                    'username': account['username'],
+                    'status': status or account['status'],
+                    'error': error
+                })
     
+    conn.close()
+    return summary
+
+def account_probe_loop():
+    """Probe due accounts forever, sleeping a jittered interval between batches"""
+    while True:
+        time.sleep(ACCOUNT_PROBE_POLL_SECONDS * random.uniform(0.5, 1.5))
+        try:
+            summary = run_account_probes()
+            if summary['changed']:
+                print(f"Account prober: {len(summary['changed'])} status changes: {summary['changed']}")
+        except Exception as e:
+            print(f"Account prober failed: {e}")
+
+def start_account_prober():
+    """Start the account prober thread once per process"""
+    if not ACCOUNT_PROBE_ENABLED or account_prober['thread'] is not None:
+        return
+    thread = threading.Thread(target=account_probe_loop, name='account-prober', daemon=True)
+    account_prober['thread'] = thread
+    thread.start()
+
+def broken_account_ids(conn):
+    """Accounts the prober (or a failed post) found unusable"""
+    rows = conn.execute(
+        f"SELECT id FROM twitter_account WHERE status IN ({','.join('?' * len(BROKEN_ACCOUNT_STATUSES))})",
+        BROKEN_ACCOUNT_STATUSES
+    ).fetchall()
+    return {row['id'] for row in rows}
+
+def next_metrics_time(posted_at, now):
+    """When to fetch a tweet's metrics again: an interval proportional to its age, so fresh tweets are fetched often"""
     try:
-        conn = get_db()
-        if account_type:
-            cursor = conn.execute(
-                'SELECT id, username, status, account_type, created_at FROM twitter_account WHERE account_type = ? ORDER BY created_at DESC',
-                (account_type,)
-            )
+        age = now - datetime.fromisoformat(posted_at) if posted_at else timedelta(0)
+    except ValueError:
+        age = timedelta(0)
+    if age > timedelta(days=METRICS_MAX_AGE_DAYS):
+        return None  # old enough that the numbers no longer move; stop collecting
+    interval = min(max(age * METRICS_DECAY_FACTOR, timedelta(minutes=METRICS_MIN_INTERVAL_MINUTES)),
+                   timedelta(hours=METRICS_MAX_INTERVAL_HOURS))
+    return (now + interval).isoformat()
+
+def claim_metrics_batch(conn, limit):
+    """Pick tweets due for a metrics fetch and lease them so other workers skip them"""
+    now = datetime.utcnow()
+    lease = (now + timedelta(minutes=METRICS_MIN_INTERVAL_MINUTES)).isoformat()
+    conn.execute('BEGIN IMMEDIATE')
+    tweets = conn.execute(f'''
+        SELECT t.id, t.twitter_id, t.twitter_account_id, t.posted_at FROM tweet t
+        JOIN twitter_account a ON a.id = t.twitter_account_id
+        WHERE t.next_metrics_at <= ? AND t.status = 'posted'
+          AND a.status NOT IN ({','.join('?' * len(BROKEN_ACCOUNT_STATUSES))})
+          AND t.twitter_account_id NOT IN (
+              SELECT account_id FROM rate_limit
+              WHERE endpoint = 'tweets_lookup' AND remaining <= 0 AND reset_at > ?
+          )
+        ORDER BY t.next_metrics_at
+        LIMIT ?
+    ''', [now.isoformat()] + list(BROKEN_ACCOUNT_STATUSES) + [now.isoformat(), limit]).fetchall()
+    conn.executemany('UPDATE tweet SET next_metrics_at = ? WHERE id = ?', [(lease, tweet['id']) for tweet in tweets])
+    conn.commit()
+    return tweets
+
+def fetch_public_metrics(account, twitter_ids):
+    """Look up up to 100 tweets in one GET /2/tweets call; returns (metrics by twitter_id, ids gone, error, response)"""
+    if mock_mode_override['enabled']:
+        return {}, set(), None, None
+    try:
+        response = requests.get(
+            'https://api.twitter.com/2/tweets',
+            headers={'Authorization': f'Bearer {decrypt_token(account["access_token"])}'},
+            params={'ids': ','.join(twitter_ids), 'tweet.fields': 'public_metrics'},
+            timeout=METRICS_TIMEOUT_SECONDS
+        )
+    except requests.RequestException as e:
+        return None, None, f'Request failed: {e}', None
+    
+    if response.status_code != 200:
+        return None, None, f'Twitter API error (status {response.status_code}): {response.text[:200]}', response
+    
+    body = response.json()
+    metrics = {tweet['id']: tweet.get('public_metrics', {}) for tweet in body.get('data', [])}
+    # Deleted or protected tweets come back as errors; they are not fetched again
+    gone = {error['resource_id'] for error in body.get('errors', []) if error.get('resource_id')}
+    return metrics, gone, None, response
+
+def store_metrics(conn, tweets, metrics, gone, now):
+    """Write snapshots (only when a count changed), the latest values and the next fetch time; returns counts"""
+    placeholders = ','.join('?' * len(tweets))
+    latest = {row['tweet_id']: row for row in conn.execute(
+        f'SELECT * FROM tweet_metrics_latest WHERE tweet_id IN ({placeholders})',
+        [tweet['id'] for tweet in tweets]
+    )}
+    
+    counts = {'updated': 0, 'unchanged': 0, 'gone': 0}
+    snapshots, upserts, schedule = [], [], []
+    for tweet in tweets:
+        values = metrics.get(tweet['twitter_id'])
+        if values is None:
+            if tweet['twitter_id'] in gone:
+                counts['gone'] += 1
+                schedule.append((None, tweet['id']))
+            else:
+                schedule.append((next_metrics_time(tweet['posted_at'], now), tweet['id']))
+            continue
+        
+        values = tuple(int(values.get(field) or 0) for field in METRIC_FIELDS)
+        previous = latest.get(tweet['id'])
+        if previous is None or tuple(previous[field] for field in METRIC_FIELDS) != values:
+            snapshots.append((tweet['id'], now.isoformat()) + values)
+            counts['updated'] += 1
         else:
-            cursor = conn.execute('SELECT id, username, status, account_type, created_at FROM twitter_account ORDER BY created_at DESC')
-        accounts = cursor.fetchall()
-        conn.close()
-        
+            counts['unchanged'] += 1
+        upserts.append((tweet['id'], tweet['twitter_account_id']) + values + (now.isoformat(),))
+        schedule.append((next_metrics_time(tweet['posted_at'], now), tweet['id']))
+    
+    columns = ', '.join(METRIC_FIELDS)
+    value_slots = ', '.join('?' * len(METRIC_FIELDS))
+    if snapshots:
+        conn.executemany(
+            f'INSERT OR REPLACE INTO tweet_metrics (tweet_id, fetched_at, {columns}) VALUES (?, ?, {value_slots})',
+            snapshots
+        )
+    if upserts:
+        conn.executemany(f'''
+            INSERT INTO tweet_metrics_latest (tweet_id, twitter_account_id, {columns}, fetched_at)
+            VALUES (?, ?, {value_slots}, ?)
+            ON CONFLICT(tweet_id) DO UPDATE SET
+                {', '.join(f'{field} = excluded.{field}' for field in METRIC_FIELDS)},
+                fetched_at = excluded.fetched_at
+        ''', upserts)
+    conn.executemany('UPDATE tweet SET next_metrics_at = ? WHERE id = ?', schedule)
+    return counts
+
+def run_metrics_collection(progress=None):
+    """Fetch metrics for one batch of due tweets, 100 ids per request, accounts in parallel; returns a summary"""
+    conn = get_db()
+    tweets = claim_metrics_batch(conn, METRICS_BATCH_SIZE * METRICS_MAX_WORKERS)
+    if progress is not None:
+        progress.set_total(conn, len(tweets))
+    
+    summary = {'tweets': len(tweets), 'requests': 0, 'updated': 0, 'unchanged': 0, 'gone': 0, 'failed': 0}
+    if not tweets:
+        conn.close()
+        return summary
+    
+    # Each request carries ids of a single account, since it is made with that account's token
+    by_account = {}
+    for tweet in tweets:
+        by_account.setdefault(tweet['twitter_account_id'], []).append(tweet)
+    chunks = [
+        (account_id, account_tweets[i:i + METRICS_BATCH_SIZE])
+        for account_id, account_tweets in by_account.items()
+        for i in range(0, len(account_tweets), METRICS_BATCH_SIZE)
+    ]
+    placeholders = ','.join('?' * len(by_account))
+    accounts = {row['id']: row for row in conn.execute(
+        f'SELECT id, username, access_token FROM twitter_account WHERE id IN ({placeholders})',
+        list(by_account)
+    )}
+    
+    with ThreadPoolExecutor(max_workers=min(METRICS_MAX_WORKERS, len(chunks))) as executor:
+        futures = {
+            executor.submit(fetch_public_metrics, accounts[account_id], [tweet['twitter_id'] for tweet in chunk]): (account_id, chunk)
+            for account_id, chunk in chunks
+        }
+        for future in as_completed(futures):
+            account_id, chunk = futures[future]
+            metrics, gone, error, response = future.result()
+            summary['requests'] += 1
+            
+            if response is not None:
+                record_rate_limit(conn, account_id, 'tweets_lookup', response)
+            
+            # Failed chunks keep their lease and are retried once it runs out
+            if error:
+                summary['failed'] += len(chunk)
+                print(f"Metrics fetch failed for account {account_id}: {error}")
+            else:
+                counts = store_metrics(conn, chunk, metrics, gone, datetime.utcnow())
+                conn.commit()
+                for key, value in counts.items():
+                    summary[key] += value
+            
+            if progress is not None:
+                progress.chunk(0 if error else len(chunk), len(chunk) if error else 0, {
+                    'account_id': account_id,
+                    'tweets': len(chunk),
+                    'error': error
+                })
+    
+    conn.close()
+    return summary
+
+def metrics_collector_loop():
+    """Collect due metrics forever, sleeping a jittered interval between batches"""
+    while True:
+        time.sleep(METRICS_POLL_SECONDS * random.uniform(0.5, 1.5))
+        try:
+            summary = run_metrics_collection()
+            if summary['tweets']:
+                print(f"Metrics collector: {summary}")
+        except Exception as e:
+            print(f"Metrics collector failed: {e}")
+
+def start_metrics_collector():
+    """Start the metrics collector thread once per process"""
+    if not METRICS_ENABLED or metrics_collector['thread'] is not None:
+        return
+    thread = threading.Thread(target=metrics_collector_loop, name='metrics-collector', daemon=True)
+    metrics_collector['thread'] = thread
+    thread.start()
+
+def metrics_to_dict(row):
+    """Serialize the metric counts of a latest/snapshot row or an aggregate"""
+    return {field: row[field] or 0 for field in METRIC_FIELDS}
+
+def create_job(conn, kind, params, total=0, status='running'):
+    """Create a job row used to track a long-running operation"""
+    now = datetime.utcnow().isoformat()
+    cursor = conn.execute(
+        'INSERT INTO job (kind, status, params, total, created_at, started_at) VALUES (?, ?, ?, ?, ?, ?)',
+        (kind, status, json.dumps(params), total, now, now)
+    )
+    return cursor.lastrowid
+
+def finish_job(conn, job_id, status, succeeded, failed, stats):
+    """Record the final counts and stats of a job"""
+    conn.execute(
+        'UPDATE job SET status = ?, succeeded = ?, failed = ?, stats = ?, finished_at = ? WHERE id = ?',
+        (status, succeeded, failed, json.dumps(stats), datetime.utcnow().isoformat(), job_id)
+    )
+
+def job_to_dict(job):
+    """Serialize a job row"""
+    return {
+        'id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'params': json.loads(job['params']) if job['params'] else {},
+        'total': job['total'],
+        'succeeded': job['succeeded'],
+        'failed': job['failed'],
+        'stats': json.loads(job['stats']) if job['stats'] else {},
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    }
+
+def latency_stats(latencies_ms):
+    """Summarize a list of latencies in milliseconds"""
+    if not latencies_ms:
+        return {'count': 0}
+    ordered = sorted(latencies_ms)
+    
+    def percentile(p):
+        return round(ordered[min(int(len(ordered) * p), len(ordered) - 1)], 1)
+    
+    return {
+        'count': len(ordered),
+        'avg_ms': round(sum(ordered) / len(ordered), 1),
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'max_ms': round(ordered[-1], 1)
+    }
+
+def publish_event(event_type, data, job_id=None):
+    """Append an event to the shared event log and wake local stream readers"""
+    line = json.dumps({
+        'type': event_type,
+        'job_id': job_id,
+        'data': data,
+        'created_at': datetime.utcnow().isoformat()
+    }) + '\n'
+    try:
+        os.makedirs(os.path.dirname(EVENT_LOG_PATH), exist_ok=True)
+        # One O_APPEND write per line so lines from different workers never interleave
+        fd = os.open(EVENT_LOG_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > EVENT_LOG_MAX_BYTES:
+            os.replace(EVENT_LOG_PATH, EVENT_LOG_PATH + '.1')
+    except OSError as e:
+        print(f"Failed to publish {event_type} event: {e}")
+    with event_written:
+        event_written.notify_all()
+
+def read_new_events(path, inode, offset):
+    """Read complete lines appended to the log after offset; returns (events, new_offset)"""
+    events = []
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_ino != inode:
+                return events, offset
+            f.seek(offset)
+            chunk = f.read()
+    except FileNotFoundError:
+        return events, offset
+    
+    for raw in chunk.splitlines(keepends=True):
+        if not raw.endswith(b'\n'):
+            break  # partially written line, picked up on the next read
+        offset += len(raw)
+        try:
+            events.append((f'{inode}-{offset}', json.loads(raw)))
+        except ValueError:
+            continue
+    return events, offset
+
+def format_sse(event_id, event_type, data):
+    """Format one Server-Sent Events message"""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+def follow_events(last_event_id=None, job_id=None, types=None, from_start=False):
+    """Yield SSE messages as events are appended to the event log.
+    
+    Waits on a condition notified by local publishers and re-checks the file every
+    EVENT_POLL_SECONDS for writes from other workers; rotation is detected by inode.
+    Job streams end after the job's job.finished event.
+    """
+    inode, offset = None, None
+    if last_event_id:
+        try:
+            inode, offset = (int(part) for part in last_event_id.split('-', 1))
+        except ValueError:
+            pass
+    
+    deadline = time.monotonic() + EVENT_STREAM_MAX_SECONDS
+    last_sent = time.monotonic()
+    checked_job = False
+    yield "retry: 2000\n\n"
+    
+    while time.monotonic() < deadline:
+        try:
+            current = os.stat(EVENT_LOG_PATH).st_ino
+        except FileNotFoundError:
+            current = None
+        
+        batch = []
+        if current is not None and current != inode:
+            if inode is not None and offset is not None:
+                # Finish the rotated file before moving on to the new one
+                rotated, _ = read_new_events(EVENT_LOG_PATH + '.1', inode, offset)
+                batch.extend(rotated)
+                inode, offset = current, 0
+            else:
+                inode = current
+                offset = 0 if from_start or last_event_id else os.stat(EVENT_LOG_PATH).st_size
+        if inode is not None:
+            events, offset = read_new_events(EVENT_LOG_PATH, inode, offset)
+            batch.extend(events)
+        
+        for event_id, event in batch:
+            if job_id is not None and event.get('job_id') != job_id:
+                continue
+            if types and event.get('type') not in types:
+                continue
+            payload = dict(event.get('data') or {}, job_id=event.get('job_id'), created_at=event.get('created_at'))
+            yield format_sse(event_id, event.get('type'), payload)
+            last_sent = time.monotonic()
+            if job_id is not None and event.get('type') == 'job.finished':
+                return
+        
+        if batch:
+            continue
+        
+        # Caught up: a job that already finished (events rotated away, or the worker died) ends the stream
+        if job_id is not None and (not checked_job or time.monotonic() - last_sent >= EVENT_HEARTBEAT_SECONDS):
+            checked_job = True
+            conn = get_db()
+            job = conn.execute('SELECT * FROM job WHERE id = ?', (job_id,)).fetchone()
+            conn.close()
+            if job is None or job['finished_at']:
+                if job is not None:
+                    job = job_to_dict(job)
+                    yield format_sse(f'{inode}-{offset}', 'job.finished', {
+                        'status': job['status'],
+                        'succeeded': job['succeeded'],
+                        'failed': job['failed'],
+                        'stats': job['stats'],
+                        'job_id': job_id,
+                        'created_at': job['finished_at']
+                    })
+                return
+        
+        if time.monotonic() - last_sent >= EVENT_HEARTBEAT_SECONDS:
+            yield ': keepalive\n\n'
+            last_sent = time.monotonic()
+        
+        with event_written:
+            event_written.wait(timeout=EVENT_POLL_SECONDS)
+
+def event_stream_response(generator):
+    """Wrap an SSE generator in an unbuffered streaming response"""
+    return Response(stream_with_context(generator), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+class JobProgress:
+    """Publishes per-item results and running throughput for a job"""
+    
+    def __init__(self, job_id, total=0):
+        self.job_id = job_id
+        self.total = total
+        self.done = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.lock = threading.Lock()  # items may be reported from worker threads
+    
+    def set_total(self, conn, total):
+        self.total = total
+        conn.execute('UPDATE job SET total = ? WHERE id = ?', (total, self.job_id))
+        conn.commit()
+    
+    def throughput(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'rate_per_sec': round(self.done / elapsed, 2) if elapsed > 0 else None
+        }
+    
+    def item(self, success, detail, count=1):
+        """Record the result of one item (or a chunk of count items) and publish it"""
+        if success:
+            self.chunk(count, 0, detail)
+        else:
+            self.chunk(0, count, detail)
+    
+    def chunk(self, succeeded, failed, detail):
+        """Record a batch of results and publish it"""
+        with self.lock:
+            self.done += succeeded + failed
+            self.succeeded += succeeded
+            self.failed += failed
+            event = dict({
+                'done': self.done,
+                'total': self.total,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'item': detail
+            }, **self.throughput())
+        publish_event('job.progress', event, job_id=self.job_id)
+    
+    def finish(self, conn, status='completed', stats=None):
+        """Store the final counts on the job row and publish job.finished"""
+        stats = dict(stats or {}, **self.throughput())
+        finish_job(conn, self.job_id, status, self.succeeded, self.failed, stats)
+        conn.commit()
+        publish_event('job.finished', {
+            'status': status,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'stats': stats
+        }, job_id=self.job_id)
+
+def run_job(job_id, fn, *args):
+    """Run fn(job_id, *args), marking the job failed if it raises; returns (body, status)"""
+    try:
+        return fn(job_id, *args)
+    except Exception as e:
+        print(f"Job {job_id} failed: {e}")
+        conn = get_db()
+        finish_job(conn, job_id, 'failed', 0, 0, {'error': str(e)})
+        conn.commit()
+        conn.close()
+        publish_event('job.finished', {'status': 'failed', 'error': str(e)}, job_id=job_id)
+        return {'error': str(e)}, 500
+
+def launch_job(kind, params, fn, *args, total=0):
+    """Create a job and run it inline, or in a background thread when the client asked for async"""
+    data = request.get_json(silent=True) or {}
+    run_async = data.get('async') is True or request.args.get('async', '').lower() in ('1', 'true')
+    
+    conn = get_db()
+    job_id = create_job(conn, kind, params, total=total)
+    conn.commit()
+    conn.close()
+    publish_event('job.started', {'kind': kind, 'params': params, 'total': total}, job_id=job_id)
+    
+    if run_async:
+        actor = current_actor()
+        slot = g.pop('admission_slot', None)  # the job keeps the request's admission slot until it ends
+        
+        def run_in_background():
+            audit_context.actor = actor  # attribute the job's audit entries to the caller
+            try:
+                run_job(job_id, fn, *args)
+            finally:
+                release_admission_slot(slot)
+        
+        threading.Thread(target=run_in_background, name=f'job-{job_id}', daemon=True).start()
+        return jsonify({
+            'job_id': job_id,
+            'status': 'running',
+            'status_url': f'/api/v1/jobs/{job_id}',
+            'events_url': f'/api/v1/jobs/{job_id}/events'
+        }), 202
+    
+    body, status = run_job(job_id, fn, *args)
+    body['job_id'] = job_id
+    return jsonify(body), status
+
+def current_actor():
+    """Fingerprint of the API key behind the current request (or the job that inherited it)"""
+    if has_request_context():
+        api_key = request.headers.get('X-API-Key') or request.args.get('api_key')
+        if api_key:
+            return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        return 'anonymous'
+    return getattr(audit_context, 'actor', 'system')
+
+def audit(event_type, entity_type=None, entity_id=None, data=None):
+    """Queue an audit log entry; the writer group-commits the buffer"""
+    entry = (
+        datetime.utcnow().isoformat(),
+        event_type,
+        entity_type,
+        None if entity_id is None else str(entity_id),
+        current_actor(),
+        json.dumps(data) if data else None
+    )
+    with audit_lock:
+        audit_buffer.append(entry)
+        size = len(audit_buffer)
+    
+    if size >= AUDIT_FLUSH_SIZE:
+        if audit_writer['thread'] is None:
+            flush_audit_buffer()
+        else:
+            audit_pending.set()
+
+def get_audit_db():
+    """Get a connection to the audit log database"""
+    conn = sqlite3.connect(AUDIT_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+@atexit.register
+def flush_audit_buffer():
+    """Write all buffered audit entries in one transaction"""
+    with audit_lock:
+        if not audit_buffer:
+            return 0
+        entries = audit_buffer[:]
+        del audit_buffer[:]
+    
+    try:
+        conn = get_audit_db()
+        conn.executemany(
+            'INSERT INTO event_log (occurred_at, event_type, entity_type, entity_id, actor, data) VALUES (?, ?, ?, ?, ?, ?)',
+            entries
+        )
+        conn.commit()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Failed to write {len(entries)} audit entries: {e}")
+        # Put them back for the next flush, dropping the oldest if the buffer grows too large
+        with audit_lock:
+            audit_buffer[:0] = entries
+            del audit_buffer[:max(len(audit_buffer) - AUDIT_MAX_BUFFER, 0)]
+        return 0
+    return len(entries)
+
+def prune_audit_log():
+    """Archive (optional) and delete audit entries older than the retention window"""
+    cutoff = (datetime.utcnow() - timedelta(days=AUDIT_RETENTION_DAYS)).isoformat()
+    conn = get_audit_db()
+    archived = 0
+    
+    if AUDIT_ARCHIVE_DIR:
+        os.makedirs(AUDIT_ARCHIVE_DIR, exist_ok=True)
+        months = conn.execute(
+            'SELECT DISTINCT substr(occurred_at, 1, 7) FROM event_log WHERE occurred_at < ?',
+            (cutoff,)
+        ).fetchall()
+        for (month,) in months:
+            # Roll old entries over into one file per month
+            conn.execute('ATTACH DATABASE ? AS archive', (os.path.join(AUDIT_ARCHIVE_DIR, f'audit-{month}.db'),))
+            conn.execute('CREATE TABLE IF NOT EXISTS archive.event_log AS SELECT * FROM main.event_log WHERE 0')
+            archived += conn.execute(
+                'INSERT INTO archive.event_log SELECT * FROM main.event_log WHERE occurred_at < ? AND substr(occurred_at, 1, 7) = ?',
+                (cutoff, month)
+            ).rowcount
+            conn.execute(
+                'DELETE FROM main.event_log WHERE occurred_at < ? AND substr(occurred_at, 1, 7) = ?',
+                (cutoff, month)
+            )
+            conn.commit()
+            conn.execute('DETACH DATABASE archive')
+    
+    deleted = conn.execute('DELETE FROM event_log WHERE occurred_at < ?', (cutoff,)).rowcount
+    conn.commit()
+    # Hand freed pages back to the filesystem so the file does not keep its peak size
+    conn.execute('PRAGMA incremental_vacuum')
+    conn.close()
+    
+    return {'cutoff': cutoff, 'archived': archived, 'deleted': deleted}
+
+def audit_writer_loop():
+    """Flush the audit buffer every AUDIT_FLUSH_MS (sooner when it fills) and prune hourly"""
+    while True:
+        audit_pending.wait(timeout=AUDIT_FLUSH_MS / 1000)
+        audit_pending.clear()
+        flush_audit_buffer()
+        
+        if time.monotonic() - audit_writer['last_prune'] >= AUDIT_PRUNE_INTERVAL_SECONDS:
+            audit_writer['last_prune'] = time.monotonic()
+            try:
+                prune_audit_log()
+            except sqlite3.Error as e:
+                print(f"Audit log pruning failed: {e}")
+
+def start_audit_writer():
+    """Start the audit writer thread once per process"""
+    if audit_writer['thread'] is not None:
+        return
+    thread = threading.Thread(target=audit_writer_loop, name='audit-writer', daemon=True)
+    audit_writer['thread'] = thread
+    thread.start()
+
+def audit_entry_to_dict(entry):
+    """Serialize an audit log row"""
+    return {
+        'id': entry['id'],
+        'occurred_at': entry['occurred_at'],
+        'event_type': entry['event_type'],
+        'entity_type': entry['entity_type'],
+        'entity_id': entry['entity_id'],
+        'actor': entry['actor'],
+        'data': json.loads(entry['data']) if entry['data'] else None
+    }
+
+def submit_tweet_insert(account_id, text, chash, priority, media_ids):
+    """Queue a tweet for the group-commit writer and wait for its row id; returns (tweet_id, duplicate row or None)"""
+    start_tweet_writer()
+    item = {
+        'row': (account_id, text, chash, priority, 'pending', datetime.utcnow().isoformat()),
+        'media_ids': media_ids,
+        'done': threading.Event(),
+        'tweet_id': None,
+        'duplicate': None,
+        'error': None
+    }
+    with tweet_write_lock:
+        tweet_write_buffer.append(item)
+        if len(tweet_write_buffer) >= GROUP_COMMIT_MAX_ROWS:
+            tweet_write_full.set()
+    tweet_write_pending.set()
+    
+    if not item['done'].wait(GROUP_COMMIT_TIMEOUT_SECONDS):
+        raise RuntimeError('Timed out waiting for the tweet writer')
+    if item['error']:
+        raise RuntimeError(item['error'])
+    return item['tweet_id'], item['duplicate']
+
+def write_tweet_batch(conn, items):
+    """Insert queued tweets in one transaction; rechecks duplicates so two queued copies can't both get in"""
+    for item in items:
+        account_id, text, chash = item['row'][:3]
+        if DUPLICATE_POLICY == 'reject' and text.strip():
+            item['duplicate'] = find_duplicate(conn, account_id, chash, ('pending', 'posted'))
+            if item['duplicate']:
+                continue
+        cursor = conn.execute(
+            'INSERT INTO tweet (twitter_account_id, content, content_hash, priority, status, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            item['row']
+        )
+        item['tweet_id'] = cursor.lastrowid
+        attach_media(conn, item['tweet_id'], item['media_ids'])
+    conn.commit()
+
+def flush_tweet_writes(conn):
+    """Write up to GROUP_COMMIT_MAX_ROWS queued tweets and wake their requests; returns how many were taken"""
+    with tweet_write_lock:
+        items = tweet_write_buffer[:GROUP_COMMIT_MAX_ROWS]
+        del tweet_write_buffer[:GROUP_COMMIT_MAX_ROWS]
+        if len(tweet_write_buffer) < GROUP_COMMIT_MAX_ROWS:
+            tweet_write_full.clear()
+        if not tweet_write_buffer:
+            tweet_write_pending.clear()
+    if not items:
+        return 0
+    
+    try:
+        write_tweet_batch(conn, items)
+    except sqlite3.Error as e:
+        conn.rollback()
+        # Retry one by one so a single bad row doesn't fail everyone in the batch
+        print(f"Tweet batch of {len(items)} failed ({e}); writing rows individually")
+        for item in items:
+            try:
+                write_tweet_batch(conn, [item])
+            except sqlite3.Error as row_error:
+                conn.rollback()
+                item['tweet_id'], item['duplicate'], item['error'] = None, None, str(row_error)
+    
+    for item in items:
+        item['done'].set()
+    return len(items)
+
+def tweet_writer_loop():
+    """Flush queued tweet inserts every GROUP_COMMIT_MAX_WAIT_MS, or as soon as a full batch is waiting"""
+    conn = get_db()
+    while True:
+        tweet_write_pending.wait()
+        # Give concurrent requests a moment to join the batch unless it is already full
+        tweet_write_full.wait(timeout=GROUP_COMMIT_MAX_WAIT_MS / 1000)
+        try:
+            flush_tweet_writes(conn)
+        except Exception as e:
+            print(f"Tweet writer error: {e}")
+            conn.close()
+            conn = get_db()
+
+def start_tweet_writer():
+    """Start the group-commit tweet writer thread once per process"""
+    if not TWEET_GROUP_COMMIT or tweet_writer['thread'] is not None:
+        return
+    with tweet_write_lock:
+        if tweet_writer['thread'] is not None:
+            return
+        thread = threading.Thread(target=tweet_writer_loop, name='tweet-writer', daemon=True)
+        tweet_writer['thread'] = thread
+        thread.start()
+
+def media_category(mime_type):
+    """Twitter media_category for a MIME type"""
+    if mime_type == 'image/gif':
+        return 'tweet_gif'
+    if mime_type.startswith('video/'):
+        return 'tweet_video'
+    return 'tweet_image'
+
+def validate_media_ids(conn, media_ids):
+    """Check a list of media asset ids; returns (asset_ids, error)"""
+    if media_ids is None:
+        return [], None
+    if not isinstance(media_ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in media_ids):
+        return None, {'field': 'media_ids', 'code': 'invalid_type', 'message': 'media_ids must be an array of integers'}
+    if len(media_ids) > MAX_MEDIA_PER_TWEET:
+        return None, {'field': 'media_ids', 'code': 'too_many', 'message': f'At most {MAX_MEDIA_PER_TWEET} media per tweet'}
+    if media_ids:
+        found = {row['id'] for row in conn.execute(
+            f"SELECT id FROM media_asset WHERE id IN ({','.join('?' * len(media_ids))})", media_ids
+        )}
+        missing = [i for i in media_ids if i not in found]
+        if missing:
+            return None, {'field': 'media_ids', 'code': 'not_found', 'message': f'Media not found: {missing}'}
+    return media_ids, None
+
+def attach_media(conn, tweet_id, asset_ids):
+    """Link media assets to a tweet in order"""
+    conn.executemany(
+        'INSERT INTO tweet_media (tweet_id, asset_id, position) VALUES (?, ?, ?)',
+        [(tweet_id, asset_id, position) for position, asset_id in enumerate(asset_ids)]
+    )
+
+def get_tweet_media(conn, tweet_id):
+    """Media asset ids attached to a tweet"""
+    rows = conn.execute(
+        'SELECT asset_id FROM tweet_media WHERE tweet_id = ? ORDER BY position',
+        (tweet_id,)
+    ).fetchall()
+    return [row['asset_id'] for row in rows]
+
+def upload_media_chunked(access_token, asset):
+    """Upload a stored file with INIT/APPEND/FINALIZE; returns (media_id, expires_in_seconds)"""
+    headers = {'Authorization': f'Bearer {access_token}'}
+    
+    response = requests.post(MEDIA_UPLOAD_URL, headers=headers, data={
+        'command': 'INIT',
+        'total_bytes': asset['size'],
+        'media_type': asset['mime_type'],
+        'media_category': asset['media_category']
+    })
+    if response.status_code not in (200, 201, 202):
+        raise RuntimeError(f"Media INIT failed (status {response.status_code}): {response.text}")
+    body = response.json()
+    info = body.get('data', body)
+    media_id = str(info.get('id') or info.get('media_id_string'))
+    
+    # Stream the file from disk one chunk at a time
+    with open(asset['path'], 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for segment_index, offset in enumerate(range(0, asset['size'], MEDIA_CHUNK_SIZE)):
+                response = requests.post(
+                    MEDIA_UPLOAD_URL,
+                    headers=headers,
+                    data={'command': 'APPEND', 'media_id': media_id, 'segment_index': segment_index},
+                    files={'media': ('chunk', mapped[offset:offset + MEDIA_CHUNK_SIZE], 'application/octet-stream')}
+                )
+                if response.status_code >= 300:
+                    raise RuntimeError(f"Media APPEND failed (status {response.status_code}): {response.text}")
+    
+    response = requests.post(MEDIA_UPLOAD_URL, headers=headers, data={'command': 'FINALIZE', 'media_id': media_id})
+    if response.status_code not in (200, 201, 202):
+        raise RuntimeError(f"Media FINALIZE failed (status {response.status_code}): {response.text}")
+    body = response.json()
+    info = body.get('data', body)
+    expires_in = info.get('expires_after_secs', 86400)
+    
+    # Videos and GIFs are processed asynchronously
+    processing = info.get('processing_info')
+    while processing and processing.get('state') in ('pending', 'in_progress'):
+        time.sleep(processing.get('check_after_secs', 1))
+        response = requests.get(MEDIA_UPLOAD_URL, headers=headers, params={'command': 'STATUS', 'media_id': media_id})
+        body = response.json()
+        processing = body.get('data', body).get('processing_info')
+    if processing and processing.get('state') == 'failed':
+        raise RuntimeError(f"Media processing failed: {processing.get('error')}")
+    
+    return media_id, expires_in
+
+def ensure_media_uploaded(asset_id, account_id, access_token):
+    """Twitter media_id for an asset and account, uploading only if no unexpired upload is cached"""
+    conn = get_db()
+    try:
+        # Keep a safety margin so a cached id does not expire mid-post
+        cutoff = (datetime.utcnow() + timedelta(minutes=10)).isoformat()
+        cached = conn.execute(
+            'SELECT media_id FROM media_upload WHERE asset_id = ? AND account_id = ? AND expires_at > ?',
+            (asset_id, account_id, cutoff)
+        ).fetchone()
+        if cached:
+            return cached['media_id']
+        
+        asset = conn.execute('SELECT * FROM media_asset WHERE id = ?', (asset_id,)).fetchone()
+        if not asset:
+            raise RuntimeError(f'Media {asset_id} not found')
+        
+        media_id, expires_in = upload_media_chunked(access_token, asset)
+        now = datetime.utcnow()
+        conn.execute('''
+            INSERT INTO media_upload (asset_id, account_id, media_id, expires_at, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(asset_id, account_id) DO UPDATE SET
+                media_id = excluded.media_id,
+                expires_at = excluded.expires_at,
+                created_at = excluded.created_at
+        ''', (asset_id, account_id, media_id, (now + timedelta(seconds=expires_in)).isoformat(), now.isoformat()))
+        conn.commit()
+        return media_id
+    finally:
+        conn.close()
+
+def prefetch_media_uploads(executor, conn, tweets):
+    """Start media uploads for a batch of tweets in the background; returns futures per tweet id"""
+    futures = {}
+    for tweet in tweets:
+        asset_ids = get_tweet_media(conn, tweet['id'])
+        if not asset_ids or mock_mode_override['enabled']:
+            continue
+        account = conn.execute(
+            'SELECT access_token FROM twitter_account WHERE id = ?',
+            (tweet['twitter_account_id'],)
+        ).fetchone()
+        if not account:
+            continue
+        access_token = decrypt_token(account['access_token'])
+        futures[tweet['id']] = [
+            executor.submit(ensure_media_uploaded, asset_id, tweet['twitter_account_id'], access_token)
+            for asset_id in asset_ids
+        ]
+    return futures
+
+def expire_account_token(conn, account_id, username):
+    """Mark an account whose token Twitter rejected while posting; commits with the caller's transaction"""
+    conn.execute(
+        "UPDATE twitter_account SET status = 'token_expired', verify_error = ?, updated_at = ? WHERE id = ?",
+        ('Token rejected while posting (401)', datetime.utcnow().isoformat(), account_id)
+    )
+    bump_cache_version(conn, 'accounts')
+    emit_event(conn, 'account.token_expired', {'account_id': account_id, 'username': username})
+    audit('account.token_expired', 'account', account_id, {'username': username})
+
+def post_to_twitter(account_id, tweet_text, reply_to=None, media_asset_ids=None):
+    """Post a tweet to Twitter using the account's credentials (optionally as a reply, with media)"""
+    conn = get_db()
+    
+    # Get account credentials
+    account = conn.execute(
+        'SELECT * FROM twitter_account WHERE id = ?', 
+        (account_id,)
+    ).fetchone()
+    
+    if not account:
+        conn.close()
+        return False, "Account not found"
+    
+    # Check if mock mode
+    if mock_mode_override['enabled']:
+        conn.close()
+        mock_tweet_id = f"mock_{datetime.now().timestamp()}"
+        print(f"[MOCK MODE] Would post tweet for {account['username']}: {tweet_text}")
+        return True, mock_tweet_id
+    
+    try:
+        # Decrypt tokens
+        access_token = decrypt_token(account['access_token'])
+        access_token_secret = decrypt_token(account['access_token_secret']) if account['access_token_secret'] else None
+        
+        print(f"Posting tweet for account: {account['username']}")
+        print(f"OAuth type: {'OAuth 2.0' if not access_token_secret or not access_token_secret.strip() else 'OAuth 1.0a'}")
+        
+        # Check if OAuth 2.0 (no secret) or OAuth 1.0a (with secret)
+        if access_token_secret and access_token_secret.strip():
+            # OAuth 1.0a - use direct API call (tweepy has Python 3.13 issues)
+            conn.close()
+            return False, "OAuth 1.0a not supported. Please re-authorize with OAuth 2.0."
+        else:
+            # OAuth 2.0 - direct API call
+            headers = {
+                'Authorization': f'Bearer {access_token}',
+                'Content-Type': 'application/json'
+            }
+            
+            # Media-only tweets are sent without a text field
+            data = {'text': tweet_text} if tweet_text else {}
+            if reply_to:
+                data['reply'] = {'in_reply_to_tweet_id': reply_to}
+            if media_asset_ids:
+                data['media'] = {'media_ids': [
+                    ensure_media_uploaded(asset_id, account_id, access_token)
+                    for asset_id in media_asset_ids
+                ]}
+            
+            response = requests.post(
+                'https://api.twitter.com/2/tweets',
+                headers=headers,
+                json=data
+            )
+            
+            try:
+                record_rate_limit(conn, account_id, 'tweets', response)
+            except Exception as e:
+                print(f"Could not record rate limit for account {account_id}: {e}")
+            
+            if response.status_code != 201:
+                if response.status_code == 401:
+                    expire_account_token(conn, account_id, account['username'])
+                    conn.commit()
+                conn.close()
+                error_msg = f"Twitter API error (status {response.status_code}): {response.text}"
+                print(error_msg)
+                return False, error_msg
+            
+            tweet_id = response.json()['data']['id']
+        
+        conn.close()
+        print(f"Successfully posted tweet with ID: {tweet_id}")
+        return True, tweet_id
+        
+    except Exception as e:
+        conn.close()
+        error_msg = f"Exception during posting: {str(e)}"
+        print(error_msg)
+        return False, error_msg
+
+def delete_remote_tweet(account, twitter_id):
+    """Delete one tweet on Twitter; returns (outcome, error, response) with outcome deleted, rate_limited, unauthorized or failed"""
+    if mock_mode_override['enabled']:
+        print(f"[MOCK MODE] Would delete tweet {twitter_id} for {account['username']}")
+        return 'deleted', None, None
+    try:
+        response = requests.delete(
+            f'https://api.twitter.com/2/tweets/{twitter_id}',
+            headers={'Authorization': f'Bearer {decrypt_token(account["access_token"])}'},
+            timeout=REMOTE_DELETE_TIMEOUT_SECONDS
+        )
+    except requests.RequestException as e:
+        return 'failed', f'Request failed: {e}', None
+    
+    # A tweet that is already gone on Twitter counts as deleted
+    if response.status_code in (200, 404):
+        return 'deleted', None, response
+    if response.status_code == 429:
+        return 'rate_limited', 'Rate limited (429)', response
+    if response.status_code in (401, 403):
+        return 'unauthorized', f'Token rejected ({response.status_code})', response
+    return 'failed', f'Twitter API error (status {response.status_code}): {response.text[:200]}', response
+
+def endpoint_class():
+    """Admission class of the current request, or None if it is not limited"""
+    if request.endpoint in ADMISSION_EXEMPT:
+        return None
+    if request.endpoint == 'delete_tweet' and request.args.get('remote', '').lower() not in ('1', 'true'):
+        return None  # only ?remote=true calls Twitter
+    if request.endpoint in ENDPOINT_CLASSES:
+        return ENDPOINT_CLASSES[request.endpoint]
+    return 'read' if request.method == 'GET' else None
+
+def acquire_admission_slot(admission_class):
+    """Take one of the class's slots without waiting on a request; returns the held lock fd or None if all are busy.
+    
+    Slots are flock'd files shared by every worker process; the lock is released when the
+    fd is closed, including when the process dies. A full class is checked once more after
+    ADMISSION_RECHECK_MS, so a slot held for an instant by admission_usage() does not shed.
+    """
+    os.makedirs(ADMISSION_DIR, exist_ok=True)
+    for attempt in range(2):
+        if attempt:
+            time.sleep(ADMISSION_RECHECK_MS / 1000)
+        for slot in range(ADMISSION_LIMITS[admission_class]):
+            fd = os.open(os.path.join(ADMISSION_DIR, f'{admission_class}-{slot}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+    return None
+
+def release_admission_slot(fd):
+    """Give back a slot taken by acquire_admission_slot"""
+    if fd is not None:
+        os.close(fd)
+
+def admission_usage():
+    """Busy and total slots per class (probed one slot at a time; acquire_admission_slot re-checks, so a probe never sheds)"""
+    os.makedirs(ADMISSION_DIR, exist_ok=True)
+    usage = {}
+    for admission_class, limit in ADMISSION_LIMITS.items():
+        busy = 0
+        if fcntl is not None:
+            for slot in range(limit):
+                fd = os.open(os.path.join(ADMISSION_DIR, f'{admission_class}-{slot}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    busy += 1
+                finally:
+                    os.close(fd)
+        usage[admission_class] = {'limit': limit, 'busy': busy}
+    return usage
+
+@app.before_request
+def admit_request():
+    """Shed requests over their class's concurrency limit with a fast 503"""
+    admission_class = endpoint_class()
+    if admission_class is None or not ADMISSION_LIMITS.get(admission_class) or fcntl is None:
+        return None
+    
+    fd = acquire_admission_slot(admission_class)
+    if fd is None:
+        retry_after = ADMISSION_RETRY_AFTER[admission_class]
+        response = jsonify({
+            'error': 'Server busy, retry later',
+            'endpoint_class': admission_class,
+            'retry_after': retry_after
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    g.admission_slot = fd
+    return None
+
+@app.teardown_request
+def release_request_slot(exc):
+    """Release the admission slot (unless an async job took it over)"""
+    release_admission_slot(g.pop('admission_slot', None))
+
+@app.before_request
+def start_background_workers():
+    """Start per-process background workers on the first request"""
+    start_webhook_worker()
+    start_audit_writer()
+    start_account_prober()
+    start_metrics_collector()
+    start_tweet_writer()
+
+@app.after_request
+def add_db_trace_headers(response):
+    """Report the statements run for this request when SQL tracing is on"""
+    trace = g.get('db_trace')
+    if trace is not None and (SQL_TRACE or app.debug):
+        response.headers['X-DB-Queries'] = str(trace['queries'])
+        response.headers['X-DB-Time'] = f"{trace['time_ms']:.2f}"
+        print(f"{request.method} {request.path}: {trace['queries']} queries, {trace['time_ms']:.2f} ms")
+    return response
+
+# WORKING ENDPOINTS
+
+@app.route('/api/v1/health', methods=['GET'])
+def health():
+    """Health check - no auth required"""
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.utcnow().isoformat(),
+        'version': '2.0.0-simple'
+    })
+
+@app.route('/api/v1/admission', methods=['GET'])
+def get_admission():
+    """Concurrency limits and busy slots per endpoint class"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    return jsonify({
+        'enabled': fcntl is not None,
+        'classes': admission_usage()
+    })
+
+@app.route('/api/v1/test', methods=['GET'])
+def test():
+    """Test endpoint with API key"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    return jsonify({
+        'status': 'success',
+        'message': 'API key validated!'
+    })
+
+@app.route('/api/v1/accounts', methods=['GET'])
+@cached_response('accounts')
+def get_accounts():
+    """Get all Twitter accounts"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    account_type = request.args.get('type')
+    
+    try:
+        conn = get_db()
+        if account_type:
+            cursor = conn.execute(
+                'SELECT id, username, status, account_type, created_at FROM twitter_account WHERE account_type = ? ORDER BY created_at DESC',
+                (account_type,)
+            )
+        else:
+            cursor = conn.execute('SELECT id, username, status, account_type, created_at FROM twitter_account ORDER BY created_at DESC')
+        accounts = cursor.fetchall()
+        conn.close()
+        
+        result = []
+        for acc in accounts:
+            result.append({
+                'id': acc['id'],
+                'username': acc['username'],
+                'status': acc['status'],
+                'account_type': acc['account_type'] if 'account_type' in acc.keys() else 'managed',
+                'created_at': acc['created_at']
+            })
+        
+        return jsonify({
+            'accounts': result,
+            'total': len(result)
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/accounts/<int:account_id>', methods=['GET'])
+@cached_response('accounts')
+def get_account(account_id):
+    """Get specific account"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    try:
+        conn = get_db()
+        cursor = conn.execute('SELECT * FROM twitter_account WHERE id = ?', (account_id,))
+        account = cursor.fetchone()
+        conn.close()
+        
+        if not account:
+            return jsonify({'error': 'Account not found'}), 404
+        
+        return jsonify({
+            'id': account['id'],
+            'username': account['username'],
+            'status': account['status'],
+            'created_at': account['created_at'],
+            'last_verified_at': account['last_verified_at'],
+            'verify_error': account['verify_error']
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Account Type Management
+@app.route('/api/v1/accounts/<int:account_id>/set-type', methods=['POST'])
+def set_account_type(account_id):
+    """Set account type (managed or list_owner)"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    data = request.get_json()
+    if not data or 'account_type' not in data:
+        return jsonify({'error': 'account_type is required'}), 400
+    
+    account_type = data['account_type']
+    if account_type not in ['managed', 'list_owner']:
+        return jsonify({'error': 'account_type must be "managed" or "list_owner"'}), 400
+    
+    try:
+        conn = get_db()
+        
+        # Check if account exists
+        account = conn.execute(
+            'SELECT id, username FROM twitter_account WHERE id = ?',
+            (account_id,)
+        ).fetchone()
+        
+        if not account:
+            conn.close()
+            return jsonify({'error': 'Account not found'}), 404
+        
+        # Update account type
+        conn.execute(
+            'UPDATE twitter_account SET account_type = ?, updated_at = ? WHERE id = ?',
+            (account_type, datetime.utcnow().isoformat(), account_id)
+        )
+        
+        bump_cache_version(conn, 'accounts')
+        conn.commit()
+        conn.close()
+        audit('account.type_changed', 'account', account_id, {'account_type': account_type})
+        
+        return jsonify({
+            'message': f'Account type updated to {account_type}',
+            'account_id': account_id,
+            'username': account['username'],
+            'account_type': account_type
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/accounts/probe', methods=['POST'])
+def probe_accounts():
+    """Verify account credentials now (due accounts, or the given account_ids)"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    account_ids = data.get('account_ids')
+    if account_ids is not None and (not isinstance(account_ids, list) or not all(isinstance(a, int) for a in account_ids)):
+        return jsonify({'error': 'account_ids must be an array of integers'}), 400
+    
+    try:
+        return launch_job('account_probe', {'account_ids': account_ids}, probe_accounts_job, account_ids)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def probe_accounts_job(job_id, account_ids):
+    """Run one prober batch as a job, publishing a progress event per account"""
+    progress = JobProgress(job_id)
+    summary = run_account_probes(account_ids, progress)
+    conn = get_db()
+    progress.finish(conn, stats={k: v for k, v in summary.items() if k != 'changed'})
+    conn.close()
+    return summary, 200
+
+@app.route('/api/v1/tweet', methods=['POST'])
+def create_tweet():
+    """Create a new tweet"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    data = request.get_json()
+    if not data or 'account_id' not in data or ('text' not in data and not data.get('media_ids')):
+        return jsonify({'error': 'Missing text or account_id'}), 400
+    text = data.get('text') or ''
+    
+    # Reject text Twitter would refuse before it reaches the dispatcher
+    weighted_length, errors = validate_tweet_text(text, allow_empty=bool(data.get('media_ids')))
+    priority, priority_error = parse_priority(data.get('priority'))
+    if priority_error:
+        errors.append(priority_error)
+    if errors:
+        return jsonify({
+            'error': 'Invalid tweet',
+            'errors': errors,
+            'weighted_length': weighted_length
+        }), 400
+    
+    try:
+        conn = get_db()
+        
+        media_ids, media_error = validate_media_ids(conn, data.get('media_ids'))
+        if media_error:
+            conn.close()
+            return jsonify({'error': 'Invalid tweet', 'errors': [media_error]}), 400
+        
+        chash = content_hash(text)
+        
+        # Check for duplicate content from the same account
+        warning = None
+        if DUPLICATE_POLICY != 'allow' and text.strip():
+            duplicate = find_duplicate(conn, data['account_id'], chash, ('pending', 'posted'))
+            if duplicate and DUPLICATE_POLICY == 'reject':
+                conn.close()
+                return jsonify({
+                    'error': 'Duplicate tweet content for this account',
+                    'duplicate_of': duplicate['id'],
+                    'duplicate_status': duplicate['status']
+                }), 409
+            if duplicate:
+                warning = f"Duplicate of tweet {duplicate['id']} ({duplicate['status']})"
+        
+        if TWEET_GROUP_COMMIT:
+            # The writer thread commits this row together with other requests' rows
+            conn.close()
+            tweet_id, duplicate = submit_tweet_insert(data['account_id'], text, chash, priority, media_ids)
+            if duplicate:
+                return jsonify({
+                    'error': 'Duplicate tweet content for this account',
+                    'duplicate_of': duplicate['id'],
+                    'duplicate_status': duplicate['status']
+                }), 409
+        else:
+            cursor = conn.execute(
+                'INSERT INTO tweet (twitter_account_id, content, content_hash, priority, status, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (data['account_id'], text, chash, priority, 'pending', datetime.utcnow().isoformat())
+            )
+            tweet_id = cursor.lastrowid
+            attach_media(conn, tweet_id, media_ids)
+            conn.commit()
+            conn.close()
+        
+        result = {
+            'message': 'Tweet created successfully',
+            'tweet_id': tweet_id,
+            'weighted_length': weighted_length
+        }
+        if warning:
+            result['warning'] = warning
+        
+        return jsonify(result), 201
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/tweets/bulk', methods=['POST'])
+def create_tweets_bulk():
+    """Create many tweets in one request, reporting errors per item"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    data = request.get_json()
+    if not data or not isinstance(data.get('tweets'), list):
+        return jsonify({'error': 'tweets array is required'}), 400
+    
+    items = data['tweets']
+    if len(items) > BULK_TWEET_LIMIT:
+        return jsonify({'error': f'At most {BULK_TWEET_LIMIT} tweets per request'}), 400
+    
+    try:
+        conn = get_db()
+        account_ids = {row['id'] for row in conn.execute('SELECT id FROM twitter_account')}
+        
+        created = []
+        failed = []
+        seen = {}
+        now = datetime.utcnow().isoformat()
+        
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                failed.append({'index': index, 'errors': [
+                    {'field': None, 'code': 'invalid_type', 'message': 'item must be an object'}
+                ]})
+                continue
+            
+            media_ids, media_error = validate_media_ids(conn, item.get('media_ids'))
+            weighted_length, errors = validate_tweet_text(item.get('text'), allow_empty=bool(media_ids))
+            priority, priority_error = parse_priority(item.get('priority'))
+            if priority_error:
+                errors.append(priority_error)
+            if media_error:
+                errors.append(media_error)
+            text = item.get('text') or ''
+            account_id = item.get('account_id')
+            if isinstance(account_id, bool) or not isinstance(account_id, int) or account_id not in account_ids:
+                errors.append({'field': 'account_id', 'code': 'not_found', 'message': 'Account not found'})
+            
+            warning = None
+            if not errors and DUPLICATE_POLICY != 'allow' and text.strip():
+                chash = content_hash(text)
+                duplicate_of = seen.get((account_id, chash))
+                if duplicate_of is None:
+                    duplicate = find_duplicate(conn, account_id, chash, ('pending', 'posted'))
+                    duplicate_of = duplicate['id'] if duplicate else None
+                if duplicate_of is not None and DUPLICATE_POLICY == 'reject':
+                    errors.append({
+                        'field': 'text',
+                        'code': 'duplicate',
+                        'message': f'Duplicate of tweet {duplicate_of}',
+                        'duplicate_of': duplicate_of
+                    })
+                elif duplicate_of is not None:
+                    warning = f'Duplicate of tweet {duplicate_of}'
+            
+            if errors:
+                failed.append({'index': index, 'account_id': account_id, 'errors': errors})
+                continue
+            
+            chash = content_hash(text)
+            cursor = conn.execute(
+                'INSERT INTO tweet (twitter_account_id, content, content_hash, priority, status, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (account_id, text, chash, priority, 'pending', now)
+            )
+            attach_media(conn, cursor.lastrowid, media_ids)
+            seen.setdefault((account_id, chash), cursor.lastrowid)
+            entry = {
+                'index': index,
+                'tweet_id': cursor.lastrowid,
+                'account_id': account_id,
+                'weighted_length': weighted_length
+            }
+            if warning:
+                entry['warning'] = warning
+            created.append(entry)
+        
+        conn.commit()
+        conn.close()
+        
+        return jsonify({
+            'message': f'Created {len(created)} of {len(items)} tweets',
+            'created': created,
+            'failed': failed,
+            'created_count': len(created),
+            'failed_count': len(failed)
+        }), 201 if created else 400
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def open_import_stream():
+    """Text stream and format ('csv' or 'ndjson') of an import upload (multipart file or raw body)"""
+    upload = request.files.get('file')
+    if upload is not None:
+        raw, content_type, filename = upload.stream, upload.mimetype or '', upload.filename or ''
+    else:
+        raw, content_type, filename = request.stream, request.mimetype or '', ''
+    
+    fmt = request.args.get('format')
+    if not fmt:
+        if 'csv' in content_type or filename.endswith('.csv'):
+            fmt = 'csv'
+        elif 'ndjson' in content_type or 'jsonl' in content_type or filename.endswith(('.ndjson', '.jsonl')):
+            fmt = 'ndjson'
+    
+    if not isinstance(raw, io.BufferedIOBase):
+        raw = io.BufferedReader(raw)
+    return io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''), fmt
+
+def iter_import_rows(stream, fmt):
+    """Yield (row, error) pairs one line at a time, so memory use does not grow with the upload"""
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {k: v for k, v in row.items() if k and v not in (None, '')}, None
+        return
+    
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield None, 'Each line must be a JSON object'
+            continue
+        yield row, None
+
+def resolve_import_account(row, ctx):
+    """Account id for a row's account_id or username, checked against the preloaded accounts"""
+    if row.get('account_id') not in (None, ''):
+        try:
+            account_id = int(row['account_id'])
+        except (TypeError, ValueError):
+            return None, 'account_id must be an integer'
+        if account_id not in ctx['account_ids']:
+            return None, f'Account {account_id} not found'
+        return account_id, None
+    if row.get('username'):
+        account_id = ctx['usernames'].get(str(row['username']).lstrip('@').lower())
+        if account_id is None:
+            return None, f"Account @{row['username']} not found"
+        return account_id, None
+    return None, 'account_id or username is required'
+
+def import_row(conn, row, ctx):
+    """Validate and write one import row; returns (kind, error)"""
+    kind = row.get('type')
+    now = datetime.utcnow().isoformat()
+    
+    if kind == 'account':
+        username = str(row.get('username') or '').lstrip('@')
+        if not username or not row.get('access_token'):
+            return kind, 'username and access_token are required'
+        account_type = row.get('account_type', 'managed')
+        if account_type not in ('managed', 'list_owner'):
+            return kind, 'account_type must be "managed" or "list_owner"'
+        access_token = get_fernet().encrypt(str(row['access_token']).encode()).decode()
+        refresh_token = get_fernet().encrypt(str(row['refresh_token']).encode()).decode() if row.get('refresh_token') else None
+        
+        existing = ctx['usernames'].get(username.lower())
+        if existing:
+            conn.execute(
+                'UPDATE twitter_account SET access_token = ?, refresh_token = ?, account_type = ?, status = ?, updated_at = ? WHERE id = ?',
+                (access_token, refresh_token, account_type, 'active', now, existing)
+            )
+            ctx['counts']['accounts_updated'] += 1
+        else:
+            cursor = conn.execute(
+                'INSERT INTO twitter_account (username, access_token, refresh_token, account_type, status, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (username, access_token, refresh_token, account_type, 'active', now)
+            )
+            ctx['usernames'][username.lower()] = cursor.lastrowid
+            ctx['account_ids'].add(cursor.lastrowid)
+            ctx['counts']['accounts'] += 1
+        return kind, None
+    
+    if kind == 'tweet':
+        account_id, error = resolve_import_account(row, ctx)
+        if error:
+            return kind, error
+        text = row.get('text')
+        if not isinstance(text, str):
+            return kind, 'text is required'
+        priority = row.get('priority')
+        if isinstance(priority, str):
+            try:
+                priority = int(priority)
+            except ValueError:
+                pass
+        priority, priority_error = parse_priority(priority)
+        weighted_length, errors = validate_tweet_text(text)
+        if priority_error:
+            errors.append(priority_error)
+        if errors:
+            return kind, '; '.join(e['message'] for e in errors)
+        
+        chash = content_hash(text)
+        if DUPLICATE_POLICY == 'reject':
+            duplicate = find_duplicate(conn, account_id, chash, ('pending', 'posted'))
+            if duplicate:
+                return kind, f"Duplicate of tweet {duplicate['id']}"
+        conn.execute(
+            'INSERT INTO tweet (twitter_account_id, content, content_hash, priority, status, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (account_id, text, chash, priority, 'pending', now)
+        )
+        ctx['counts']['tweets'] += 1
+        return kind, None
+    
+    if kind == 'list_member':
+        try:
+            list_id = int(row.get('list_id'))
+        except (TypeError, ValueError):
+            return kind, 'list_id must be an integer'
+        if list_id not in ctx['list_ids']:
+            return kind, f'List {list_id} not found'
+        account_id, error = resolve_import_account(row, ctx)
+        if error:
+            return kind, error
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO list_membership (list_id, account_id) VALUES (?, ?)',
+            (list_id, account_id)
+        )
+        ctx['counts']['list_members' if cursor.rowcount else 'list_members_existing'] += 1
+        return kind, None
+    
+    return kind, 'type must be one of account, tweet, list_member'
+
+@app.route('/api/v1/import', methods=['POST'])
+def import_data():
+    """Stream a CSV or NDJSON import of accounts, tweets and list memberships"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    on_error = request.args.get('on_error', 'skip')
+    resume_id = request.args.get('resume', type=int)
+    if on_error not in ('skip', 'abort'):
+        return jsonify({'error': 'on_error must be "skip" or "abort"'}), 400
+    
+    stream, fmt = open_import_stream()
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Send CSV or NDJSON (set Content-Type, a .csv/.ndjson file name, or ?format=)'}), 400
+    
+    try:
+        conn = get_db()
+        
+        if resume_id:
+            job = conn.execute("SELECT * FROM job WHERE id = ? AND kind = 'import'", (resume_id,)).fetchone()
+            if not job:
+                conn.close()
+                return jsonify({'error': 'Import not found'}), 404
+            if job['status'] == 'completed':
+                conn.close()
+                return jsonify({'error': 'Import already completed', 'job': job_to_dict(job)}), 409
+            job_id = resume_id
+            report = json.loads(job['stats'])
+            conn.execute("UPDATE job SET status = 'running', finished_at = NULL WHERE id = ?", (job_id,))
+        else:
+            report = {
+                'format': fmt,
+                'on_error': on_error,
+                'committed_rows': 0,
+                'counts': dict.fromkeys(IMPORT_COUNTERS, 0),
+                'error_count': 0,
+                'errors': []
+            }
+            job_id = create_job(conn, 'import', {'format': fmt, 'on_error': on_error})
+        conn.commit()
+        publish_event('job.started', {'kind': 'import', 'resume_from_row': report['committed_rows']}, job_id=job_id)
+        
+        # Preload ids once so rows are validated without a lookup query each
+        usernames = {row['username'].lower(): row['id'] for row in conn.execute('SELECT id, username FROM twitter_account')}
+        ctx = {
+            'usernames': usernames,
+            'account_ids': set(usernames.values()),
+            'list_ids': {row['id'] for row in conn.execute('SELECT id FROM twitter_list')},
+            'counts': dict.fromkeys(IMPORT_COUNTERS, 0)
+        }
+        
+        progress = JobProgress(job_id)
+        progress.succeeded = sum(report['counts'].values())
+        progress.failed = report['error_count']
+        progress.done = report['committed_rows']
+        
+        row_number = 0
+        chunk_rows = 0
+        chunk_errors = []
+        aborted = None
+        
+        def commit_chunk():
+            # The chunk and the report's offset are committed together, so a resume never repeats or skips rows
+            for key, value in ctx['counts'].items():
+                report['counts'][key] += value
+            if ctx['counts']['accounts'] or ctx['counts']['accounts_updated']:
+                bump_cache_version(conn, 'accounts')
+            if ctx['counts']['list_members']:
+                bump_cache_version(conn, 'lists')
+            report['errors'].extend(chunk_errors[:max(IMPORT_MAX_ERRORS - len(report['errors']), 0)])
+            report['error_count'] += len(chunk_errors)
+            report['committed_rows'] = row_number
+            conn.execute(
+                'UPDATE job SET total = ?, succeeded = ?, failed = ?, stats = ? WHERE id = ?',
+                (row_number, sum(report['counts'].values()), report['error_count'], json.dumps(report), job_id)
+            )
+            conn.commit()
+            progress.chunk(chunk_rows - len(chunk_errors), len(chunk_errors), {'committed_rows': row_number})
+            ctx['counts'] = dict.fromkeys(IMPORT_COUNTERS, 0)
+        
+        try:
+            for row, error in iter_import_rows(stream, fmt):
+                row_number += 1
+                if row_number <= report['committed_rows']:
+                    continue  # committed by an earlier attempt
+                
+                kind = None
+                if error is None:
+                    kind, error = import_row(conn, row, ctx)
+                chunk_rows += 1
+                if error:
+                    chunk_errors.append({'row': row_number, 'type': kind, 'error': error})
+                    if on_error == 'abort':
+                        conn.rollback()
+                        aborted = chunk_errors[-1]
+                        row_number = report['committed_rows']
+                        break
+                
+                if chunk_rows >= IMPORT_CHUNK_SIZE:
+                    commit_chunk()
+                    chunk_rows = 0
+                    chunk_errors = []
+            
+            if aborted is None and chunk_rows:
+                commit_chunk()
+        except Exception as e:
+            conn.rollback()
+            aborted = {'row': row_number, 'error': f'Import stopped: {e}'}
+        
+        status = 'failed' if aborted else 'completed'
+        if aborted:
+            report['aborted'] = aborted
+        progress.finish(conn, status, report)
+        audit('import.' + status, 'job', job_id, {'counts': report['counts'], 'committed_rows': report['committed_rows']})
+        job = conn.execute('SELECT * FROM job WHERE id = ?', (job_id,)).fetchone()
+        conn.close()
+        
+        result = {'job_id': job_id, 'status': status, 'report': job_to_dict(job)['stats']}
+        if aborted:
+            result['resume_url'] = f'/api/v1/import?resume={job_id}'
+            return jsonify(result), 422
+        return jsonify(result)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/import/<int:job_id>', methods=['GET'])
+def get_import(job_id):
+    """Get an import's report"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    try:
+        conn = get_db()
+        job = conn.execute("SELECT * FROM job WHERE id = ? AND kind = 'import'", (job_id,)).fetchone()
+        conn.close()
+        
+        if not job:
+            return jsonify({'error': 'Import not found'}), 404
+        
+        return jsonify(job_to_dict(job))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/tweets', methods=['GET'])
+def get_tweets():
+    """Get all tweets"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    try:
+        conn = get_db()
+        cursor = conn.execute('''
+            SELECT t.id, t.content as text, t.status, t.created_at, a.username 
+            FROM tweet t 
+            JOIN twitter_account a ON t.twitter_account_id = a.id 
+            ORDER BY t.created_at DESC 
+            LIMIT 50
+        ''')
+        tweets = cursor.fetchall()
+        conn.close()
+        
+        result = []
+        for tweet in tweets:
+            result.append({
+                'id': tweet['id'],
+                'text': tweet['text'],
+                'status': tweet['status'],
+                'created_at': tweet['created_at'],
+                'username': tweet['username']
+            })
+        
+        return jsonify({
+            'tweets': result,
+            'total': len(result)
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def build_fts_query(q):
+    """Turn free text into a safe FTS5 query (each term quoted, trailing * kept as prefix)"""
+    terms = []
+    for term in q.split():
+        prefix = term.endswith('*')
+        term = term.rstrip('*')
+        if not term:
+            continue
+        terms.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+@app.route('/api/v1/tweets/search', methods=['GET'])
+def search_tweets():
+    """Full-text search over tweet content"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'error': 'q is required'}), 400
+
+    account_id = request.args.get('account_id', type=int)
+    status = request.args.get('status')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+
+    # raw=1 passes the query straight to FTS5 (AND/OR/NEAR, column filters, ...)
+    match = q if request.args.get('raw') in ('1', 'true') else build_fts_query(q)
+    if not match:
+        return jsonify({'error': 'q is required'}), 400
+
+    try:
+        conn = get_db()
+
+        if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tweet_fts'"
+        ).fetchone():
+            conn.close()
+            return jsonify({'error': 'Full-text search is not available on this server'}), 501
+
+        where = 'tweet_fts MATCH ?'
+        params = [match]
+        if account_id:
+            where += ' AND t.twitter_account_id = ?'
+            params.append(account_id)
+        if status:
+            where += ' AND t.status = ?'
+            params.append(status)
+
+        try:
+            total = conn.execute(f'''
+                SELECT COUNT(*) FROM tweet_fts
+                JOIN tweet t ON t.id = tweet_fts.rowid
+                WHERE {where}
+            ''', params).fetchone()[0]
+
+            rows = conn.execute(f'''
+                SELECT t.id, t.content as text, t.status, t.twitter_id, t.created_at, t.posted_at,
+                       t.twitter_account_id, a.username,
+                       bm25(tweet_fts) as score,
+                       snippet(tweet_fts, 0, '[', ']', '...', 12) as snippet
+                FROM tweet_fts
+                JOIN tweet t ON t.id = tweet_fts.rowid
+                JOIN twitter_account a ON t.twitter_account_id = a.id
+                WHERE {where}
+                ORDER BY score
+                LIMIT ? OFFSET ?
+            ''', params + [per_page, (page - 1) * per_page]).fetchall()
+        except sqlite3.OperationalError as e:
+            conn.close()
+            return jsonify({'error': 'Invalid search query', 'details': str(e)}), 400
+
+        conn.close()
+
+        result = []
+        for row in rows:
+            result.append({
+                'id': row['id'],
+                'text': row['text'],
+                'snippet': row['snippet'],
+                'status': row['status'],
+                'twitter_id': row['twitter_id'],
+                'account_id': row['twitter_account_id'],
+                'username': row['username'],
+                'created_at': row['created_at'],
+                'posted_at': row['posted_at'],
+                'score': row['score']
+            })
+
+        return jsonify({
+            'query': q,
+            'tweets': result,
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'pages': (total + per_page - 1) // per_page
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/tweets/duplicates', methods=['GET'])
+def get_duplicate_tweets():
+    """Report groups of tweets with identical content from the same account"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    account_id = request.args.get('account_id', type=int)
+    statuses = [s for s in request.args.get('status', '').split(',') if s]
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    
+    try:
+        conn = get_db()
+        
+        query = '''
+            SELECT t.twitter_account_id, a.username, t.content_hash,
+                   COUNT(*) as count,
+                   GROUP_CONCAT(t.id) as tweet_ids,
+                   GROUP_CONCAT(t.status) as statuses,
+                   MIN(t.created_at) as first_created_at,
+                   MAX(t.created_at) as last_created_at,
+                   MIN(t.content) as content
+            FROM tweet t
+            JOIN twitter_account a ON t.twitter_account_id = a.id
+            WHERE t.content_hash IS NOT NULL
+        '''
+        params = []
+        
+        if account_id:
+            query += ' AND t.twitter_account_id = ?'
+            params.append(account_id)
+        if statuses:
+            query += f" AND t.status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        
+        query += '''
+            GROUP BY t.twitter_account_id, t.content_hash
+            HAVING COUNT(*) > 1
+            ORDER BY count DESC
+            LIMIT ?
+        '''
+        params.append(limit)
+        
+        groups = conn.execute(query, params).fetchall()
+        conn.close()
+        
         result = []
-        for acc in accounts:
+        for group in groups:
             result.append({
-                'id': acc['id'],
-                'username': acc['username'],
-                'status': acc['status'],
-                'account_type': acc['account_type'] if 'account_type' in acc.keys() else 'managed',
-                'created_at': acc['created_at']
+                'account_id': group['twitter_account_id'],
+                'username': group['username'],
+                'content_hash': group['content_hash'],
+                'content': group['content'],
+                'count': group['count'],
+                'tweet_ids': [int(i) for i in group['tweet_ids'].split(',')],
+                'statuses': group['statuses'].split(','),
+                'first_created_at': group['first_created_at'],
+                'last_created_at': group['last_created_at']
+            })
+        
+        return jsonify({
+            'duplicates': result,
+            'total_groups': len(result),
+            'redundant_tweets': sum(g['count'] - 1 for g in result),
+            'policy': DUPLICATE_POLICY,
+            'window_days': DUPLICATE_WINDOW_DAYS
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/auth/twitter', methods=['GET'])
+def twitter_auth():
+    """Get Twitter OAuth URL"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    import secrets
+    import base64
+    import urllib.parse
+    
+    # Generate PKCE parameters
+    code_verifier = base64.urlsafe_b64encode(secrets.token_bytes(32)).decode('utf-8').rstrip('=')
+    code_challenge = base64.urlsafe_b64encode(
+        hashlib.sha256(code_verifier.encode('utf-8')).digest()
+    ).decode('utf-8').rstrip('=')
+    
+    # Generate state for CSRF protection
+    state = secrets.token_urlsafe(32)
+    
+    # Store code_verifier and state (in production, use Redis or database)
+    conn = get_db()
+    conn.execute(
+        'INSERT INTO oauth_state (state, code_verifier, created_at) VALUES (?, ?, ?)',
+        (state, code_verifier, datetime.utcnow().isoformat())
+    )
+    conn.commit()
+    conn.close()
+    
+    # Build OAuth URL
+    params = {
+        'response_type': 'code',
+        'client_id': TWITTER_CLIENT_ID,
+        'redirect_uri': TWITTER_CALLBACK_URL,
+        'scope': 'tweet.read tweet.write users.read list.read list.write media.write offline.access',
+        'state': state,
+        'code_challenge': code_challenge,
+        'code_challenge_method': 'S256'
+    }
+    
+    auth_url = f"https://twitter.com/i/oauth2/authorize?{urllib.parse.urlencode(params)}"
+    
+    return jsonify({
+        'auth_url': auth_url,
+        'state': state
+    })
+
+@app.route('/api/v1/auth/callback', methods=['GET', 'POST'])
+def auth_callback():
+    """Handle OAuth callback from Twitter (API endpoint version)"""
+    # For API endpoint, require API key
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    # Get parameters from request
+    if request.method == 'GET':
+        code = request.args.get('code')
+        state = request.args.get('state')
+    else:
+        data = request.get_json()
+        code = data.get('code')
+        state = data.get('state')
+    
+    if not code or not state:
+        return jsonify({'error': 'Missing code or state'}), 400
+    
+    # Retrieve code_verifier from database
+    conn = get_db()
+    oauth_data = conn.execute(
+        'SELECT code_verifier FROM oauth_state WHERE state = ?',
+        (state,)
+    ).fetchone()
+    
+    if not oauth_data:
+        conn.close()
+        return jsonify({'error': 'Invalid state'}), 400
+    
+    code_verifier = oauth_data['code_verifier']
+    
+    # Exchange code for tokens
+    token_url = 'https://api.twitter.com/2/oauth2/token'
+    
+    auth_string = f"{TWITTER_CLIENT_ID}:{TWITTER_CLIENT_SECRET}"
+    auth_bytes = auth_string.encode('ascii')
+    auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
+    
+    headers = {
+        'Authorization': f'Basic {auth_b64}',
+        'Content-Type': 'application/x-www-form-urlencoded'
+    }
+    
+    data = {
+        'code': code,
+        'grant_type': 'authorization_code',
+        'client_id': TWITTER_CLIENT_ID,
+        'redirect_uri': TWITTER_CALLBACK_URL,
+        'code_verifier': code_verifier
+    }
+    
+    response = requests.post(token_url, headers=headers, data=data)
+    
+    if response.status_code != 200:
+        conn.close()
+        return jsonify({
+            'error': 'Failed to exchange code for tokens',
+            'details': response.json()
+        }), 400
+    
+    tokens = response.json()
+    access_token = tokens['access_token']
+    refresh_token = tokens.get('refresh_token')
+    
+    # Get user info
+    user_response = requests.get(
+        'https://api.twitter.com/2/users/me',
+        headers={'Authorization': f'Bearer {access_token}'}
+    )
+    
+    if user_response.status_code != 200:
+        conn.close()
+        return jsonify({'error': 'Failed to get user info'}), 400
+    
+    user_data = user_response.json()['data']
+    username = user_data['username']
+    
+    # Encrypt tokens
+    encrypted_access_token = get_fernet().encrypt(access_token.encode()).decode()
+    encrypted_refresh_token = get_fernet().encrypt(refresh_token.encode()).decode() if refresh_token else None
+    
+    # Check if account exists
+    existing = conn.execute(
+        'SELECT id FROM twitter_account WHERE username = ?',
+        (username,)
+    ).fetchone()
+    
+    if existing:
+        # Update existing account
+        conn.execute(
+            'UPDATE twitter_account SET access_token = ?, refresh_token = ?, twitter_user_id = ?, status = ?, updated_at = ? WHERE username = ?',
+            (encrypted_access_token, encrypted_refresh_token, user_data['id'], 'active', datetime.utcnow().isoformat(), username)
+        )
+        account_id = existing['id']
+    else:
+        # Create new account
+        cursor = conn.execute(
+            'INSERT INTO twitter_account (username, twitter_user_id, access_token, access_token_secret, refresh_token, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (username, user_data['id'], encrypted_access_token, None, encrypted_refresh_token, 'active', datetime.utcnow().isoformat())
+        )
+        account_id = cursor.lastrowid
+    
+    # Clean up oauth_state
+    conn.execute('DELETE FROM oauth_state WHERE state = ?', (state,))
+    
+    bump_cache_version(conn, 'accounts')
+    conn.commit()
+    conn.close()
+    audit('account.reauthorized' if existing else 'account.authorized', 'account', account_id, {'username': username})
+    
+    return jsonify({
+        'message': 'Authorization successful',
+        'account_id': account_id,
+        'username': username
+    })
+
+@app.route('/api/v1/mock-mode', methods=['GET', 'POST'])
+def mock_mode():
+    """Get or set mock mode"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    if request.method == 'POST':
+        data = request.get_json()
+        if data and 'enabled' in data:
+            mock_mode_override['enabled'] = data['enabled']
+            audit('settings.mock_mode', data={'enabled': mock_mode_override['enabled']})
+            return jsonify({
+                'message': f"Mock mode {'enabled' if mock_mode_override['enabled'] else 'disabled'}",
+                'mock_mode': mock_mode_override['enabled']
+            })
+    
+    return jsonify({'mock_mode': mock_mode_override['enabled']})
+
+@app.route('/api/v1/stats', methods=['GET'])
+def get_stats():
+    """Get statistics"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    try:
+        conn = get_db()
+        
+        # Get counts per status (one grouped scan per table)
+        account_statuses = dict(conn.execute('SELECT status, COUNT(*) FROM twitter_account GROUP BY status').fetchall())
+        tweet_statuses = dict(conn.execute('SELECT status, COUNT(*) FROM tweet GROUP BY status').fetchall())
+        
+        # Credential prober results
+        stale_before = (datetime.utcnow() - timedelta(hours=ACCOUNT_PROBE_INTERVAL_HOURS * (1 + ACCOUNT_PROBE_JITTER))).isoformat()
+        verification = conn.execute('''
+            SELECT
+                SUM(CASE WHEN last_verified_at IS NULL THEN 1 ELSE 0 END) AS never_verified,
+                SUM(CASE WHEN last_verified_at < ? THEN 1 ELSE 0 END) AS stale,
+                SUM(CASE WHEN verify_error IS NOT NULL THEN 1 ELSE 0 END) AS with_errors,
+                MIN(last_verified_at) AS oldest_verified_at,
+                MAX(last_verified_at) AS last_verified_at
+            FROM twitter_account
+        ''', (stale_before,)).fetchone()
+        broken = conn.execute(f'''
+            SELECT id, username, status, verify_error, last_verified_at FROM twitter_account
+            WHERE status IN ({','.join('?' * len(BROKEN_ACCOUNT_STATUSES))})
+            ORDER BY id
+        ''', BROKEN_ACCOUNT_STATUSES).fetchall()
+        
+        conn.close()
+        
+        return jsonify({
+            'accounts': {
+                'total': sum(account_statuses.values()),
+                'active': account_statuses.get('active', 0),
+                'by_status': account_statuses,
+                'verification': {
+                    'never_verified': verification['never_verified'] or 0,
+                    'stale': verification['stale'] or 0,
+                    'with_errors': verification['with_errors'] or 0,
+                    'oldest_verified_at': verification['oldest_verified_at'],
+                    'last_verified_at': verification['last_verified_at'],
+                    'prober_enabled': ACCOUNT_PROBE_ENABLED
+                },
+                'broken': [dict(row) for row in broken]
+            },
+            'tweets': {
+                'total': sum(tweet_statuses.values()),
+                'pending': tweet_statuses.get('pending', 0),
+                'posted': tweet_statuses.get('posted', 0),
+                'failed': tweet_statuses.get('failed', 0),
+                'by_status': tweet_statuses
+            }
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def estimate_drain(now, pending, posted_today, daily_cap, window):
+    """When an account's pending tweets will all be posted, given its daily cap and rate-limit window (None = never)"""
+    if pending <= 0:
+        return now
+    
+    window_length = timedelta(minutes=TWEET_RATE_WINDOW_MINUTES)
+    limit = (window['limit_total'] if window and window['limit_total'] else None) or TWEET_RATE_WINDOW_LIMIT
+    if window and window['reset_at'] > now.isoformat():
+        in_window, next_window = max(window['remaining'], 0), datetime.fromisoformat(window['reset_at'])
+    else:
+        in_window, next_window = limit, now + window_length
+    
+    # Rest of today: what is left of the current window, whole windows until midnight, capped by the daily quota
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    windows_today = max(0, -(-(tomorrow - next_window) // window_length))
+    today = min(max(daily_cap - posted_today, 0), in_window + windows_today * limit)
+    if pending <= today:
+        if pending <= in_window:
+            return now
+        return next_window + ((pending - in_window - 1) // limit) * window_length
+    
+    # Later days are all alike: min(daily cap, windows per day x window limit)
+    per_day = min(daily_cap, (timedelta(days=1) // window_length) * limit)
+    if per_day <= 0:
+        return None
+    left = pending - today
+    full_days = (left - 1) // per_day
+    last = left - full_days * per_day
+    day_start = tomorrow + timedelta(days=full_days)
+    return day_start + ((last - 1) // limit) * window_length
+
+@app.route('/api/v1/capacity', methods=['GET'])
+def get_capacity():
+    """Estimate when the pending backlog drains, per account and overall, under daily caps and rate limits"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    daily_cap = request.args.get('daily_cap', ACCOUNT_DAILY_TWEET_CAP, type=int)
+    if daily_cap < 0:
+        return jsonify({'error': 'daily_cap must not be negative'}), 400
+    
+    now = datetime.utcnow()
+    today = now.date().isoformat()
+    history_start = (now.date() - timedelta(days=CAPACITY_HISTORY_DAYS)).isoformat()
+    
+    try:
+        conn = get_db()
+        
+        # Pending counts come from the dispatch index; posting history from the daily rollups
+        query = f'''
+            SELECT a.id, a.username, a.status, p.pending,
+                   COALESCE((SELECT SUM(tweet_count) FROM tweet_daily d
+                             WHERE d.twitter_account_id = a.id AND d.day = ? AND d.status IN ('posted', 'deleted')), 0) AS posted_today,
+                   COALESCE((SELECT SUM(tweet_count) FROM tweet_daily d
+                             WHERE d.twitter_account_id = a.id AND d.day >= ? AND d.day < ? AND d.status IN ('posted', 'deleted')), 0) AS posted_history,
+                   r.limit_total, r.remaining, r.reset_at
+            FROM (SELECT twitter_account_id, COUNT(*) AS pending FROM tweet WHERE status = 'pending' GROUP BY twitter_account_id) p
+            JOIN twitter_account a ON a.id = p.twitter_account_id
+            LEFT JOIN rate_limit r ON r.account_id = a.id AND r.endpoint = 'tweets'
+        '''
+        params = [today, history_start, today]
+        if request.args.get('account_id'):
+            query += ' WHERE a.id = ?'
+            params.append(request.args.get('account_id', type=int))
+        rows = conn.execute(query + ' ORDER BY p.pending DESC', params).fetchall()
+        conn.close()
+        
+        accounts = []
+        for row in rows:
+            broken = row['status'] in BROKEN_ACCOUNT_STATUSES
+            window = row if row['reset_at'] else None
+            eta = None if broken else estimate_drain(now, row['pending'], row['posted_today'], daily_cap, window)
+            observed_rate = row['posted_history'] / CAPACITY_HISTORY_DAYS
+            
+            flags = []
+            if broken:
+                flags.append('account_broken')
+            if row['pending'] + row['posted_today'] > daily_cap:
+                flags.append('exceeds_daily_cap')
+            if window and row['remaining'] <= 0 and row['reset_at'] > now.isoformat():
+                flags.append('rate_limited')
+            
+            accounts.append({
+                'account_id': row['id'],
+                'username': row['username'],
+                'status': row['status'],
+                'pending': row['pending'],
+                'posted_today': row['posted_today'],
+                'remaining_today': max(daily_cap - row['posted_today'], 0),
+                'rate_limit': {
+                    'limit': row['limit_total'],
+                    'remaining': row['remaining'],
+                    'reset_at': row['reset_at']
+                } if window else None,
+                'eta': eta.isoformat() if eta else None,
+                'days_to_drain': round((eta - now).total_seconds() / 86400, 2) if eta else None,
+                'observed_daily_rate': round(observed_rate, 2),
+                # At the pace actually seen over the history window (dispatcher schedule included)
+                'eta_at_observed_rate': (now + timedelta(days=row['pending'] / observed_rate)).isoformat() if observed_rate else None,
+                'flags': flags
+            })
+        
+        return jsonify({
+            'generated_at': now.isoformat(),
+            'daily_cap': daily_cap,
+            'pending': sum(a['pending'] for a in accounts),
+            'capacity_today': sum(min(a['remaining_today'], a['pending']) for a in accounts if 'account_broken' not in a['flags']),
+            # Accounts post in parallel, so the backlog drains when the slowest account does;
+            # tweets of broken accounts are left out and counted in blocked_pending
+            'eta': max((a['eta'] for a in accounts if a['eta']), default=now.isoformat()),
+            'blocked_pending': sum(a['pending'] for a in accounts if a['eta'] is None),
+            'accounts_over_cap': [a['account_id'] for a in accounts if 'exceeds_daily_cap' in a['flags']],
+            'accounts': accounts
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/tweet/post/<int:tweet_id>', methods=['POST'])
+def post_tweet(tweet_id):
+    """Post a specific pending tweet to Twitter"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    try:
+        conn = get_db()
+        
+        # Get the tweet
+        tweet = conn.execute(
+            'SELECT * FROM tweet WHERE id = ? AND status = "pending"',
+            (tweet_id,)
+        ).fetchone()
+        
+        if not tweet:
+            conn.close()
+            return jsonify({'error': 'Tweet not found or already posted'}), 404
+        
+        if tweet['thread_id']:
+            conn.close()
+            return jsonify({
+                'error': 'Tweet is part of a thread',
+                'thread_id': tweet['thread_id']
+            }), 409
+        
+        if DISPATCHER_DAEMON:
+            conn.close()
+            return jsonify({
+                'message': 'Tweet is queued; the dispatcher will post it',
+                'tweet_id': tweet_id,
+                'status': 'pending'
+            }), 202
+        
+        # Twitter rejects duplicate content, so skip the network round trip
+        duplicate_error = check_dispatch_duplicate(conn, tweet)
+        if duplicate_error:
+            success, result = False, duplicate_error
+        else:
+            # Post to Twitter
+            success, result = post_to_twitter(
+                tweet['twitter_account_id'],
+                tweet['content'],
+                media_asset_ids=get_tweet_media(conn, tweet_id)
+            )
+        
+        # Update tweet status to posted or failed
+        record_post_result(conn, tweet_id, success, result)
+        conn.commit()
+        conn.close()
+        
+        if success:
+            return jsonify({
+                'message': 'Tweet posted successfully',
+                'tweet_id': tweet_id,
+                'twitter_id': result
+            })
+        else:
+            return jsonify({
+                'error': 'Failed to post tweet',
+                'reason': result
+            }), 500
+            
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/tweets/post-pending', methods=['POST'])
+def post_pending_tweets():
+    """Post the next batch of pending tweets (priority lanes, fair across accounts)"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    limit = data.get('limit', DISPATCH_BATCH_SIZE)
+    per_account_cap = data.get('per_account_cap', DISPATCH_ACCOUNT_CAP)
+    weights = data.get('weights') or {}
+    
+    if not isinstance(limit, int) or limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    if not isinstance(per_account_cap, int) or per_account_cap < 0:
+        return jsonify({'error': 'per_account_cap must be a non-negative integer'}), 400
+    try:
+        weights = {int(k): int(v) for k, v in weights.items()}
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({'error': 'weights must map account ids to integers'}), 400
+    
+    if DISPATCHER_DAEMON:
+        try:
+            conn = get_db()
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM tweet WHERE status IN ('pending', 'posting') GROUP BY status"
+            ).fetchall())
+            conn.close()
+            return jsonify({
+                'message': 'Pending tweets are posted by the dispatcher',
+                'pending': counts.get('pending', 0),
+                'posting': counts.get('posting', 0)
+            }), 202
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    try:
+        return launch_job('post_pending', {
+            'limit': limit,
+            'per_account_cap': per_account_cap,
+            'weights': weights
+        }, dispatch_pending, limit, per_account_cap, weights)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def dispatch_pending(job_id, limit, per_account_cap, weights):
+    """Post the next dispatch batch, publishing a progress event per tweet"""
+    conn = get_db()
+    
+    # Pick the next batch
+    pending_tweets = select_dispatch_batch(conn, limit, per_account_cap, weights)
+    progress = JobProgress(job_id)
+    progress.set_total(conn, len(pending_tweets))
+    
+    results = {
+        'total': len(pending_tweets),
+        'posted': 0,
+        'failed': 0,
+        'details': []
+    }
+    
+    # Upload media for the whole batch in the background while earlier tweets post
+    media_executor = ThreadPoolExecutor(max_workers=MEDIA_UPLOAD_WORKERS)
+    media_futures = prefetch_media_uploads(media_executor, conn, pending_tweets)
+    
+    for tweet in pending_tweets:
+        duplicate_error = check_dispatch_duplicate(conn, tweet)
+        if duplicate_error:
+            success, result = False, duplicate_error
+        else:
+            for future in media_futures.get(tweet['id'], []):
+                future.exception()  # wait; failures are retried and reported by post_to_twitter
+            success, result = post_to_twitter(
+                tweet['twitter_account_id'],
+                tweet['content'],
+                media_asset_ids=get_tweet_media(conn, tweet['id'])
+            )
+        
+        record_post_result(conn, tweet['id'], success, result)
+        conn.commit()
+        
+        if success:
+            results['posted'] += 1
+            detail = {
+                'tweet_id': tweet['id'],
+                'status': 'posted',
+                'twitter_id': result
+            }
+        else:
+            results['failed'] += 1
+            detail = {
+                'tweet_id': tweet['id'],
+                'status': 'failed',
+                'error': result
+            }
+        results['details'].append(detail)
+        progress.item(success, dict(detail, account_id=tweet['twitter_account_id']))
+    
+    media_executor.shutdown(wait=True)
+    progress.finish(conn, stats={'posted': results['posted'], 'failed': results['failed']})
+    conn.close()
+    
+    return results, 200
+
+def render_broadcast_text(template, account):
+    """Fill {username} and {account_id} placeholders for one account"""
+    values = {'username': account['username'], 'account_id': str(account['id'])}
+    return re.sub(r'\{(username|account_id)\}', lambda m: values[m.group(1)], template)
+
+@app.route('/api/v1/tweets/broadcast', methods=['POST'])
+def broadcast_tweet():
+    """Create and post the same (templated) tweet from many accounts"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    data = request.get_json()
+    if not data or not (data.get('text') or data.get('media_ids')):
+        return jsonify({'error': 'text is required'}), 400
+    
+    account_ids = data.get('account_ids')
+    list_id = data.get('list_id')
+    account_type = data.get('account_type')
+    overrides = data.get('texts') or {}
+    post_now = data.get('post', True) and not DISPATCHER_DAEMON  # the dispatcher posts them
+    media_ids = data.get('media_ids')
+    max_workers = data.get('max_workers', BROADCAST_MAX_WORKERS)
+    priority, priority_error = parse_priority(data.get('priority'))
+    
+    if account_ids is None and list_id is None and account_type is None:
+        return jsonify({'error': 'Provide account_ids, list_id or account_type'}), 400
+    if account_ids is not None and not isinstance(account_ids, list):
+        return jsonify({'error': 'account_ids must be an array'}), 400
+    if not isinstance(overrides, dict) or not all(isinstance(v, str) for v in overrides.values()):
+        return jsonify({'error': 'texts must be an object of account id -> text'}), 400
+    overrides = {str(k): v for k, v in overrides.items()}
+    if priority_error:
+        return jsonify({'error': priority_error['message']}), 400
+    if isinstance(max_workers, bool) or not isinstance(max_workers, int):
+        return jsonify({'error': 'max_workers must be an integer'}), 400
+    max_workers = min(max(max_workers, 1), BROADCAST_MAX_WORKERS)
+    
+    try:
+        conn = get_db()
+        
+        # Resolve target accounts (filters are combined)
+        query = 'SELECT a.id, a.username FROM twitter_account a'
+        params = []
+        if list_id is not None:
+            query += ' JOIN list_membership lm ON lm.account_id = a.id AND lm.list_id = ?'
+            params.append(list_id)
+        query += " WHERE a.status = 'active'"
+        if account_type is not None:
+            query += ' AND a.account_type = ?'
+            params.append(account_type)
+        if account_ids is not None:
+            query += f" AND a.id IN ({','.join('?' * len(account_ids))})"
+            params.extend(account_ids)
+        accounts = conn.execute(query + ' ORDER BY a.id', params).fetchall()
+        
+        if not accounts:
+            conn.close()
+            return jsonify({'error': 'No active accounts match the filter'}), 404
+        
+        media_ids, media_error = validate_media_ids(conn, media_ids)
+        if media_error:
+            conn.close()
+            return jsonify({'error': media_error['message']}), 400
+        
+        job_id = create_job(conn, 'broadcast', {
+            'account_ids': account_ids,
+            'list_id': list_id,
+            'account_type': account_type,
+            'post': bool(post_now)
+        }, total=len(accounts))
+        publish_event('job.started', {'kind': 'broadcast', 'total': len(accounts)}, job_id=job_id)
+        
+        # Create all rows in one transaction; rows posted now are inserted claimed ("posting", as
+        # claim_dispatch_batch marks them) so a concurrent post-pending or dispatcher cannot post them too
+        now = datetime.utcnow().isoformat()
+        status, claimed_at = ('posting', now) if post_now else ('pending', None)
+        created = []
+        skipped = []
+        for account in accounts:
+            text = render_broadcast_text(overrides.get(str(account['id']), data.get('text') or ''), account)
+            weighted_length, errors = validate_tweet_text(text, allow_empty=bool(media_ids))
+            chash = content_hash(text) if not errors else None
+            
+            if not errors and DUPLICATE_POLICY == 'reject' and text.strip():
+                duplicate = find_duplicate(conn, account['id'], chash, ('pending', 'posted'))
+                if duplicate:
+                    errors.append({
+                        'field': 'text',
+                        'code': 'duplicate',
+                        'message': f"Duplicate of tweet {duplicate['id']}",
+                        'duplicate_of': duplicate['id']
+                    })
+            
+            if errors:
+                skipped.append({'account_id': account['id'], 'username': account['username'], 'errors': errors})
+                continue
+            
+            cursor = conn.execute(
+                'INSERT INTO tweet (twitter_account_id, content, content_hash, priority, status, claimed_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (account['id'], text, chash, priority, status, claimed_at, now)
+            )
+            attach_media(conn, cursor.lastrowid, media_ids)
+            created.append({
+                'tweet_id': cursor.lastrowid,
+                'account_id': account['id'],
+                'username': account['username'],
+                'text': text
             })
+        conn.commit()
+        
+        details = []
+        latencies = []
+        deferred = []
+        started = time.monotonic()
+        
+        if post_now and created:
+            # Leave accounts whose rate-limit window is exhausted pending for a later run
+            limited = rate_limited_accounts(conn, [c['account_id'] for c in created], 'tweets')
+            to_post = [c for c in created if c['account_id'] not in limited]
+            deferred = [
+                {'tweet_id': c['tweet_id'], 'account_id': c['account_id'], 'status': 'pending', 'retry_after': limited[c['account_id']]}
+                for c in created if c['account_id'] in limited
+            ]
+            release_dispatch_claims(conn, [d['tweet_id'] for d in deferred])
+            conn.commit()
+            
+            def post_one(item):
+                t0 = time.monotonic()
+                success, result = post_to_twitter(item['account_id'], item['text'], media_asset_ids=media_ids)
+                return item, success, result, (time.monotonic() - t0) * 1000
+            
+            # Fan the posts out concurrently; results are written back in one transaction
+            progress = JobProgress(job_id, len(to_post))
+            outcomes = []
+            try:
+                with ThreadPoolExecutor(max_workers=min(max_workers, max(len(to_post), 1))) as executor:
+                    futures = [executor.submit(post_one, item) for item in to_post]
+                    for future in as_completed(futures):
+                        item, success, result, latency = future.result()
+                        outcomes.append((item, success, result, latency))
+                        progress.item(success, {
+                            'tweet_id': item['tweet_id'],
+                            'account_id': item['account_id'],
+                            'status': 'posted' if success else 'failed',
+                            'latency_ms': round(latency, 1)
+                        })
+            except Exception:
+                # Keep what was posted; hand the rest back to the queue
+                for item, success, result, latency in outcomes:
+                    record_post_result(conn, item['tweet_id'], success, result)
+                release_dispatch_claims(conn, [item['tweet_id'] for item in to_post])
+                conn.commit()
+                raise
+            
+            for item, success, result, latency in outcomes:
+                record_post_result(conn, item['tweet_id'], success, result)
+                latencies.append(latency)
+                detail = {
+                    'tweet_id': item['tweet_id'],
+                    'account_id': item['account_id'],
+                    'username': item['username'],
+                    'status': 'posted' if success else 'failed',
+                    'latency_ms': round(latency, 1)
+                }
+                detail['twitter_id' if success else 'error'] = result
+                details.append(detail)
+            details.sort(key=lambda d: d['tweet_id'])
+        
+        posted = sum(1 for d in details if d['status'] == 'posted')
+        failed = sum(1 for d in details if d['status'] == 'failed')
+        stats = {
+            'accounts': len(accounts),
+            'created': len(created),
+            'skipped': len(skipped),
+            'posted': posted,
+            'failed': failed,
+            'deferred': len(deferred),
+            'concurrency': max_workers,
+            'wall_time_ms': round((time.monotonic() - started) * 1000, 1),
+            'latency': latency_stats(latencies)
+        }
+        finish_job(conn, job_id, 'completed' if post_now else 'queued', posted, failed + len(skipped), stats)
+        conn.commit()
+        publish_event('job.finished', {
+            'status': 'completed' if post_now else 'queued',
+            'succeeded': posted,
+            'failed': failed + len(skipped),
+            'stats': stats
+        }, job_id=job_id)
+        job = conn.execute('SELECT * FROM job WHERE id = ?', (job_id,)).fetchone()
+        conn.close()
         
         return jsonify({
-            'accounts': result,
-            'total': len(result)
+            'message': f'Broadcast to {len(accounts)} accounts',
+            'job': job_to_dict(job),
+            'details': details if post_now else created,
+            'deferred': deferred,
+            'skipped': skipped
+        }), 201
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get status and stats of a job"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    try:
+        conn = get_db()
+        job = conn.execute('SELECT * FROM job WHERE id = ?', (job_id,)).fetchone()
+        conn.close()
+        
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify(job_to_dict(job))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/jobs', methods=['GET'])
+def get_jobs():
+    """Get recent jobs"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    kind = request.args.get('kind')
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    
+    try:
+        conn = get_db()
+        if kind:
+            jobs = conn.execute('SELECT * FROM job WHERE kind = ? ORDER BY id DESC LIMIT ?', (kind, limit)).fetchall()
+        else:
+            jobs = conn.execute('SELECT * FROM job ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        conn.close()
+        
+        return jsonify({
+            'jobs': [job_to_dict(job) for job in jobs],
+            'total': len(jobs)
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/v1/accounts/<int:account_id>', methods=['GET'])
-def get_account(account_id):
-    """Get specific account"""
+@app.route('/api/v1/jobs/<int:job_id>/events', methods=['GET'])
+def get_job_events(job_id):
+    """Stream a job's progress as Server-Sent Events (replayed from the start of the log)"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    try:
+        conn = get_db()
+        job = conn.execute('SELECT id FROM job WHERE id = ?', (job_id,)).fetchone()
+        conn.close()
+        
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return event_stream_response(follow_events(
+            last_event_id=request.headers.get('Last-Event-ID'),
+            job_id=job_id,
+            from_start=True
+        ))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/events', methods=['GET'])
+def get_events():
+    """Stream all new events as Server-Sent Events"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    types = [t for t in request.args.get('types', '').split(',') if t]
+    
+    return event_stream_response(follow_events(
+        last_event_id=request.headers.get('Last-Event-ID') or request.args.get('last_event_id'),
+        types=types
+    ))
+
+def media_to_dict(asset):
+    """Serialize a media asset"""
+    return {
+        'id': asset['id'],
+        'sha256': asset['sha256'],
+        'size': asset['size'],
+        'mime_type': asset['mime_type'],
+        'media_category': asset['media_category'],
+        'created_at': asset['created_at']
+    }
+
+@app.route('/api/v1/media', methods=['POST'])
+def upload_media():
+    """Store a media file (deduplicated by content hash) for attaching to tweets"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'error': 'file is required (multipart/form-data)'}), 400
+    
+    mime_type = upload.mimetype
+    if not mime_type or mime_type == 'application/octet-stream':
+        mime_type = mimetypes.guess_type(upload.filename or '')[0]
+    if not mime_type or not mime_type.startswith(('image/', 'video/')):
+        return jsonify({'error': 'Only image and video files are supported'}), 400
+    
+    os.makedirs(MEDIA_DIR, exist_ok=True)
+    temp_path = os.path.join(MEDIA_DIR, f'.upload-{secrets.token_hex(8)}')
+    
+    try:
+        # Stream to disk in chunks while hashing; the file is never held in memory
+        digest = hashlib.sha256()
+        size = 0
+        with open(temp_path, 'wb') as f:
+            while True:
+                chunk = upload.stream.read(MEDIA_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MEDIA_MAX_BYTES:
+                    raise ValueError(f'File is larger than {MEDIA_MAX_BYTES} bytes')
+                digest.update(chunk)
+                f.write(chunk)
+        
+        if size == 0:
+            os.remove(temp_path)
+            return jsonify({'error': 'File is empty'}), 400
+        
+        sha256 = digest.hexdigest()
+        conn = get_db()
+        
+        existing = conn.execute('SELECT * FROM media_asset WHERE sha256 = ?', (sha256,)).fetchone()
+        if existing:
+            os.remove(temp_path)
+            conn.close()
+            return jsonify({'message': 'Media already stored', 'media': media_to_dict(existing)})
+        
+        path = os.path.join(MEDIA_DIR, sha256)
+        os.replace(temp_path, path)
+        cursor = conn.execute(
+            'INSERT INTO media_asset (sha256, path, size, mime_type, media_category, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (sha256, path, size, mime_type, media_category(mime_type), datetime.utcnow().isoformat())
+        )
+        conn.commit()
+        asset = conn.execute('SELECT * FROM media_asset WHERE id = ?', (cursor.lastrowid,)).fetchone()
+        conn.close()
+        
+        return jsonify({'message': 'Media stored successfully', 'media': media_to_dict(asset)}), 201
+    
+    except ValueError as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/media/<int:media_id>', methods=['GET'])
+def get_media(media_id):
+    """Get a media asset and the accounts it has been uploaded for"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    try:
+        conn = get_db()
+        asset = conn.execute('SELECT * FROM media_asset WHERE id = ?', (media_id,)).fetchone()
+        if not asset:
+            conn.close()
+            return jsonify({'error': 'Media not found'}), 404
+        
+        uploads = conn.execute(
+            'SELECT account_id, media_id, expires_at FROM media_upload WHERE asset_id = ? ORDER BY account_id',
+            (media_id,)
+        ).fetchall()
+        conn.close()
+        
+        result = media_to_dict(asset)
+        result['uploads'] = [dict(u) for u in uploads]
+        return jsonify(result)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def post_thread(thread_id):
+    """Post a thread link by link, resuming after the last posted tweet.
+    
+    Each tweet is sent as soon as its parent's id comes back and is committed
+    right away, so a failure in the middle leaves a resumable checkpoint.
+    """
+    conn = get_db()
+    
+    thread = conn.execute('SELECT * FROM tweet_thread WHERE id = ?', (thread_id,)).fetchone()
+    if not thread:
+        conn.close()
+        return {'thread_id': thread_id, 'status': 'not_found', 'error': 'Thread not found'}
+    
+    # Claim the thread so two callers never post the same links
+    stale = (datetime.utcnow() - timedelta(minutes=THREAD_STALE_MINUTES)).isoformat()
+    claimed = conn.execute('''
+        UPDATE tweet_thread SET status = 'posting', updated_at = ?
+        WHERE id = ? AND (status IN ('pending', 'failed') OR (status = 'posting' AND updated_at < ?))
+    ''', (datetime.utcnow().isoformat(), thread_id, stale)).rowcount
+    conn.commit()
+    if not claimed:
+        conn.close()
+        return {'thread_id': thread_id, 'status': thread['status'], 'error': f"Thread is {thread['status']}"}
+    
+    tweets = conn.execute(
+        'SELECT * FROM tweet WHERE thread_id = ? ORDER BY thread_position',
+        (thread_id,)
+    ).fetchall()
+    
+    parent = thread['in_reply_to_tweet_id']
+    posted = []
+    error = None
+    
+    for tweet in tweets:
+        if tweet['status'] == 'posted':
+            parent = tweet['twitter_id']
+            continue
+        
+        duplicate_error = check_dispatch_duplicate(conn, tweet)
+        if duplicate_error:
+            success, result = False, duplicate_error
+        else:
+            success, result = post_to_twitter(
+                tweet['twitter_account_id'],
+                tweet['content'],
+                reply_to=parent,
+                media_asset_ids=get_tweet_media(conn, tweet['id'])
+            )
+        
+        record_post_result(conn, tweet['id'], success, result)
+        conn.execute(
+            'UPDATE tweet SET in_reply_to_tweet_id = ? WHERE id = ?',
+            (parent, tweet['id'])
+        )
+        conn.execute(
+            'UPDATE tweet_thread SET updated_at = ? WHERE id = ?',
+            (datetime.utcnow().isoformat(), thread_id)
+        )
+        conn.commit()
+        
+        if not success:
+            error = {'tweet_id': tweet['id'], 'position': tweet['thread_position'], 'error': result}
+            break
+        
+        posted.append({'tweet_id': tweet['id'], 'position': tweet['thread_position'], 'twitter_id': result})
+        parent = result
+    
+    status = 'failed' if error else 'posted'
+    conn.execute(
+        'UPDATE tweet_thread SET status = ?, last_error = ?, updated_at = ? WHERE id = ?',
+        (status, error['error'] if error else None, datetime.utcnow().isoformat(), thread_id)
+    )
+    conn.commit()
+    conn.close()
+    
+    result = {
+        'thread_id': thread_id,
+        'status': status,
+        'posted': posted,
+        'posted_count': sum(1 for t in tweets if t['status'] == 'posted') + len(posted),
+        'total': len(tweets)
+    }
+    if error:
+        result['error'] = error
+    return result
+
+def thread_to_dict(thread, tweets):
+    """Serialize a thread with its tweets"""
+    return {
+        'id': thread['id'],
+        'account_id': thread['twitter_account_id'],
+        'status': thread['status'],
+        'in_reply_to_tweet_id': thread['in_reply_to_tweet_id'],
+        'last_error': thread['last_error'],
+        'created_at': thread['created_at'],
+        'updated_at': thread['updated_at'],
+        'tweets': [{
+            'id': t['id'],
+            'position': t['thread_position'],
+            'text': t['content'],
+            'status': t['status'],
+            'twitter_id': t['twitter_id'],
+            'in_reply_to_tweet_id': t['in_reply_to_tweet_id'],
+            'posted_at': t['posted_at']
+        } for t in tweets]
+    }
+
+@app.route('/api/v1/threads', methods=['POST'])
+def create_thread():
+    """Create a thread of tweets that will be posted as a reply chain"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    data = request.get_json()
+    if not data or 'account_id' not in data or not isinstance(data.get('tweets'), list) or not data['tweets']:
+        return jsonify({'error': 'account_id and a non-empty tweets array are required'}), 400
+    if len(data['tweets']) > THREAD_MAX_TWEETS:
+        return jsonify({'error': f'A thread can have at most {THREAD_MAX_TWEETS} tweets'}), 400
+    
+    priority, priority_error = parse_priority(data.get('priority'))
+    if priority_error:
+        return jsonify({'error': priority_error['message']}), 400
+    
+    try:
+        conn = get_db()
+        
+        account = conn.execute('SELECT id FROM twitter_account WHERE id = ?', (data['account_id'],)).fetchone()
+        if not account:
+            conn.close()
+            return jsonify({'error': 'Account not found'}), 404
+        
+        # Validate every link before creating anything
+        failed = []
+        hashes = []
+        for index, text in enumerate(data['tweets']):
+            weighted_length, errors = validate_tweet_text(text)
+            chash = content_hash(text) if not errors else None
+            if chash and DUPLICATE_POLICY == 'reject':
+                if chash in hashes:
+                    errors.append({'field': 'text', 'code': 'duplicate', 'message': 'Duplicate of an earlier tweet in this thread'})
+                else:
+                    duplicate = find_duplicate(conn, data['account_id'], chash, ('pending', 'posted'))
+                    if duplicate:
+                        errors.append({
+                            'field': 'text',
+                            'code': 'duplicate',
+                            'message': f"Duplicate of tweet {duplicate['id']}",
+                            'duplicate_of': duplicate['id']
+                        })
+            if errors:
+                failed.append({'index': index, 'errors': errors})
+            hashes.append(chash)
+        
+        if failed:
+            conn.close()
+            return jsonify({'error': 'Invalid thread', 'failed': failed}), 400
+        
+        now = datetime.utcnow().isoformat()
+        cursor = conn.execute(
+            'INSERT INTO tweet_thread (twitter_account_id, status, in_reply_to_tweet_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+            (data['account_id'], 'pending', data.get('in_reply_to_tweet_id'), now, now)
+        )
+        thread_id = cursor.lastrowid
+        
+        tweet_ids = []
+        for position, (text, chash) in enumerate(zip(data['tweets'], hashes)):
+            cursor = conn.execute(
+                '''INSERT INTO tweet (twitter_account_id, content, content_hash, priority, status, created_at, thread_id, thread_position)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                (data['account_id'], text, chash, priority, 'pending', now, thread_id, position)
+            )
+            tweet_ids.append(cursor.lastrowid)
+        
+        conn.commit()
+        conn.close()
+        
+        return jsonify({
+            'message': 'Thread created successfully',
+            'thread_id': thread_id,
+            'tweet_ids': tweet_ids
+        }), 201
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/threads/<int:thread_id>', methods=['GET'])
+def get_thread(thread_id):
+    """Get a thread and its tweets"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    try:
+        conn = get_db()
+        thread = conn.execute('SELECT * FROM tweet_thread WHERE id = ?', (thread_id,)).fetchone()
+        if not thread:
+            conn.close()
+            return jsonify({'error': 'Thread not found'}), 404
+        
+        tweets = conn.execute(
+            'SELECT * FROM tweet WHERE thread_id = ? ORDER BY thread_position',
+            (thread_id,)
+        ).fetchall()
+        conn.close()
+        
+        return jsonify(thread_to_dict(thread, tweets))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/threads/<int:thread_id>/post', methods=['POST'])
+def post_thread_endpoint(thread_id):
+    """Post a thread, resuming from the last successful link"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    try:
+        result = post_thread(thread_id)
+        if result['status'] == 'not_found':
+            return jsonify({'error': 'Thread not found'}), 404
+        if result['status'] not in ('posted', 'failed'):
+            return jsonify(result), 409
+        return jsonify(result), 200 if result['status'] == 'posted' else 500
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/threads/post-pending', methods=['POST'])
+def post_pending_threads():
+    """Post pending (and resume failed) threads in parallel"""
     if not check_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
+    data = request.get_json(silent=True) or {}
+    limit = data.get('limit', DISPATCH_BATCH_SIZE)
+    statuses = ['pending', 'failed'] if data.get('retry_failed') else ['pending']
+    
     try:
         conn = get_db()
-        cursor = conn.execute('SELECT * FROM twitter_account WHERE id = ?', (account_id,))
-        account = cursor.fetchone()
+        # Threads of accounts in a broken status wait until the account is fixed
+        threads = conn.execute(f'''
+            SELECT t.id, t.twitter_account_id FROM tweet_thread t
+            JOIN twitter_account a ON a.id = t.twitter_account_id
+            WHERE t.status IN ({','.join('?' * len(statuses))})
+              AND a.status NOT IN ({','.join('?' * len(BROKEN_ACCOUNT_STATUSES))})
+            ORDER BY t.created_at
+            LIMIT ?
+        ''', statuses + list(BROKEN_ACCOUNT_STATUSES) + [limit]).fetchall()
         conn.close()
         
-        if not account:
-            return jsonify({'error': 'Account not found'}), 404
+        # Threads of one account run back to back; different accounts run in parallel
+        by_account = {}
+        for thread in threads:
+            by_account.setdefault(thread['twitter_account_id'], []).append(thread['id'])
+        
+        def post_account_threads(thread_ids):
+            return [post_thread(thread_id) for thread_id in thread_ids]
+        
+        results = []
+        if by_account:
+            with ThreadPoolExecutor(max_workers=min(THREAD_MAX_WORKERS, len(by_account))) as executor:
+                for account_results in executor.map(post_account_threads, by_account.values()):
+                    results.extend(account_results)
         
         return jsonify({
-            'id': account['id'],
-            'username': account['username'],
-            'status': account['status'],
-            'created_at': account['created_at']
+            'total': len(results),
+            'posted': sum(1 for r in results if r['status'] == 'posted'),
+            'failed': sum(1 for r in results if r['status'] == 'failed'),
+            'details': results
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Account Type Management
-@app.route('/api/v1/accounts/<int:account_id>/set-type', methods=['POST'])
-def set_account_type(account_id):
-    """Set account type (managed or list_owner)"""
+# Metrics Endpoints
+@app.route('/api/v1/metrics/collect', methods=['POST'])
+def collect_metrics():
+    """Fetch metrics for the tweets that are due now"""
     if not check_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
-    data = request.get_json()
-    if not data or 'account_type' not in data:
-        return jsonify({'error': 'account_type is required'}), 400
+    try:
+        return launch_job('metrics_collect', {}, collect_metrics_job)
     
-    account_type = data['account_type']
-    if account_type not in ['managed', 'list_owner']:
-        return jsonify({'error': 'account_type must be "managed" or "list_owner"'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def collect_metrics_job(job_id):
+    """Run one collector batch as a job, publishing a progress event per request"""
+    progress = JobProgress(job_id)
+    summary = run_metrics_collection(progress)
+    conn = get_db()
+    progress.finish(conn, stats=summary)
+    conn.close()
+    return summary, 200
+
+@app.route('/api/v1/tweets/<int:tweet_id>/metrics', methods=['GET'])
+def get_tweet_metrics(tweet_id):
+    """Latest metrics of a tweet and its snapshot history (?since=ISO date)"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    since = request.args.get('since', '')
     
     try:
         conn = get_db()
-        
-        # Check if account exists
-        account = conn.execute(
-            'SELECT id, username FROM twitter_account WHERE id = ?',
-            (account_id,)
+        tweet = conn.execute(
+            'SELECT id, twitter_id, status, posted_at, next_metrics_at FROM tweet WHERE id = ?',
+            (tweet_id,)
         ).fetchone()
         
-        if not account:
+        if not tweet:
             conn.close()
-            return jsonify({'error': 'Account not found'}), 404
-        
-        # Update account type
-        conn.execute(
-            'UPDATE twitter_account SET account_type = ?, updated_at = ? WHERE id = ?',
-            (account_type, datetime.utcnow().isoformat(), account_id)
-        )
+            return jsonify({'error': 'Tweet not found'}), 404
         
-        conn.commit()
+        latest = conn.execute('SELECT * FROM tweet_metrics_latest WHERE tweet_id = ?', (tweet_id,)).fetchone()
+        snapshots = conn.execute(
+            'SELECT * FROM tweet_metrics WHERE tweet_id = ? AND fetched_at >= ? ORDER BY fetched_at',
+            (tweet_id, since)
+        ).fetchall()
         conn.close()
         
         return jsonify({
-            'message': f'Account type updated to {account_type}',
-            'account_id': account_id,
-            'username': account['username'],
-            'account_type': account_type
+            'tweet_id': tweet_id,
+            'twitter_id': tweet['twitter_id'],
+            'posted_at': tweet['posted_at'],
+            'metrics': metrics_to_dict(latest) if latest else None,
+            'fetched_at': latest['fetched_at'] if latest else None,
+            'next_fetch_at': tweet['next_metrics_at'],
+            'snapshots': [dict(metrics_to_dict(s), fetched_at=s['fetched_at']) for s in snapshots]
         })
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/v1/tweet', methods=['POST'])
-def create_tweet():
-    """Create a new tweet"""
+@app.route('/api/v1/accounts/<int:account_id>/metrics', methods=['GET'])
+def get_account_metrics(account_id):
+    """Metric totals over an account's tweets, with its top tweets"""
     if not check_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
-    data = request.get_json()
-    if not data or 'text' not in data or 'account_id' not in data:
-        return jsonify({'error': 'Missing text or account_id'}), 400
-    
     try:
         conn = get_db()
-        cursor = conn.execute(
-            'INSERT INTO tweet (twitter_account_id, content, status, created_at) VALUES (?, ?, ?, ?)',
-            (data['account_id'], data['text'], 'pending', datetime.utcnow().isoformat())
-        )
-        tweet_id = cursor.lastrowid
-        conn.commit()
+        account = conn.execute('SELECT id, username FROM twitter_account WHERE id = ?', (account_id,)).fetchone()
+        
+        if not account:
+            conn.close()
+            return jsonify({'error': 'Account not found'}), 404
+        
+        totals = conn.execute(f'''
+            SELECT COUNT(*) AS tweets, MAX(fetched_at) AS fetched_at,
+                   {', '.join(f'SUM({field}) AS {field}' for field in METRIC_FIELDS)}
+            FROM tweet_metrics_latest WHERE twitter_account_id = ?
+        ''', (account_id,)).fetchone()
+        top = conn.execute('''
+            SELECT m.*, t.twitter_id, t.content FROM tweet_metrics_latest m
+            JOIN tweet t ON t.id = m.tweet_id
+            WHERE m.twitter_account_id = ?
+            ORDER BY m.like_count + m.retweet_count + m.reply_count + m.quote_count DESC
+            LIMIT 5
+        ''', (account_id,)).fetchall()
         conn.close()
         
         return jsonify({
-            'message': 'Tweet created successfully',
-            'tweet_id': tweet_id
-        }), 201
+            'account_id': account_id,
+            'username': account['username'],
+            'tweets_measured': totals['tweets'],
+            'fetched_at': totals['fetched_at'],
+            'totals': metrics_to_dict(totals),
+            'top_tweets': [
+                dict(metrics_to_dict(t), tweet_id=t['tweet_id'], twitter_id=t['twitter_id'], text=t['content'])
+                for t in top
+            ]
+        })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/v1/tweets', methods=['GET'])
-def get_tweets():
-    """Get all tweets"""
+@app.route('/api/v1/lists/<int:list_id>/metrics', methods=['GET'])
+def get_list_metrics(list_id):
+    """Metric totals over the tweets of a list's members, per member and overall"""
     if not check_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
     try:
         conn = get_db()
-        cursor = conn.execute('''
-            SELECT t.id, t.content as text, t.status, t.created_at, a.username 
-            FROM tweet t 
-            JOIN twitter_account a ON t.twitter_account_id = a.id 
-            ORDER BY t.created_at DESC 
-            LIMIT 50
-        ''')
-        tweets = cursor.fetchall()
-        conn.close()
+        lst = conn.execute('SELECT id, name FROM twitter_list WHERE id = ?', (list_id,)).fetchone()
         
-        result = []
-        for tweet in tweets:
-            result.append({
-                'id': tweet['id'],
-                'text': tweet['text'],
-                'status': tweet['status'],
-                'created_at': tweet['created_at'],
-                'username': tweet['username']
-            })
+        if not lst:
+            conn.close()
+            return jsonify({'error': 'List not found'}), 404
+        
+        members = conn.execute(f'''
+            SELECT a.id, a.username, COUNT(m.tweet_id) AS tweets,
+                   {', '.join(f'SUM(m.{field}) AS {field}' for field in METRIC_FIELDS)}
+            FROM list_membership lm
+            JOIN twitter_account a ON a.id = lm.account_id
+            LEFT JOIN tweet_metrics_latest m ON m.twitter_account_id = lm.account_id
+            WHERE lm.list_id = ?
+            GROUP BY a.id
+            ORDER BY a.username
+        ''', (list_id,)).fetchall()
+        conn.close()
         
         return jsonify({
-            'tweets': result,
-            'total': len(result)
+            'list_id': list_id,
+            'list_name': lst['name'],
+            'tweets_measured': sum(m['tweets'] for m in members),
+            'totals': {field: sum(m[field] or 0 for m in members) for field in METRIC_FIELDS},
+            'members': [
+                dict(metrics_to_dict(m), account_id=m['id'], username=m['username'], tweets_measured=m['tweets'])
+                for m in members
+            ]
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/v1/auth/twitter', methods=['GET'])
-def twitter_auth():
-    """Get Twitter OAuth URL"""
+# Report Endpoints (read only the daily rollups, never the tweet table)
+REPORT_GROUPS = {'day': 'day', 'month': 'substr(day, 1, 7)'}
+
+def report_range():
+    """Validated start/end days (YYYY-MM-DD, inclusive) from the query string; default is the last 30 days"""
+    today = datetime.utcnow().date()
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else today - timedelta(days=29)
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else today
+    except ValueError:
+        return None, None, 'start and end must be dates (YYYY-MM-DD)'
+    if start > end:
+        return None, None, 'start must not be after end'
+    return start.isoformat(), end.isoformat(), None
+
+@app.route('/api/v1/reports/tweets', methods=['GET'])
+def get_tweet_report():
+    """Tweet counts per day, month or account, split by status"""
     if not check_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
-    import secrets
-    import base64
-    import urllib.parse
+    start, end, error = report_range()
+    if error:
+        return jsonify({'error': error}), 400
     
-    # Generate PKCE parameters
-    code_verifier = base64.urlsafe_b64encode(secrets.token_bytes(32)).decode('utf-8').rstrip('=')
-    code_challenge = base64.urlsafe_b64encode(
-        hashlib.sha256(code_verifier.encode('utf-8')).digest()
-    ).decode('utf-8').rstrip('=')
+    group_by = request.args.get('group_by', 'day')
+    if group_by not in REPORT_GROUPS and group_by != 'account':
+        return jsonify({'error': 'group_by must be day, month or account'}), 400
     
-    # Generate state for CSRF protection
-    state = secrets.token_urlsafe(32)
+    bucket = 'twitter_account_id' if group_by == 'account' else REPORT_GROUPS[group_by]
+    query = f'SELECT {bucket} AS bucket, status, SUM(tweet_count) AS tweets FROM tweet_daily WHERE day BETWEEN ? AND ?'
+    params = [start, end]
     
-    # Store code_verifier and state (in production, use Redis or database)
-    conn = get_db()
-    conn.execute(
-        'INSERT INTO oauth_state (state, code_verifier, created_at) VALUES (?, ?, ?)',
-        (state, code_verifier, datetime.utcnow().isoformat())
-    )
-    conn.commit()
-    conn.close()
+    if request.args.get('account_id'):
+        query += ' AND twitter_account_id = ?'
+        params.append(request.args.get('account_id', type=int))
     
-    # Build OAuth URL
-    params = {
-        'response_type': 'code',
-        'client_id': TWITTER_CLIENT_ID,
-        'redirect_uri': TWITTER_CALLBACK_URL,
-        'scope': 'tweet.read tweet.write users.read list.read list.write offline.access',
-        'state': state,
-        'code_challenge': code_challenge,
-        'code_challenge_method': 'S256'
-    }
+    if request.args.get('status'):
+        query += ' AND status = ?'
+        params.append(request.args['status'])
     
-    auth_url = f"https://twitter.com/i/oauth2/authorize?{urllib.parse.urlencode(params)}"
+    query += ' GROUP BY bucket, status HAVING tweets > 0 ORDER BY bucket'
     
-    return jsonify({
-        'auth_url': auth_url,
-        'state': state
-    })
+    try:
+        conn = get_db()
+        rows = conn.execute(query, params).fetchall()
+        
+        usernames = {}
+        if group_by == 'account' and rows:
+            account_ids = list({row['bucket'] for row in rows})
+            usernames = {row['id']: row['username'] for row in conn.execute(
+                f"SELECT id, username FROM twitter_account WHERE id IN ({','.join('?' * len(account_ids))})",
+                account_ids
+            )}
+        conn.close()
+        
+        buckets = OrderedDict()
+        for row in rows:
+            entry = buckets.setdefault(row['bucket'], {group_by: row['bucket'], 'total': 0, 'by_status': {}})
+            entry['by_status'][row['status']] = row['tweets']
+            entry['total'] += row['tweets']
+        if group_by == 'account':
+            for account_id, entry in buckets.items():
+                entry['username'] = usernames.get(account_id)
+        
+        return jsonify({
+            'start': start,
+            'end': end,
+            'group_by': group_by,
+            'rows': list(buckets.values()),
+            'total': sum(entry['total'] for entry in buckets.values())
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-@app.route('/api/v1/auth/callback', methods=['GET', 'POST'])
-def auth_callback():
-    """Handle OAuth callback from Twitter (API endpoint version)"""
-    # For API endpoint, require API key
+@app.route('/api/v1/reports/lists', methods=['GET'])
+def get_list_report():
+    """Tweets posted by list members per day, month or list"""
     if not check_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
-    # Get parameters from request
-    if request.method == 'GET':
-        code = request.args.get('code')
-        state = request.args.get('state')
-    else:
-        data = request.get_json()
-        code = data.get('code')
-        state = data.get('state')
-    
-    if not code or not state:
-        return jsonify({'error': 'Missing code or state'}), 400
-    
-    # Retrieve code_verifier from database
-    conn = get_db()
-    oauth_data = conn.execute(
-        'SELECT code_verifier FROM oauth_state WHERE state = ?',
-        (state,)
-    ).fetchone()
-    
-    if not oauth_data:
-        conn.close()
-        return jsonify({'error': 'Invalid state'}), 400
-    
-    code_verifier = oauth_data['code_verifier']
-    
-    # Exchange code for tokens
-    token_url = 'https://api.twitter.com/2/oauth2/token'
+    start, end, error = report_range()
+    if error:
+        return jsonify({'error': error}), 400
     
-    auth_string = f"{TWITTER_CLIENT_ID}:{TWITTER_CLIENT_SECRET}"
-    auth_bytes = auth_string.encode('ascii')
-    auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
+    group_by = request.args.get('group_by', 'day')
+    if group_by not in REPORT_GROUPS and group_by != 'list':
+        return jsonify({'error': 'group_by must be day, month or list'}), 400
     
-    headers = {
-        'Authorization': f'Basic {auth_b64}',
-        'Content-Type': 'application/x-www-form-urlencoded'
-    }
+    bucket = 'd.list_id' if group_by == 'list' else REPORT_GROUPS[group_by]
+    query = f'''
+        SELECT {bucket} AS bucket, SUM(d.posted_count) AS posted, MAX(l.name) AS name
+        FROM list_daily d LEFT JOIN twitter_list l ON l.id = d.list_id
+        WHERE d.day BETWEEN ? AND ?
+    '''
+    params = [start, end]
     
-    data = {
-        'code': code,
-        'grant_type': 'authorization_code',
-        'client_id': TWITTER_CLIENT_ID,
-        'redirect_uri': TWITTER_CALLBACK_URL,
-        'code_verifier': code_verifier
-    }
+    if request.args.get('list_id'):
+        query += ' AND d.list_id = ?'
+        params.append(request.args.get('list_id', type=int))
     
-    response = requests.post(token_url, headers=headers, data=data)
+    query += ' GROUP BY bucket ORDER BY bucket'
     
-    if response.status_code != 200:
+    try:
+        conn = get_db()
+        rows = conn.execute(query, params).fetchall()
         conn.close()
+        
         return jsonify({
-            'error': 'Failed to exchange code for tokens',
-            'details': response.json()
-        }), 400
+            'start': start,
+            'end': end,
+            'group_by': group_by,
+            'rows': [
+                dict({group_by: row['bucket'], 'posted': row['posted']}, **({'name': row['name']} if group_by == 'list' else {}))
+                for row in rows
+            ],
+            'total': sum(row['posted'] for row in rows)
+        })
     
-    tokens = response.json()
-    access_token = tokens['access_token']
-    refresh_token = tokens.get('refresh_token')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Backup Endpoints
+def database_signature():
+    """Size and mtime of the database file and its WAL; if neither moved, nothing was written"""
+    signature = []
+    for path in (DB_PATH, DB_PATH + '-wal'):
+        try:
+            st = os.stat(path)
+            signature.append([st.st_size, st.st_mtime_ns])
+        except FileNotFoundError:
+            signature.append(None)
+    return signature
+
+def copy_database(dest_path):
+    """Copy the live database to dest_path with the backup API, one paced step at a time"""
+    src = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    dest = sqlite3.connect(dest_path)
+    restarts = 0
+    last_remaining = None
     
-    # Get user info
-    user_response = requests.get(
-        'https://api.twitter.com/2/users/me',
-        headers={'Authorization': f'Bearer {access_token}'}
-    )
+    def pace(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining >= last_remaining:
+            restarts += 1
+            if restarts > BACKUP_MAX_RESTARTS:
+                raise RuntimeError('backup restarted')
+        last_remaining = remaining
+        time.sleep(BACKUP_STEP_SLEEP_MS / 1000)
     
-    if user_response.status_code != 200:
-        conn.close()
-        return jsonify({'error': 'Failed to get user info'}), 400
+    try:
+        wal = src.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        if wal:
+            # One read transaction for the whole copy: every step reads the same snapshot while
+            # writers keep appending to the WAL, so the copy never restarts and never blocks them
+            src.execute('BEGIN')
+            src.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        try:
+            src.backup(dest, pages=BACKUP_PAGES_PER_STEP, progress=pace)
+        except RuntimeError:
+            if restarts <= BACKUP_MAX_RESTARTS:
+                raise
+            # Writes keep landing between steps; take the rest under one read lock
+            src.backup(dest)
+        if wal:
+            src.execute('COMMIT')
+        dest.execute('PRAGMA journal_mode = DELETE')  # a self-contained file, restorable with cp
+        pages = dest.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        dest.close()
+        src.close()
     
-    user_data = user_response.json()['data']
-    username = user_data['username']
+    return {'pages': pages, 'restarts': restarts, 'wal': wal}
+
+def check_integrity(path):
+    """PRAGMA integrity_check on a backup file; returns the problems found (empty when ok)"""
+    conn = sqlite3.connect(path)
+    rows = [row[0] for row in conn.execute('PRAGMA integrity_check').fetchall()]
+    conn.close()
+    return [] if rows == ['ok'] else rows
+
+def file_sha256(path):
+    """Hex digest of a file, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def page_geometry(path):
+    """(page_size, page_count) of a database file"""
+    conn = sqlite3.connect(path)
+    geometry = (conn.execute('PRAGMA page_size').fetchone()[0], conn.execute('PRAGMA page_count').fetchone()[0])
+    conn.close()
+    return geometry
+
+def write_backup_delta(base_name, new_path, delta_path, content_hash):
+    """Write the pages of new_path that differ from the base backup; None if a full backup is smaller"""
+    base_path = os.path.join(BACKUP_DIR, base_name)
+    page_size, page_count = page_geometry(new_path)
+    if page_geometry(base_path)[0] != page_size:
+        return None
     
-    # Encrypt tokens
-    encrypted_access_token = fernet.encrypt(access_token.encode()).decode()
-    encrypted_refresh_token = fernet.encrypt(refresh_token.encode()).decode() if refresh_token else None
+    max_changed = int(page_count * BACKUP_DELTA_MAX_RATIO)
+    changed = 0
+    header = {'base': base_name, 'page_size': page_size, 'page_count': page_count, 'sha256': content_hash}
+    # One JSON header line, then (4-byte page number, page) records, gzipped
+    with open(new_path, 'rb') as new, open(base_path, 'rb') as base, gzip.open(delta_path, 'wb') as out:
+        out.write(json.dumps(header).encode() + b'\n')
+        for page_no in range(1, page_count + 1):
+            page = new.read(page_size)
+            if page != base.read(page_size):
+                changed += 1
+                if changed > max_changed:
+                    break
+                out.write(struct.pack('>I', page_no) + page)
     
-    # Check if account exists
-    existing = conn.execute(
-        'SELECT id FROM twitter_account WHERE username = ?',
-        (username,)
-    ).fetchone()
+    if changed > max_changed:
+        os.remove(delta_path)
+        return None
+    return changed
+
+def read_delta_header(path):
+    """The JSON header of an incremental snapshot"""
+    with gzip.open(path, 'rb') as f:
+        return json.loads(f.readline())
+
+def list_backups():
+    """Backup files in BACKUP_DIR, oldest first"""
+    backups = []
+    for name in sorted(os.listdir(BACKUP_DIR)) if os.path.isdir(BACKUP_DIR) else []:
+        if not name.startswith('twitter_manager_') or not name.endswith(('.db', '.delta')):
+            continue
+        path = os.path.join(BACKUP_DIR, name)
+        entry = {
+            'file': name,
+            'kind': 'full' if name.endswith('.db') else 'incremental',
+            'bytes': os.path.getsize(path),
+            'created_at': datetime.utcfromtimestamp(os.path.getmtime(path)).isoformat()
+        }
+        if entry['kind'] == 'incremental':
+            entry['base'] = read_delta_header(path)['base']
+        backups.append(entry)
+    return backups
+
+def rotate_backups(keep_base):
+    """Keep the newest BACKUP_KEEP full backups and the snapshots whose base is still there"""
+    backups = list_backups()
+    full = [b['file'] for b in backups if b['kind'] == 'full']
+    removed = [name for name in full[:-BACKUP_KEEP] if name != keep_base] if BACKUP_KEEP > 0 else []
+    removed += [b['file'] for b in backups if b['kind'] == 'incremental' and b['base'] in removed]
+    for name in removed:
+        os.remove(os.path.join(BACKUP_DIR, name))
+    return removed
+
+def save_backup_state(path, state):
+    """Write backup_state.json atomically"""
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
+
+def run_backup(incremental=False, force=False):
+    """Back up the database into BACKUP_DIR unless nothing changed since the last backup"""
+    if not backup_lock.acquire(blocking=False):
+        return {'status': 'busy', 'error': 'A backup is already running'}
     
-    if existing:
-        # Update existing account
-        conn.execute(
-            'UPDATE twitter_account SET access_token = ?, refresh_token = ?, status = ?, updated_at = ? WHERE username = ?',
-            (encrypted_access_token, encrypted_refresh_token, 'active', datetime.utcnow().isoformat(), username)
-        )
-        account_id = existing['id']
+    lock_fd = None
+    temp_path = None
+    try:
+        if not os.path.exists(DB_PATH):
+            return {'status': 'failed', 'error': f'Database not found at {DB_PATH}'}
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        if fcntl is not None:
+            # Another gunicorn worker or the cron CLI may be backing up into the same directory
+            lock_fd = os.open(os.path.join(BACKUP_DIR, 'backup.lock'), os.O_CREAT | os.O_RDWR, 0o600)
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return {'status': 'busy', 'error': 'A backup is already running'}
+        state_path = os.path.join(BACKUP_DIR, 'backup_state.json')
+        state = {}
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+        
+        signature = database_signature()
+        if not force and state.get('signature') == signature:
+            return {'status': 'skipped', 'reason': 'database unchanged', 'last_backup': state.get('last')}
+        
+        started = time.monotonic()
+        temp_path = os.path.join(BACKUP_DIR, f'backup.{os.getpid()}.tmp')
+        copy = copy_database(temp_path)
+        problems = check_integrity(temp_path)
+        if problems:
+            return {'status': 'failed', 'error': 'Integrity check failed', 'problems': problems[:20]}
+        
+        # The files can move without the content changing (e.g. a WAL checkpoint)
+        content_hash = file_sha256(temp_path)
+        if not force and content_hash == state.get('sha256'):
+            state['signature'] = signature
+            save_backup_state(state_path, state)
+            return {'status': 'skipped', 'reason': 'database unchanged', 'last_backup': state.get('last')}
+        
+        stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')
+        name = None
+        changed = None
+        base = state.get('base')
+        if incremental and base and os.path.exists(os.path.join(BACKUP_DIR, base)):
+            changed = write_backup_delta(base, temp_path, os.path.join(BACKUP_DIR, f'twitter_manager_{stamp}.delta'), content_hash)
+            if changed is not None:
+                name = f'twitter_manager_{stamp}.delta'
+        if name is None:
+            name = f'twitter_manager_{stamp}.db'
+            os.replace(temp_path, os.path.join(BACKUP_DIR, name))
+            state['base'] = name
+        
+        state.update(signature=signature, sha256=content_hash, last=name, at=datetime.utcnow().isoformat())
+        save_backup_state(state_path, state)
+        rotated = rotate_backups(state['base'])
+        
+        path = os.path.join(BACKUP_DIR, name)
+        summary = {
+            'status': 'ok',
+            'kind': 'incremental' if name.endswith('.delta') else 'full',
+            'file': path,
+            'base': state['base'],
+            'bytes': os.path.getsize(path),
+            'pages': copy['pages'],
+            'changed_pages': changed,
+            'restarts': copy['restarts'],
+            'wal': copy['wal'],
+            'integrity': 'ok',
+            'seconds': round(time.monotonic() - started, 3),
+            'rotated': rotated
+        }
+        audit('backup.created', data={key: summary[key] for key in ('kind', 'file', 'bytes', 'pages', 'changed_pages')})
+        return summary
+    finally:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)  # moved into place unless skipped, failed or written as a delta
+        if lock_fd is not None:
+            os.close(lock_fd)
+        backup_lock.release()
+
+def restore_backup(name, dest_path):
+    """Rebuild a database at dest_path from a full backup, or an incremental snapshot plus its base"""
+    path = name if os.path.exists(name) else os.path.join(BACKUP_DIR, name)
+    if os.path.exists(dest_path):
+        raise ValueError(f'{dest_path} already exists')
+    
+    if path.endswith('.delta'):
+        with gzip.open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            shutil.copyfile(os.path.join(os.path.dirname(path), header['base']), dest_path)
+            page_size = header['page_size']
+            with open(dest_path, 'r+b') as out:
+                for record in iter(lambda: f.read(4 + page_size), b''):
+                    out.seek((struct.unpack('>I', record[:4])[0] - 1) * page_size)
+                    out.write(record[4:])
+                out.truncate(header['page_count'] * page_size)
+        if file_sha256(dest_path) != header['sha256']:
+            return ['restored file does not match the snapshot checksum']
     else:
-        # Create new account
-        cursor = conn.execute(
-            'INSERT INTO twitter_account (username, access_token, access_token_secret, refresh_token, status, created_at) VALUES (?, ?, ?, ?, ?, ?)',
-            (username, encrypted_access_token, None, encrypted_refresh_token, 'active', datetime.utcnow().isoformat())
-        )
-        account_id = cursor.lastrowid
+        shutil.copyfile(path, dest_path)
     
-    # Clean up oauth_state
-    conn.execute('DELETE FROM oauth_state WHERE state = ?', (state,))
+    return check_integrity(dest_path)
+
+@app.route('/api/v1/admin/backup', methods=['POST'])
+def create_backup():
+    """Back up the database now ({"incremental": true} for a page delta, {"force": true} even if unchanged)"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
     
-    conn.commit()
-    conn.close()
+    data = request.get_json(silent=True) or {}
     
-    return jsonify({
-        'message': 'Authorization successful',
-        'account_id': account_id,
-        'username': username
-    })
+    try:
+        result = run_backup(incremental=data.get('incremental') is True, force=data.get('force') is True)
+        status = {'ok': 200, 'skipped': 200, 'busy': 409}.get(result['status'], 500)
+        return jsonify(result), status
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-@app.route('/api/v1/mock-mode', methods=['GET', 'POST'])
-def mock_mode():
-    """Get or set mock mode"""
+@app.route('/api/v1/admin/backups', methods=['GET'])
+def get_backups():
+    """Backups on disk and the state of the last run"""
     if not check_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
-    if request.method == 'POST':
-        data = request.get_json()
-        if data and 'enabled' in data:
-            mock_mode_override['enabled'] = data['enabled']
-            return jsonify({
-                'message': f"Mock mode {'enabled' if mock_mode_override['enabled'] else 'disabled'}",
-                'mock_mode': mock_mode_override['enabled']
-            })
+    try:
+        state = {}
+        state_path = os.path.join(BACKUP_DIR, 'backup_state.json')
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+        
+        return jsonify({
+            'backup_dir': BACKUP_DIR,
+            'keep': BACKUP_KEEP,
+            'last_backup': state.get('last'),
+            'last_backup_at': state.get('at'),
+            'backups': list_backups()
+        })
     
-    return jsonify({'mock_mode': mock_mode_override['enabled']})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-@app.route('/api/v1/stats', methods=['GET'])
-def get_stats():
-    """Get statistics"""
+# Webhook Endpoints
+def webhook_to_dict(webhook, counts=None):
+    """Serialize a webhook (without its secret)"""
+    result = {
+        'id': webhook['id'],
+        'url': webhook['url'],
+        'events': webhook['events'].split(',') if webhook['events'] != '*' else list(WEBHOOK_EVENTS),
+        'is_active': bool(webhook['is_active']),
+        'created_at': webhook['created_at'],
+        'last_success_at': webhook['last_success_at'],
+        'last_error': webhook['last_error']
+    }
+    if counts is not None:
+        result['outbox'] = counts
+    return result
+
+@app.route('/api/v1/webhooks', methods=['POST'])
+def create_webhook():
+    """Register a webhook endpoint"""
     if not check_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
+    data = request.get_json()
+    if not data or not data.get('url'):
+        return jsonify({'error': 'url is required'}), 400
+    
+    url = data['url']
+    if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+        return jsonify({'error': 'url must be http(s)'}), 400
+    if data.get('secret') is not None and not isinstance(data['secret'], str):
+        return jsonify({'error': 'secret must be a string'}), 400
+    
+    events = data.get('events') or list(WEBHOOK_EVENTS)
+    if not isinstance(events, list) or any(e not in WEBHOOK_EVENTS for e in events):
+        return jsonify({'error': f'events must be a subset of {list(WEBHOOK_EVENTS)}'}), 400
+    
+    secret = data.get('secret') or secrets.token_hex(32)
+    
     try:
         conn = get_db()
+        cursor = conn.execute(
+            'INSERT INTO webhook (url, secret, events, is_active, created_at) VALUES (?, ?, ?, 1, ?)',
+            (url, get_fernet().encrypt(secret.encode()).decode(), ','.join(events), datetime.utcnow().isoformat())
+        )
+        conn.commit()
+        webhook = conn.execute('SELECT * FROM webhook WHERE id = ?', (cursor.lastrowid,)).fetchone()
+        conn.close()
+        audit('webhook.created', 'webhook', webhook['id'], {'url': webhook['url']})
         
-        # Get counts
-        accounts_count = conn.execute('SELECT COUNT(*) FROM twitter_account').fetchone()[0]
-        tweets_count = conn.execute('SELECT COUNT(*) FROM tweet').fetchone()[0]
-        pending_count = conn.execute('SELECT COUNT(*) FROM tweet WHERE status = "pending"').fetchone()[0]
-        posted_count = conn.execute('SELECT COUNT(*) FROM tweet WHERE status = "posted"').fetchone()[0]
-        failed_count = conn.execute('SELECT COUNT(*) FROM tweet WHERE status = "failed"').fetchone()[0]
-        
+        result = webhook_to_dict(webhook)
+        result['secret'] = secret  # only returned once
+        return jsonify({'message': 'Webhook created successfully', 'webhook': result}), 201
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/webhooks', methods=['GET'])
+def get_webhooks():
+    """Get registered webhooks with outbox counts"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    try:
+        conn = get_db()
+        webhooks = conn.execute('SELECT * FROM webhook ORDER BY id').fetchall()
+        counts = {}
+        for row in conn.execute('SELECT webhook_id, status, COUNT(*) as count FROM webhook_outbox GROUP BY webhook_id, status'):
+            counts.setdefault(row['webhook_id'], {})[row['status']] = row['count']
         conn.close()
         
         return jsonify({
-            'accounts': {
-                'total': accounts_count,
-                'active': accounts_count  # Simplified
-            },
-            'tweets': {
-                'total': tweets_count,
-                'pending': pending_count,
-                'posted': posted_count,
-                'failed': failed_count
-            }
+            'webhooks': [webhook_to_dict(w, counts.get(w['id'], {})) for w in webhooks],
+            'total': len(webhooks)
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/v1/tweet/post/<int:tweet_id>', methods=['POST'])
-def post_tweet(tweet_id):
-    """Post a specific pending tweet to Twitter"""
+@app.route('/api/v1/webhooks/<int:webhook_id>', methods=['DELETE'])
+def delete_webhook(webhook_id):
+    """Delete a webhook and its undelivered events"""
     if not check_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
     try:
         conn = get_db()
-        
-        # Get the tweet
-        tweet = conn.execute(
-            'SELECT * FROM tweet WHERE id = ? AND status = "pending"',
-            (tweet_id,)
-        ).fetchone()
-        
-        if not tweet:
+        deleted = conn.execute('DELETE FROM webhook WHERE id = ?', (webhook_id,)).rowcount
+        if not deleted:
             conn.close()
-            return jsonify({'error': 'Tweet not found or already posted'}), 404
-        
-        # Post to Twitter
-        success, result = post_to_twitter(tweet['twitter_account_id'], tweet['content'])
+            return jsonify({'error': 'Webhook not found'}), 404
+        conn.execute('DELETE FROM webhook_outbox WHERE webhook_id = ?', (webhook_id,))
+        conn.commit()
+        conn.close()
+        audit('webhook.deleted', 'webhook', webhook_id)
         
-        if success:
-            # Update tweet status to posted
-            conn.execute(
-                'UPDATE tweet SET status = ?, twitter_id = ?, posted_at = ? WHERE id = ?',
-                ('posted', result, datetime.utcnow().isoformat(), tweet_id)
-            )
-            conn.commit()
-            conn.close()
-            
-            return jsonify({
-                'message': 'Tweet posted successfully',
-                'tweet_id': tweet_id,
-                'twitter_id': result
-            })
-        else:
-            # Update tweet status to failed
-            conn.execute(
-                'UPDATE tweet SET status = ? WHERE id = ?',
-                ('failed', tweet_id)
-            )
-            conn.commit()
-            conn.close()
-            
-            return jsonify({
-                'error': 'Failed to post tweet',
-                'reason': result
-            }), 500
-            
+        return jsonify({'message': 'Webhook deleted successfully', 'webhook_id': webhook_id})
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/v1/tweets/post-pending', methods=['POST'])
-def post_pending_tweets():
-    """Post all pending tweets"""
+@app.route('/api/v1/webhooks/<int:webhook_id>/deliveries', methods=['GET'])
+def get_webhook_deliveries(webhook_id):
+    """Get recent outbox entries for a webhook"""
     if not check_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
+    status = request.args.get('status')
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    
     try:
         conn = get_db()
+        query = 'SELECT * FROM webhook_outbox WHERE webhook_id = ?'
+        params = [webhook_id]
+        if status:
+            query += ' AND status = ?'
+            params.append(status)
+        rows = conn.execute(query + ' ORDER BY id DESC LIMIT ?', params + [limit]).fetchall()
+        conn.close()
         
-        # Get all pending tweets
-        pending_tweets = conn.execute(
-            'SELECT * FROM tweet WHERE status = "pending" ORDER BY created_at'
-        ).fetchall()
-        
-        results = {
-            'total': len(pending_tweets),
-            'posted': 0,
-            'failed': 0,
-            'details': []
-        }
-        
-        for tweet in pending_tweets:
-            success, result = post_to_twitter(tweet['twitter_account_id'], tweet['content'])
-            
-            if success:
-                # Update to posted
-                conn.execute(
-                    'UPDATE tweet SET status = ?, twitter_id = ?, posted_at = ? WHERE id = ?',
-                    ('posted', result, datetime.utcnow().isoformat(), tweet['id'])
-                )
-                results['posted'] += 1
-                results['details'].append({
-                    'tweet_id': tweet['id'],
-                    'status': 'posted',
-                    'twitter_id': result
-                })
-            else:
-                # Update to failed
-                conn.execute(
-                    'UPDATE tweet SET status = ? WHERE id = ?',
-                    ('failed', tweet['id'])
-                )
-                results['failed'] += 1
-                results['details'].append({
-                    'tweet_id': tweet['id'],
-                    'status': 'failed',
-                    'error': result
-                })
-        
+        return jsonify({
+            'deliveries': [{
+                'id': row['id'],
+                'event_type': row['event_type'],
+                'data': json.loads(row['payload']),
+                'status': row['status'],
+                'attempts': row['attempts'],
+                'next_attempt_at': row['next_attempt_at'],
+                'last_error': row['last_error'],
+                'created_at': row['created_at'],
+                'delivered_at': row['delivered_at']
+            } for row in rows],
+            'total': len(rows)
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/webhooks/<int:webhook_id>/redeliver', methods=['POST'])
+def redeliver_webhook(webhook_id):
+    """Retry events that exhausted their delivery attempts"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    try:
+        conn = get_db()
+        count = conn.execute(
+            "UPDATE webhook_outbox SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE webhook_id = ? AND status = 'dead'",
+            (datetime.utcnow().isoformat(), webhook_id)
+        ).rowcount
         conn.commit()
         conn.close()
+        webhook_wakeup.set()
         
-        return jsonify(results)
+        return jsonify({'message': f'Requeued {count} events', 'requeued': count})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Audit Endpoints
+@app.route('/api/v1/audit', methods=['GET'])
+def get_audit_log():
+    """Query the audit log by entity, actor, event type and time range (newest first)"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    entity_type = request.args.get('entity_type')
+    entity_id = request.args.get('entity_id')
+    actor = request.args.get('actor')
+    event_type = request.args.get('event_type')
+    since = request.args.get('since')
+    until = request.args.get('until')
+    before_id = request.args.get('before_id', type=int)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    
+    if entity_id is not None and entity_type is None:
+        return jsonify({'error': 'entity_id requires entity_type'}), 400
+    
+    query = 'SELECT * FROM event_log WHERE 1=1'
+    params = []
+    if entity_type:
+        query += ' AND entity_type = ?'
+        params.append(entity_type)
+    if entity_id is not None:
+        query += ' AND entity_id = ?'
+        params.append(entity_id)
+    if actor:
+        query += ' AND actor = ?'
+        params.append('system' if actor == 'system' else actor[:16])
+    if event_type:
+        query += ' AND event_type = ?'
+        params.append(event_type)
+    if since:
+        query += ' AND occurred_at >= ?'
+        params.append(since)
+    if until:
+        query += ' AND occurred_at < ?'
+        params.append(until)
+    if before_id:
+        query += ' AND id < ?'
+        params.append(before_id)
+    query += ' ORDER BY id DESC LIMIT ?'
+    params.append(limit)
+    
+    try:
+        flush_audit_buffer()  # include this worker's not-yet-committed entries
+        conn = get_audit_db()
+        entries = conn.execute(query, params).fetchall()
+        conn.close()
         
+        return jsonify({
+            'entries': [audit_entry_to_dict(entry) for entry in entries],
+            'total': len(entries),
+            'next_before_id': entries[-1]['id'] if len(entries) == limit else None,
+            'you': current_actor()
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/audit/prune', methods=['POST'])
+def prune_audit_log_endpoint():
+    """Apply the audit log retention policy now"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    try:
+        flush_audit_buffer()
+        result = prune_audit_log()
+        result['retention_days'] = AUDIT_RETENTION_DAYS
+        return jsonify(result)
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -746,8 +5033,10 @@ def create_list():
             (list_id, name, description, mode, owner_account_id)
         )
         
+        bump_cache_version(conn, 'lists')
         conn.commit()
         conn.close()
+        audit('list.created', 'list', cursor.lastrowid, {'list_id': list_id, 'name': name, 'owner_account_id': owner_account_id})
         
         return jsonify({
             'message': 'List created successfully',
@@ -766,6 +5055,7 @@ def create_list():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/v1/lists', methods=['GET'])
+@cached_response('lists', 'accounts')
 def get_lists():
     """Get all lists"""
     if not check_api_key():
@@ -776,9 +5066,11 @@ def get_lists():
     try:
         conn = get_db()
         
+        # Member counts come from the UNIQUE(list_id, account_id) index in the same query
         if owner_account_id:
             cursor = conn.execute('''
-                SELECT l.*, a.username as owner_username 
+                SELECT l.*, a.username as owner_username,
+                       (SELECT COUNT(*) FROM list_membership lm WHERE lm.list_id = l.id) as member_count
                 FROM twitter_list l
                 JOIN twitter_account a ON l.owner_account_id = a.id
                 WHERE l.owner_account_id = ?
@@ -786,7 +5078,8 @@ def get_lists():
             ''', (owner_account_id,))
         else:
             cursor = conn.execute('''
-                SELECT l.*, a.username as owner_username 
+                SELECT l.*, a.username as owner_username,
+                       (SELECT COUNT(*) FROM list_membership lm WHERE lm.list_id = l.id) as member_count
                 FROM twitter_list l
                 JOIN twitter_account a ON l.owner_account_id = a.id
                 ORDER BY l.created_at DESC
@@ -794,14 +5087,8 @@ def get_lists():
         
         lists = cursor.fetchall()
         
-        # Get member counts
         result = []
         for lst in lists:
-            member_count = conn.execute(
-                'SELECT COUNT(*) as count FROM list_membership WHERE list_id = ?',
-                (lst['id'],)
-            ).fetchone()['count']
-            
             result.append({
                 'id': lst['id'],
                 'list_id': lst['list_id'],
@@ -810,7 +5097,7 @@ def get_lists():
                 'mode': lst['mode'],
                 'owner_account_id': lst['owner_account_id'],
                 'owner_username': lst['owner_username'],
-                'member_count': member_count,
+                'member_count': lst['member_count'],
                 'created_at': lst['created_at'],
                 'updated_at': lst['updated_at']
             })
@@ -826,6 +5113,7 @@ def get_lists():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/v1/lists/<int:list_id>', methods=['GET'])
+@cached_response('lists', 'accounts')
 def get_list(list_id):
     """Get specific list details"""
     if not check_api_key():
@@ -836,9 +5124,10 @@ def get_list(list_id):
         
         # Get list details
         lst = conn.execute('''
-            SELECT l.*, a.username as owner_username 
+            SELECT l.*, a.username as owner_username, s.synced_at, s.status as sync_status, s.unmanaged_count
             FROM twitter_list l
             JOIN twitter_account a ON l.owner_account_id = a.id
+            LEFT JOIN list_sync s ON s.list_id = l.id
             WHERE l.id = ?
         ''', (list_id,)).fetchone()
         
@@ -876,7 +5165,10 @@ def get_list(list_id):
                 'owner_account_id': lst['owner_account_id'],
                 'owner_username': lst['owner_username'],
                 'created_at': lst['created_at'],
-                'updated_at': lst['updated_at']
+                'updated_at': lst['updated_at'],
+                'synced_at': lst['synced_at'],
+                'sync_status': lst['sync_status'],
+                'unmanaged_member_count': lst['unmanaged_count']
             },
             'members': members,
             'member_count': len(members)
@@ -949,8 +5241,10 @@ def update_list(list_id):
                 (data['description'], datetime.utcnow().isoformat(), list_id)
             )
         
+        bump_cache_version(conn, 'lists')
         conn.commit()
         conn.close()
+        audit('list.updated', 'list', list_id, update_data)
         
         return jsonify({
             'message': 'List updated successfully',
@@ -977,164 +5271,397 @@ def delete_list(list_id):
             WHERE l.id = ?
         ''', (list_id,)).fetchone()
         
-        if not lst:
-            conn.close()
-            return jsonify({'error': 'List not found'}), 404
+        if not lst:
+            conn.close()
+            return jsonify({'error': 'List not found'}), 404
+        
+        # Delete from Twitter
+        access_token = decrypt_token(lst['access_token'])
+        headers = {
+            'Authorization': f'Bearer {access_token}'
+        }
+        
+        response = requests.delete(
+            f'https://api.twitter.com/2/lists/{lst["list_id"]}',
+            headers=headers
+        )
+        
+        if response.status_code != 200:
+            conn.close()
+            return jsonify({
+                'error': 'Failed to delete list on Twitter',
+                'details': response.json()
+            }), response.status_code
+        
+        # Delete from database (cascade will delete memberships)
+        conn.execute('DELETE FROM twitter_list WHERE id = ?', (list_id,))
+        conn.execute('DELETE FROM list_sync WHERE list_id = ?', (list_id,))
+        bump_cache_version(conn, 'lists')
+        conn.commit()
+        conn.close()
+        audit('list.deleted', 'list', list_id, {'name': lst['name'], 'list_id': lst['list_id']})
+        
+        return jsonify({
+            'message': 'List deleted successfully',
+            'list_name': lst['name'],
+            'owner_username': lst['username']
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# List Membership Endpoints
+def lookup_twitter_user_id(conn, account, access_token):
+    """An account's Twitter user ID, looked up by username once and then stored"""
+    if account['twitter_user_id']:
+        return account['twitter_user_id']
+    
+    user_response = requests.get(
+        f'https://api.twitter.com/2/users/by/username/{account["username"]}',
+        headers={'Authorization': f'Bearer {access_token}'}
+    )
+    if user_response.status_code != 200:
+        return None
+    
+    twitter_user_id = user_response.json()['data']['id']
+    conn.execute('UPDATE twitter_account SET twitter_user_id = ? WHERE id = ?', (twitter_user_id, account['id']))
+    return twitter_user_id
+
+@app.route('/api/v1/lists/<int:list_id>/members', methods=['POST'])
+def add_list_members(list_id):
+    """Add accounts to a list"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    data = request.get_json()
+    if not data or 'account_ids' not in data:
+        return jsonify({'error': 'account_ids array is required'}), 400
+    
+    account_ids = data['account_ids']
+    if not isinstance(account_ids, list):
+        return jsonify({'error': 'account_ids must be an array'}), 400
+    
+    try:
+        conn = get_db()
+        lst = conn.execute('SELECT id FROM twitter_list WHERE id = ?', (list_id,)).fetchone()
+        conn.close()
+        
+        if not lst:
+            return jsonify({'error': 'List not found'}), 404
+        
+        return launch_job('list_members', {
+            'list_id': list_id,
+            'account_ids': account_ids
+        }, add_members_to_list, list_id, account_ids, total=len(account_ids))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def add_members_to_list(job_id, list_id, account_ids):
+    """Add accounts to a list on Twitter, publishing a progress event per account"""
+    conn = get_db()
+    progress = JobProgress(job_id, len(account_ids))
+    
+    # Get list and owner details
+    lst = conn.execute('''
+        SELECT l.*, a.access_token 
+        FROM twitter_list l
+        JOIN twitter_account a ON l.owner_account_id = a.id
+        WHERE l.id = ?
+    ''', (list_id,)).fetchone()
+    
+    if not lst:
+        progress.finish(conn, 'failed', {'error': 'List not found'})
+        conn.close()
+        return {'error': 'List not found'}, 404
+    
+    access_token = decrypt_token(lst['access_token'])
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json'
+    }
+    
+    def add_one(account_id):
+        # Get account details
+        account = conn.execute(
+            'SELECT id, username, twitter_user_id FROM twitter_account WHERE id = ?',
+            (account_id,)
+        ).fetchone()
+        
+        if not account:
+            return False, {
+                'account_id': account_id,
+                'error': 'Account not found'
+            }
+        
+        # Check if already member
+        existing = conn.execute(
+            'SELECT id FROM list_membership WHERE list_id = ? AND account_id = ?',
+            (list_id, account_id)
+        ).fetchone()
         
-        # Delete from Twitter
-        access_token = decrypt_token(lst['access_token'])
-        headers = {
-            'Authorization': f'Bearer {access_token}'
-        }
+        if existing:
+            return False, {
+                'account_id': account_id,
+                'username': account['username'],
+                'error': 'Already a member'
+            }
         
-        response = requests.delete(
-            f'https://api.twitter.com/2/lists/{lst["list_id"]}',
-            headers=headers
-        )
+        # Get Twitter user ID
+        twitter_user_id = lookup_twitter_user_id(conn, account, access_token)
         
-        if response.status_code != 200:
-            conn.close()
-            return jsonify({
-                'error': 'Failed to delete list on Twitter',
-                'details': response.json()
-            }), response.status_code
+        if not twitter_user_id:
+            return False, {
+                'account_id': account_id,
+                'username': account['username'],
+                'error': 'Failed to get Twitter user ID'
+            }
         
-        # Delete from database (cascade will delete memberships)
-        conn.execute('DELETE FROM twitter_list WHERE id = ?', (list_id,))
-        conn.commit()
-        conn.close()
+        # Add to list on Twitter
+        add_response = requests.post(
+            f'https://api.twitter.com/2/lists/{lst["list_id"]}/members',
+            headers=headers,
+            json={'user_id': twitter_user_id}
+        )
         
-        return jsonify({
-            'message': 'List deleted successfully',
-            'list_name': lst['name'],
-            'owner_username': lst['username']
-        })
+        if add_response.status_code != 200:
+            return False, {
+                'account_id': account_id,
+                'username': account['username'],
+                'error': add_response.json().get('detail', 'Failed to add to Twitter list')
+            }
         
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        # Add to database
+        conn.execute(
+            'INSERT INTO list_membership (list_id, account_id) VALUES (?, ?)',
+            (list_id, account_id)
+        )
+        bump_cache_version(conn, 'lists')
+        emit_event(conn, 'list.member_added', {
+            'list_id': list_id,
+            'account_id': account_id,
+            'username': account['username']
+        })
+        audit('list.member_added', 'list', list_id, {'account_id': account_id, 'username': account['username']})
+        return True, {
+            'account_id': account_id,
+            'username': account['username']
+        }
+    
+    added = []
+    failed = []
+    
+    for account_id in account_ids:
+        success, detail = add_one(account_id)
+        conn.commit()
+        (added if success else failed).append(detail)
+        progress.item(success, detail)
+    
+    progress.finish(conn, stats={'added': len(added), 'failed': len(failed)})
+    conn.close()
+    
+    return {
+        'message': f'Processed {len(account_ids)} accounts',
+        'added': added,
+        'failed': failed,
+        'added_count': len(added),
+        'failed_count': len(failed)
+    }, 200
 
-# List Membership Endpoints
-@app.route('/api/v1/lists/<int:list_id>/members', methods=['POST'])
-def add_list_members(list_id):
-    """Add accounts to a list"""
+@app.route('/api/v1/lists/<int:list_id>/members', methods=['PUT'])
+def set_list_members(list_id):
+    """Make a list's members exactly the given accounts (adds and removes run concurrently)"""
     if not check_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
-    data = request.get_json()
+    data = request.get_json(silent=True)
     if not data or 'account_ids' not in data:
         return jsonify({'error': 'account_ids array is required'}), 400
     
     account_ids = data['account_ids']
-    if not isinstance(account_ids, list):
-        return jsonify({'error': 'account_ids must be an array'}), 400
+    if not isinstance(account_ids, list) or not all(isinstance(a, int) and not isinstance(a, bool) for a in account_ids):
+        return jsonify({'error': 'account_ids must be an array of integers'}), 400
     
     try:
         conn = get_db()
-        
-        # Get list and owner details
-        lst = conn.execute('''
-            SELECT l.*, a.access_token 
-            FROM twitter_list l
-            JOIN twitter_account a ON l.owner_account_id = a.id
-            WHERE l.id = ?
-        ''', (list_id,)).fetchone()
+        lst = conn.execute('SELECT id FROM twitter_list WHERE id = ?', (list_id,)).fetchone()
+        conn.close()
         
         if not lst:
-            conn.close()
             return jsonify({'error': 'List not found'}), 404
         
-        access_token = decrypt_token(lst['access_token'])
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
-        
-        added = []
-        failed = []
-        
-        for account_id in account_ids:
-            # Get account details
-            account = conn.execute(
-                'SELECT id, username FROM twitter_account WHERE id = ?',
-                (account_id,)
-            ).fetchone()
-            
-            if not account:
-                failed.append({
-                    'account_id': account_id,
-                    'error': 'Account not found'
-                })
-                continue
-            
-            # Check if already member
-            existing = conn.execute(
-                'SELECT id FROM list_membership WHERE list_id = ? AND account_id = ?',
-                (list_id, account_id)
-            ).fetchone()
-            
-            if existing:
-                failed.append({
-                    'account_id': account_id,
-                    'username': account['username'],
-                    'error': 'Already a member'
-                })
-                continue
-            
-            # Get Twitter user ID
+        return launch_job('list_members_sync', {
+            'list_id': list_id,
+            'account_ids': account_ids
+        }, sync_list_members, list_id, sorted(set(account_ids)))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def change_list_member(lst, access_token, action, account, stop):
+    """Add or remove one member on Twitter; only does HTTP so it can run in a worker thread"""
+    report = {'account_id': account['id'], 'username': account['username'], 'action': action}
+    if stop.is_set():
+        return dict(report, status='deferred', error='Rate limited'), None, None
+    if mock_mode_override['enabled']:
+        print(f"[MOCK MODE] Would {action} {account['username']} on list {lst['list_id']}")
+        return dict(report, status='added' if action == 'add' else 'removed'), None, None
+    
+    headers = {'Authorization': f'Bearer {access_token}'}
+    twitter_user_id = account['twitter_user_id']
+    try:
+        if not twitter_user_id:
             user_response = requests.get(
                 f'https://api.twitter.com/2/users/by/username/{account["username"]}',
-                headers={'Authorization': f'Bearer {access_token}'}
+                headers=headers,
+                timeout=LIST_SYNC_TIMEOUT_SECONDS
             )
-            
             if user_response.status_code != 200:
-                failed.append({
-                    'account_id': account_id,
-                    'username': account['username'],
-                    'error': 'Failed to get Twitter user ID'
-                })
-                continue
-            
+                return dict(report, status='failed', error='Failed to get Twitter user ID'), None, None
             twitter_user_id = user_response.json()['data']['id']
-            
-            # Add to list on Twitter
-            add_response = requests.post(
+        
+        if action == 'add':
+            response = requests.post(
                 f'https://api.twitter.com/2/lists/{lst["list_id"]}/members',
                 headers=headers,
-                json={'user_id': twitter_user_id}
+                json={'user_id': twitter_user_id},
+                timeout=LIST_SYNC_TIMEOUT_SECONDS
             )
-            
-            if add_response.status_code == 200:
-                # Add to database
-                conn.execute(
-                    'INSERT INTO list_membership (list_id, account_id) VALUES (?, ?)',
-                    (list_id, account_id)
-                )
-                added.append({
-                    'account_id': account_id,
-                    'username': account['username']
-                })
-            else:
-                failed.append({
-                    'account_id': account_id,
-                    'username': account['username'],
-                    'error': add_response.json().get('detail', 'Failed to add to Twitter list')
-                })
-        
-        conn.commit()
-        conn.close()
-        
-        return jsonify({
-            'message': f'Processed {len(account_ids)} accounts',
-            'added': added,
-            'failed': failed,
-            'added_count': len(added),
-            'failed_count': len(failed)
+        else:
+            response = requests.delete(
+                f'https://api.twitter.com/2/lists/{lst["list_id"]}/members/{twitter_user_id}',
+                headers=headers,
+                timeout=LIST_SYNC_TIMEOUT_SECONDS
+            )
+    except requests.RequestException as e:
+        return dict(report, status='failed', error=f'Request failed: {e}'), twitter_user_id, None
+    
+    if response.status_code == 429:
+        stop.set()  # members not started yet are deferred instead of hitting the limit again
+        return dict(report, status='deferred', error='Rate limited (429)'), twitter_user_id, response
+    if response.status_code != 200:
+        return dict(report, status='failed', error=f'Twitter API error (status {response.status_code}): {response.text[:200]}'), twitter_user_id, response
+    return dict(report, status='added' if action == 'add' else 'removed'), twitter_user_id, response
+
+def sync_list_members(job_id, list_id, account_ids):
+    """Diff the desired members against list_membership, apply the changes on Twitter, then commit once"""
+    conn = get_db()
+    lst = conn.execute('''
+        SELECT l.*, a.access_token
+        FROM twitter_list l
+        JOIN twitter_account a ON l.owner_account_id = a.id
+        WHERE l.id = ?
+    ''', (list_id,)).fetchone()
+    
+    current = {row['account_id'] for row in conn.execute(
+        'SELECT account_id FROM list_membership WHERE list_id = ?', (list_id,)
+    )}
+    wanted = set(account_ids)
+    placeholders = ','.join('?' * len(wanted | current))
+    accounts = {row['id']: row for row in conn.execute(
+        f'SELECT id, username, twitter_user_id FROM twitter_account WHERE id IN ({placeholders})',
+        list(wanted | current)
+    )} if wanted | current else {}
+    
+    report = [
+        {'account_id': account_id, 'action': 'add', 'status': 'failed', 'error': 'Account not found'}
+        for account_id in sorted(wanted - set(accounts))
+    ]
+    report.extend(
+        {'account_id': account_id, 'username': accounts[account_id]['username'], 'action': 'keep', 'status': 'unchanged'}
+        for account_id in sorted(wanted & current)
+    )
+    changes = [('add', accounts[a]) for a in sorted(wanted - current) if a in accounts]
+    changes += [('remove', accounts[a]) for a in sorted(current - wanted)]
+    
+    progress = JobProgress(job_id)
+    progress.set_total(conn, len(changes))
+    
+    # Don't start if the owner's window is already used up; otherwise only send what the window allows
+    limited = rate_limited_accounts(conn, [lst['owner_account_id']], 'list_members_write')
+    window = conn.execute(
+        "SELECT remaining FROM rate_limit WHERE account_id = ? AND endpoint = 'list_members_write' AND reset_at > ?",
+        (lst['owner_account_id'], datetime.utcnow().isoformat())
+    ).fetchone()
+    allowed = 0 if limited else len(changes) if window is None else max(window['remaining'], 0)
+    
+    for action, account in changes[allowed:]:
+        report.append({
+            'account_id': account['id'],
+            'username': account['username'],
+            'action': action,
+            'status': 'deferred',
+            'error': 'Rate limit window exhausted'
         })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    
+    results = []
+    if changes[:allowed]:
+        access_token = decrypt_token(lst['access_token'])
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=min(LIST_MEMBERS_MAX_WORKERS, allowed)) as executor:
+            futures = [
+                executor.submit(change_list_member, lst, access_token, action, account, stop)
+                for action, account in changes[:allowed]
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if result[0]['status'] != 'deferred':
+                    progress.item(result[0]['status'] != 'failed', result[0])
+    
+    # The tightest window seen is the one to remember
+    responses = [r[2] for r in results if r[2] is not None and r[2].headers.get('x-rate-limit-remaining') is not None]
+    if responses:
+        record_rate_limit(conn, lst['owner_account_id'], 'list_members_write',
+                          min(responses, key=lambda r: int(r.headers['x-rate-limit-remaining'])))
+    
+    # Local state for every change that went through, in one transaction
+    added = [r[0]['account_id'] for r in results if r[0]['status'] == 'added']
+    removed = [r[0]['account_id'] for r in results if r[0]['status'] == 'removed']
+    backfill = [
+        (twitter_user_id, r['account_id']) for r, twitter_user_id, _ in results
+        if twitter_user_id and not accounts[r['account_id']]['twitter_user_id']
+    ]
+    if backfill:
+        conn.executemany('UPDATE twitter_account SET twitter_user_id = ? WHERE id = ?', backfill)
+    if added:
+        conn.executemany(
+            'INSERT OR IGNORE INTO list_membership (list_id, account_id) VALUES (?, ?)',
+            [(list_id, account_id) for account_id in added]
+        )
+        for account_id in added:
+            emit_event(conn, 'list.member_added', {
+                'list_id': list_id,
+                'account_id': account_id,
+                'username': accounts[account_id]['username']
+            })
+    if removed:
+        conn.executemany(
+            'DELETE FROM list_membership WHERE list_id = ? AND account_id = ?',
+            [(list_id, account_id) for account_id in removed]
+        )
+    if added or removed:
+        bump_cache_version(conn, 'lists')
+    conn.commit()
+    
+    report.extend(r[0] for r in results)
+    report.sort(key=lambda r: r['account_id'])
+    counts = {status: sum(1 for r in report if r['status'] == status)
+              for status in ('added', 'removed', 'unchanged', 'failed', 'deferred')}
+    
+    progress.finish(conn, stats=counts)
+    conn.close()
+    if added or removed:
+        audit('list.members_synced', 'list', list_id, {'added': added, 'removed': removed})
+    
+    return dict(counts, **{
+        'message': f"Added {counts['added']} and removed {counts['removed']} members",
+        'list_id': list_id,
+        'members': report
+    }), 200
 
 @app.route('/api/v1/lists/<int:list_id>/members', methods=['GET'])
+@cached_response('lists', 'accounts')
 def get_list_members(list_id):
     """Get members of a list"""
     if not check_api_key():
@@ -1180,7 +5707,7 @@ def get_list_members(list_id):
             'members': members,
             'total': len(members)
         })
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1207,7 +5734,7 @@ def remove_list_member(list_id, account_id):
         
         # Get account details
         account = conn.execute(
-            'SELECT id, username FROM twitter_account WHERE id = ?',
+            'SELECT id, username, twitter_user_id FROM twitter_account WHERE id = ?',
             (account_id,)
         ).fetchone()
         
@@ -1228,14 +5755,9 @@ def remove_list_member(list_id, account_id):
         access_token = decrypt_token(lst['access_token'])
         
         # Get Twitter user ID
-        user_response = requests.get(
-            f'https://api.twitter.com/2/users/by/username/{account["username"]}',
-            headers={'Authorization': f'Bearer {access_token}'}
-        )
+        twitter_user_id = lookup_twitter_user_id(conn, account, access_token)
         
-        if user_response.status_code == 200:
-            twitter_user_id = user_response.json()['data']['id']
-            
+        if twitter_user_id:
             # Remove from Twitter list
             remove_response = requests.delete(
                 f'https://api.twitter.com/2/lists/{lst["list_id"]}/members/{twitter_user_id}',
@@ -1255,8 +5777,10 @@ def remove_list_member(list_id, account_id):
             (list_id, account_id)
         )
         
+        bump_cache_version(conn, 'lists')
         conn.commit()
         conn.close()
+        audit('list.member_removed', 'list', list_id, {'account_id': account_id, 'username': account['username']})
         
         return jsonify({
             'message': 'Account removed from list successfully',
@@ -1264,10 +5788,236 @@ def remove_list_member(list_id, account_id):
             'account_id': account_id,
             'username': account['username']
         })
-        
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/v1/lists/reconcile', methods=['POST'])
+def reconcile_lists():
+    """Bring local list membership in line with Twitter (all lists, or the given list_ids)"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    list_ids = data.get('list_ids')
+    if list_ids is not None and not isinstance(list_ids, list):
+        return jsonify({'error': 'list_ids must be an array'}), 400
+    
+    try:
+        return launch_job('list_reconcile', {'list_ids': list_ids}, reconcile_lists_job, list_ids)
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def save_list_checkpoint(conn, list_id, status, token=None, seen=None, unmanaged=0, pages=0, error=None):
+    """Store how far a list's reconciliation got so the next run continues from there"""
+    conn.execute('''
+        INSERT INTO list_sync (list_id, status, pagination_token, seen_account_ids, unmanaged_count, pages, error)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(list_id) DO UPDATE SET
+            status = excluded.status,
+            pagination_token = excluded.pagination_token,
+            seen_account_ids = excluded.seen_account_ids,
+            unmanaged_count = excluded.unmanaged_count,
+            pages = excluded.pages,
+            error = excluded.error
+    ''', (list_id, status, token, json.dumps(sorted(seen)) if seen is not None else None, unmanaged, pages, error))
+
+def reconcile_list(conn, lst, accounts_by_user_id, accounts_by_username):
+    """Page through a list's members on Twitter and apply the difference to list_membership"""
+    result = {'list_id': lst['id'], 'name': lst['name'], 'status': 'complete', 'added': 0, 'removed': 0, 'error': None}
+    
+    # Continue an interrupted pass from its last page instead of starting over
+    checkpoint = conn.execute('SELECT * FROM list_sync WHERE list_id = ?', (lst['id'],)).fetchone()
+    if checkpoint and checkpoint['status'] == 'in_progress' and checkpoint['pagination_token']:
+        token = checkpoint['pagination_token']
+        seen = set(json.loads(checkpoint['seen_account_ids'] or '[]'))
+        unmanaged = checkpoint['unmanaged_count']
+        pages = checkpoint['pages']
+        result['resumed'] = True
+    else:
+        token, seen, unmanaged, pages = None, set(), 0, 0
+    
+    headers = {'Authorization': f'Bearer {decrypt_token(lst["access_token"])}'}
+    
+    while True:
+        params = {'max_results': LIST_SYNC_PAGE_SIZE, 'user.fields': 'username'}
+        if token:
+            params['pagination_token'] = token
+        try:
+            response = requests.get(
+                f'https://api.twitter.com/2/lists/{lst["list_id"]}/members',
+                headers=headers,
+                params=params,
+                timeout=LIST_SYNC_TIMEOUT_SECONDS
+            )
+        except requests.RequestException as e:
+            response, error = None, f'Request failed: {e}'
+        else:
+            record_rate_limit(conn, lst['owner_account_id'], 'list_members', response)
+            error = None if response.status_code == 200 else \
+                f'Twitter API error (status {response.status_code}): {response.text[:200]}'
+        
+        if error:
+            # Keep what was read so far; the next run picks up at this page
+            status = 'in_progress' if token else 'failed'
+            save_list_checkpoint(conn, lst['id'], status, token, seen if token else None, unmanaged, pages, error)
+            conn.commit()
+            result.update(status='deferred' if response is not None and response.status_code == 429 else 'failed', error=error)
+            return result
+        
+        body = response.json()
+        backfill = []
+        for user in body.get('data', []):
+            account_id = accounts_by_user_id.get(user['id'])
+            if account_id is None:
+                account_id = accounts_by_username.get(user.get('username', '').lower())
+                if account_id is None:
+                    unmanaged += 1  # member we don't manage; nothing to store locally
+                    continue
+                backfill.append((user['id'], account_id))
+            seen.add(account_id)
+        if backfill:
+            conn.executemany('UPDATE twitter_account SET twitter_user_id = ? WHERE id = ?', backfill)
+        pages += 1
+        
+        token = body.get('meta', {}).get('next_token')
+        if not token:
+            break
+        save_list_checkpoint(conn, lst['id'], 'in_progress', token, seen, unmanaged, pages)
+        conn.commit()
+    
+    # Set diff in memory, then one transaction with only the delta
+    local = {row['account_id'] for row in conn.execute(
+        'SELECT account_id FROM list_membership WHERE list_id = ?', (lst['id'],)
+    )}
+    to_add = seen - local
+    to_remove = local - seen
+    
+    if to_add:
+        conn.executemany(
+            'INSERT OR IGNORE INTO list_membership (list_id, account_id) VALUES (?, ?)',
+            [(lst['id'], account_id) for account_id in to_add]
+        )
+    if to_remove:
+        conn.executemany(
+            'DELETE FROM list_membership WHERE list_id = ? AND account_id = ?',
+            [(lst['id'], account_id) for account_id in to_remove]
+        )
+    if to_add or to_remove:
+        bump_cache_version(conn, 'lists')
+    
+    save_list_checkpoint(conn, lst['id'], 'complete', unmanaged=unmanaged, pages=pages)
+    conn.execute(
+        'UPDATE list_sync SET member_count = ?, added = ?, removed = ?, synced_at = ? WHERE list_id = ?',
+        (len(seen) + unmanaged, len(to_add), len(to_remove), datetime.utcnow().isoformat(), lst['id'])
+    )
+    conn.commit()
+    
+    result.update(
+        added=len(to_add),
+        removed=len(to_remove),
+        members=len(seen),
+        unmanaged=unmanaged,
+        pages=pages
+    )
+    if to_add or to_remove:
+        audit('list.reconciled', 'list', lst['id'], {
+            'added': sorted(to_add),
+            'removed': sorted(to_remove),
+            'unmanaged': unmanaged
+        })
+    return result
+
+def reconcile_owner_lists(lists, accounts_by_user_id, accounts_by_username, progress):
+    """Reconcile one owner's lists back to back, stopping once its rate limit is hit"""
+    conn = get_db()
+    results = []
+    for index, lst in enumerate(lists):
+        result = reconcile_list(conn, lst, accounts_by_user_id, accounts_by_username)
+        results.append(result)
+        progress.item(result['status'] == 'complete', result)
+        if result['status'] == 'deferred':
+            results.extend(
+                {'list_id': rest['id'], 'name': rest['name'], 'status': 'deferred', 'error': 'Owner rate limited'}
+                for rest in lists[index + 1:]
+            )
+            break
+    conn.close()
+    return results
+
+def reconcile_lists_job(job_id, list_ids):
+    """Reconcile lists in parallel across owners; interrupted lists resume from their checkpoint"""
+    conn = get_db()
+    query = '''
+        SELECT l.id, l.list_id, l.name, l.owner_account_id, a.access_token
+        FROM twitter_list l
+        JOIN twitter_account a ON l.owner_account_id = a.id
+        LEFT JOIN list_sync s ON s.list_id = l.id
+    '''
+    params = []
+    if list_ids:
+        query += f" WHERE l.id IN ({','.join('?' * len(list_ids))})"
+        params.extend(list_ids)
+    # Interrupted lists first, then the ones synced longest ago
+    query += " ORDER BY s.status = 'in_progress' DESC, s.synced_at IS NOT NULL, s.synced_at"
+    lists = conn.execute(query, params).fetchall()
+    
+    progress = JobProgress(job_id)
+    progress.set_total(conn, len(lists))
+    
+    if mock_mode_override['enabled']:
+        progress.finish(conn, stats={'lists': len(lists), 'skipped': len(lists)})
+        conn.close()
+        return {'message': 'Mock mode: lists not reconciled', 'lists': []}, 200
+    
+    # Local accounts are indexed once for the whole run
+    accounts_by_user_id = {}
+    accounts_by_username = {}
+    for account in conn.execute('SELECT id, username, twitter_user_id FROM twitter_account'):
+        if account['twitter_user_id']:
+            accounts_by_user_id[account['twitter_user_id']] = account['id']
+        accounts_by_username[account['username'].lower()] = account['id']
+    
+    limited = rate_limited_accounts(conn, list({lst['owner_account_id'] for lst in lists}), 'list_members')
+    by_owner = {}
+    results = []
+    for lst in lists:
+        if lst['owner_account_id'] in limited:
+            results.append({
+                'list_id': lst['id'],
+                'name': lst['name'],
+                'status': 'deferred',
+                'error': f"Owner rate limited until {limited[lst['owner_account_id']]}"
+            })
+        else:
+            by_owner.setdefault(lst['owner_account_id'], []).append(lst)
+    
+    if by_owner:
+        with ThreadPoolExecutor(max_workers=min(LIST_SYNC_MAX_WORKERS, len(by_owner))) as executor:
+            futures = [
+                executor.submit(reconcile_owner_lists, owner_lists, accounts_by_user_id, accounts_by_username, progress)
+                for owner_lists in by_owner.values()
+            ]
+            for future in as_completed(futures):
+                results.extend(future.result())
+    
+    stats = {
+        'lists': len(lists),
+        'complete': sum(1 for r in results if r['status'] == 'complete'),
+        'deferred': sum(1 for r in results if r['status'] == 'deferred'),
+        'failed': sum(1 for r in results if r['status'] == 'failed'),
+        'added': sum(r.get('added', 0) for r in results),
+        'removed': sum(r.get('removed', 0) for r in results)
+    }
+    progress.finish(conn, stats=stats)
+    conn.close()
+    
+    return dict(stats, **{
+        'message': f"Reconciled {stats['complete']} of {stats['lists']} lists",
+        'results': sorted(results, key=lambda r: r['list_id'])
+    }), 200
+
 # Cleanup Endpoints
 
 @app.route('/api/v1/accounts/<int:account_id>', methods=['DELETE'])
@@ -1301,8 +6051,10 @@ def delete_account(account_id):
             (account_id,)
         )
         
+        bump_cache_version(conn, 'accounts')
         conn.commit()
         conn.close()
+        audit('account.deleted', 'account', account_id, {'username': account['username'], 'deleted_tweets': deleted_tweets})
         
         return jsonify({
             'message': f'Account @{account["username"]} deleted successfully',
@@ -1319,55 +6071,69 @@ def cleanup_inactive_accounts():
         return jsonify({'error': 'Invalid API key'}), 401
     
     # Get status filter from request
-    data = request.get_json() or {}
+    data = request.get_json(silent=True) or {}
     statuses_to_delete = data.get('statuses', ['failed', 'suspended', 'inactive'])
     
     try:
-        conn = get_db()
-        
-        # Get accounts to delete
-        placeholders = ','.join('?' * len(statuses_to_delete))
-        accounts = conn.execute(
-            f'SELECT id, username, status FROM twitter_account WHERE status IN ({placeholders})',
-            statuses_to_delete
-        ).fetchall()
-        
-        results = {
-            'deleted_accounts': [],
-            'deleted_tweets_total': 0
-        }
+        return launch_job('account_cleanup', {'statuses': statuses_to_delete}, delete_inactive_accounts, statuses_to_delete)
         
-        for account in accounts:
-            # Delete tweets for this account
-            deleted_tweets = conn.execute(
-                'DELETE FROM tweet WHERE twitter_account_id = ?',
-                (account['id'],)
-            ).rowcount
-            
-            # Delete the account
-            conn.execute(
-                'DELETE FROM twitter_account WHERE id = ?',
-                (account['id'],)
-            )
-            
-            results['deleted_accounts'].append({
-                'id': account['id'],
-                'username': account['username'],
-                'status': account['status'],
-                'deleted_tweets': deleted_tweets
-            })
-            results['deleted_tweets_total'] += deleted_tweets
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def delete_inactive_accounts(job_id, statuses_to_delete):
+    """Delete accounts with the given statuses, publishing a progress event per account"""
+    conn = get_db()
+    
+    # Get accounts to delete
+    placeholders = ','.join('?' * len(statuses_to_delete))
+    accounts = conn.execute(
+        f'SELECT id, username, status FROM twitter_account WHERE status IN ({placeholders})',
+        statuses_to_delete
+    ).fetchall()
+    progress = JobProgress(job_id)
+    progress.set_total(conn, len(accounts))
+    
+    results = {
+        'deleted_accounts': [],
+        'deleted_tweets_total': 0
+    }
+    
+    for account in accounts:
+        # Delete tweets for this account
+        deleted_tweets = conn.execute(
+            'DELETE FROM tweet WHERE twitter_account_id = ?',
+            (account['id'],)
+        ).rowcount
         
+        # Delete the account
+        conn.execute(
+            'DELETE FROM twitter_account WHERE id = ?',
+            (account['id'],)
+        )
+        bump_cache_version(conn, 'accounts')
         conn.commit()
-        conn.close()
-        
-        return jsonify({
-            'message': f'Cleaned up {len(accounts)} inactive accounts',
-            'results': results
-        })
         
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        detail = {
+            'id': account['id'],
+            'username': account['username'],
+            'status': account['status'],
+            'deleted_tweets': deleted_tweets
+        }
+        results['deleted_accounts'].append(detail)
+        audit('account.deleted', 'account', account['id'], detail)
+        results['deleted_tweets_total'] += deleted_tweets
+        progress.item(True, detail)
+    
+    progress.finish(conn, stats={
+        'deleted_accounts': len(accounts),
+        'deleted_tweets': results['deleted_tweets_total']
+    })
+    conn.close()
+    
+    return {
+        'message': f'Cleaned up {len(accounts)} inactive accounts',
+        'results': results
+    }, 200
 
 @app.route('/api/v1/tweets/cleanup', methods=['POST'])
 def cleanup_tweets():
@@ -1383,60 +6149,259 @@ def cleanup_tweets():
     if not statuses and not days_old:
         return jsonify({'error': 'Provide either statuses or days_old parameter'}), 400
     
+    criteria = {
+        'statuses': statuses,
+        'days_old': days_old,
+        'account_id': account_id
+    }
+    
     try:
-        conn = get_db()
-        
-        # Build query
-        query = 'DELETE FROM tweet WHERE 1=1'
-        params = []
-        
-        if statuses:
-            placeholders = ','.join('?' * len(statuses))
-            query += f' AND status IN ({placeholders})'
-            params.extend(statuses)
-        
-        if days_old:
-            cutoff_date = (datetime.utcnow() - timedelta(days=days_old)).isoformat()
-            query += ' AND created_at < ?'
-            params.append(cutoff_date)
+        return launch_job('tweet_cleanup', criteria, delete_tweets_matching, criteria)
         
-        if account_id:
-            query += ' AND twitter_account_id = ?'
-            params.append(account_id)
-        
-        # Get count before deletion for reporting
-        count_query = query.replace('DELETE FROM', 'SELECT COUNT(*) FROM')
-        count = conn.execute(count_query, params).fetchone()[0]
-        
-        # Execute deletion
-        conn.execute(query, params)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def delete_tweets_matching(job_id, criteria):
+    """Delete tweets matching the cleanup criteria in chunks, publishing progress per chunk"""
+    conn = get_db()
+    
+    # Build query
+    query = 'FROM tweet WHERE 1=1'
+    params = []
+    
+    if criteria['statuses']:
+        placeholders = ','.join('?' * len(criteria['statuses']))
+        query += f' AND status IN ({placeholders})'
+        params.extend(criteria['statuses'])
+    
+    if criteria['days_old']:
+        cutoff_date = (datetime.utcnow() - timedelta(days=criteria['days_old'])).isoformat()
+        query += ' AND created_at < ?'
+        params.append(cutoff_date)
+    
+    if criteria['account_id']:
+        query += ' AND twitter_account_id = ?'
+        params.append(criteria['account_id'])
+    
+    # Get count before deletion for reporting
+    count = conn.execute('SELECT COUNT(*) ' + query, params).fetchone()[0]
+    progress = JobProgress(job_id)
+    progress.set_total(conn, count)
+    
+    # Delete in chunks so the write lock is released between them and progress can be reported
+    while True:
+        deleted = conn.execute(
+            f'DELETE FROM tweet WHERE id IN (SELECT id {query} LIMIT ?)',
+            params + [CLEANUP_CHUNK_SIZE]
+        ).rowcount
         conn.commit()
-        conn.close()
-        
-        return jsonify({
-            'message': f'Deleted {count} tweets',
-            'criteria': {
-                'statuses': statuses,
-                'days_old': days_old,
-                'account_id': account_id
-            }
-        })
-        
+        if not deleted:
+            break
+        progress.item(True, {'deleted': deleted}, count=deleted)
+    
+    progress.finish(conn, stats={'deleted': progress.done})
+    audit('tweets.cleaned_up', data=dict(criteria, deleted=progress.done, job_id=job_id))
+    conn.close()
+    
+    return {
+        'message': f'Deleted {progress.done} tweets',
+        'criteria': criteria
+    }, 200
+
+@app.route('/api/v1/tweets/delete-remote', methods=['POST'])
+def delete_tweets_remote():
+    """Delete posted tweets on Twitter by account and date range, keeping local tombstones"""
+    if not check_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    criteria = {
+        'account_id': data.get('account_id'),
+        'posted_after': data.get('posted_after'),
+        'posted_before': data.get('posted_before'),
+        'limit': data.get('limit', REMOTE_DELETE_BATCH_SIZE)
+    }
+    
+    if not isinstance(criteria['limit'], int) or isinstance(criteria['limit'], bool) or criteria['limit'] < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    
+    if not any(criteria[key] for key in ('account_id', 'posted_after', 'posted_before')) and data.get('all') is not True:
+        return jsonify({'error': 'Provide account_id, posted_after or posted_before (or "all": true)'}), 400
+    
+    try:
+        return launch_job('remote_delete', criteria, delete_tweets_remote_job, criteria)
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def remote_delete_filter(criteria):
+    """WHERE clause and params selecting posted tweets matching the remote delete criteria"""
+    query = "t.twitter_id IS NOT NULL"
+    params = []
+    
+    if criteria['account_id']:
+        query += ' AND t.twitter_account_id = ?'
+        params.append(criteria['account_id'])
+    
+    if criteria['posted_after']:
+        query += ' AND t.posted_at >= ?'
+        params.append(criteria['posted_after'])
+    
+    if criteria['posted_before']:
+        query += ' AND t.posted_at < ?'
+        params.append(criteria['posted_before'])
+    
+    return query, params
+
+def claim_remote_deletes(conn, criteria):
+    """Mark a batch of posted tweets as "deleting" so concurrent or resumed runs don't pick them twice"""
+    query, params = remote_delete_filter(criteria)
+    now = datetime.utcnow()
+    stale_before = (now - timedelta(minutes=REMOTE_DELETE_STALE_MINUTES)).isoformat()
+    
+    # While a tweet is "deleting", deleted_at holds the claim time
+    conn.execute('BEGIN IMMEDIATE')
+    rows = conn.execute(f'''
+        SELECT t.id, t.twitter_account_id, t.twitter_id FROM tweet t
+        JOIN twitter_account a ON a.id = t.twitter_account_id
+        WHERE {query}
+          AND (t.status = 'posted' OR (t.status = 'deleting' AND t.deleted_at < ?))
+          AND a.status NOT IN ({','.join('?' * len(BROKEN_ACCOUNT_STATUSES))})
+          AND t.twitter_account_id NOT IN (
+              SELECT account_id FROM rate_limit
+              WHERE endpoint = 'tweets_delete' AND remaining <= 0 AND reset_at > ?
+          )
+        ORDER BY t.twitter_account_id, t.posted_at
+        LIMIT ?
+    ''', params + [stale_before] + list(BROKEN_ACCOUNT_STATUSES) + [now.isoformat(), criteria['limit']]).fetchall()
+    
+    if rows:
+        conn.execute(
+            f"UPDATE tweet SET status = 'deleting', deleted_at = ? WHERE id IN ({','.join('?' * len(rows))})",
+            [now.isoformat()] + [row['id'] for row in rows]
+        )
+    conn.commit()
+    return rows
+
+def delete_account_tweets_remote(account_id, rows, progress):
+    """Delete one account's claimed tweets on Twitter in order, stopping when its rate limit runs out"""
+    conn = get_db()
+    account = conn.execute('SELECT id, username, access_token FROM twitter_account WHERE id = ?', (account_id,)).fetchone()
+    result = {'account_id': account_id, 'deleted': 0, 'failed': 0, 'deferred': 0, 'reset_at': None, 'error': None}
+    
+    for index, row in enumerate(rows):
+        outcome, error, response = delete_remote_tweet(account, row['twitter_id'])
+        now = datetime.utcnow().isoformat()
+        
+        if response is not None:
+            try:
+                record_rate_limit(conn, account_id, 'tweets_delete', response)
+            except Exception as e:
+                print(f"Could not record rate limit for account {account_id}: {e}")
+        
+        if outcome == 'deleted':
+            conn.execute(
+                "UPDATE tweet SET status = 'deleted', deleted_at = ?, delete_error = NULL, next_metrics_at = NULL WHERE id = ?",
+                (now, row['id'])
+            )
+            conn.commit()
+            result['deleted'] += 1
+            audit('tweet.deleted_remote', 'tweet', row['id'], {'account_id': account_id, 'twitter_id': row['twitter_id']})
+        elif outcome == 'failed':
+            conn.execute(
+                "UPDATE tweet SET status = 'posted', deleted_at = NULL, delete_error = ? WHERE id = ?",
+                (error, row['id'])
+            )
+            conn.commit()
+            result['failed'] += 1
+        
+        if outcome in ('deleted', 'failed'):
+            progress.item(outcome == 'deleted', {
+                'tweet_id': row['id'],
+                'account_id': account_id,
+                'twitter_id': row['twitter_id'],
+                'error': error
+            })
+        
+        # Stop this account on a 429, a rejected token, or an exhausted window; its other tweets go back to "posted"
+        exhausted = response is not None and response.headers.get('x-rate-limit-remaining') == '0'
+        if outcome in ('rate_limited', 'unauthorized') or exhausted:
+            rest = rows[index:] if outcome in ('rate_limited', 'unauthorized') else rows[index + 1:]
+            if rest:
+                conn.execute(
+                    f"UPDATE tweet SET status = 'posted', deleted_at = NULL WHERE id IN ({','.join('?' * len(rest))})",
+                    [r['id'] for r in rest]
+                )
+                conn.commit()
+            result['deferred'] = len(rest)
+            result['error'] = error
+            reset = response.headers.get('x-rate-limit-reset') if response is not None else None
+            if reset:
+                result['reset_at'] = datetime.utcfromtimestamp(int(reset)).isoformat()
+            break
+    
+    conn.close()
+    return result
+
+def delete_tweets_remote_job(job_id, criteria):
+    """Claim matching posted tweets and delete them on Twitter, one worker per account"""
+    conn = get_db()
+    rows = claim_remote_deletes(conn, criteria)
+    progress = JobProgress(job_id)
+    progress.set_total(conn, len(rows))
+    
+    by_account = {}
+    for row in rows:
+        by_account.setdefault(row['twitter_account_id'], []).append(row)
+    
+    accounts = []
+    if by_account:
+        with ThreadPoolExecutor(max_workers=min(REMOTE_DELETE_MAX_WORKERS, len(by_account))) as executor:
+            futures = [
+                executor.submit(delete_account_tweets_remote, account_id, account_rows, progress)
+                for account_id, account_rows in by_account.items()
+            ]
+            for future in as_completed(futures):
+                accounts.append(future.result())
+    
+    # Matching tweets left for a later run (deferred, failed, or beyond the limit)
+    query, params = remote_delete_filter(criteria)
+    remaining = conn.execute(
+        f"SELECT COUNT(*) FROM tweet t WHERE {query} AND t.status IN ('posted', 'deleting')",
+        params
+    ).fetchone()[0]
+    
+    stats = {
+        'claimed': len(rows),
+        'deleted': sum(a['deleted'] for a in accounts),
+        'failed': sum(a['failed'] for a in accounts),
+        'deferred': sum(a['deferred'] for a in accounts),
+        'remaining': remaining
+    }
+    progress.finish(conn, stats=stats)
+    audit('tweets.deleted_remote', data=dict(criteria, job_id=job_id, **stats))
+    conn.close()
+    
+    return dict(stats, **{
+        'message': f"Deleted {stats['deleted']} tweets on Twitter",
+        'criteria': criteria,
+        'accounts': sorted(accounts, key=lambda a: a['account_id'])
+    }), 200
+
 @app.route('/api/v1/tweets/<int:tweet_id>', methods=['DELETE'])
 def delete_tweet(tweet_id):
-    """Delete a specific tweet"""
+    """Delete a specific tweet (?remote=true also deletes it on Twitter and keeps a tombstone)"""
     if not check_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
+    remote = request.args.get('remote', '').lower() in ('1', 'true')
+    
     try:
         conn = get_db()
         
         # Check if tweet exists
         tweet = conn.execute(
-            'SELECT id, content, status FROM tweet WHERE id = ?',
+            'SELECT id, content, status, twitter_id, twitter_account_id FROM tweet WHERE id = ?',
             (tweet_id,)
         ).fetchone()
         
@@ -1444,10 +6409,43 @@ def delete_tweet(tweet_id):
             conn.close()
             return jsonify({'error': 'Tweet not found'}), 404
         
+        if remote and tweet['status'] == 'posted' and tweet['twitter_id']:
+            account = conn.execute(
+                'SELECT id, username, access_token FROM twitter_account WHERE id = ?',
+                (tweet['twitter_account_id'],)
+            ).fetchone()
+            outcome, error, response = delete_remote_tweet(account, tweet['twitter_id'])
+            if response is not None:
+                record_rate_limit(conn, account['id'], 'tweets_delete', response)
+            
+            if outcome != 'deleted':
+                conn.execute('UPDATE tweet SET delete_error = ? WHERE id = ?', (error, tweet_id))
+                conn.commit()
+                conn.close()
+                return jsonify({'error': error}), 429 if outcome == 'rate_limited' else 502
+            
+            conn.execute(
+                "UPDATE tweet SET status = 'deleted', deleted_at = ?, delete_error = NULL, next_metrics_at = NULL WHERE id = ?",
+                (datetime.utcnow().isoformat(), tweet_id)
+            )
+            conn.commit()
+            conn.close()
+            audit('tweet.deleted_remote', 'tweet', tweet_id, {'account_id': account['id'], 'twitter_id': tweet['twitter_id']})
+            
+            return jsonify({
+                'message': 'Tweet deleted on Twitter',
+                'tweet': {
+                    'id': tweet['id'],
+                    'twitter_id': tweet['twitter_id'],
+                    'status': 'deleted'
+                }
+            })
+        
         # Delete the tweet
         conn.execute('DELETE FROM tweet WHERE id = ?', (tweet_id,))
         conn.commit()
         conn.close()
+        audit('tweet.deleted', 'tweet', tweet_id, {'status': tweet['status'], 'account_id': tweet['twitter_account_id']})
         
         return jsonify({
             'message': 'Tweet deleted successfully',
@@ -1457,7 +6455,7 @@ def delete_tweet(tweet_id):
                 'status': tweet['status']
             }
         })
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1535,8 +6533,8 @@ def auth_callback_redirect():
     username = user_data['username']
     
     # Encrypt tokens
-    encrypted_access_token = fernet.encrypt(access_token.encode()).decode()
-    encrypted_refresh_token = fernet.encrypt(refresh_token.encode()).decode() if refresh_token else None
+    encrypted_access_token = get_fernet().encrypt(access_token.encode()).decode()
+    encrypted_refresh_token = get_fernet().encrypt(refresh_token.encode()).decode() if refresh_token else None
     
     # Check if account exists
     existing = conn.execute(
@@ -1547,16 +6545,16 @@ def auth_callback_redirect():
     if existing:
         # Update existing account
         conn.execute(
-            'UPDATE twitter_account SET access_token = ?, refresh_token = ?, status = ?, updated_at = ? WHERE username = ?',
-            (encrypted_access_token, encrypted_refresh_token, 'active', datetime.utcnow().isoformat(), username)
+            'UPDATE twitter_account SET access_token = ?, refresh_token = ?, twitter_user_id = ?, status = ?, updated_at = ? WHERE username = ?',
+            (encrypted_access_token, encrypted_refresh_token, user_data['id'], 'active', datetime.utcnow().isoformat(), username)
         )
         account_id = existing['id']
         message = f"Account @{username} has been re-authorized successfully!"
     else:
         # Create new account
         cursor = conn.execute(
-            'INSERT INTO twitter_account (username, access_token, access_token_secret, refresh_token, status, created_at) VALUES (?, ?, ?, ?, ?, ?)',
-            (username, encrypted_access_token, None, encrypted_refresh_token, 'active', datetime.utcnow().isoformat())
+            'INSERT INTO twitter_account (username, twitter_user_id, access_token, access_token_secret, refresh_token, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (username, user_data['id'], encrypted_access_token, None, encrypted_refresh_token, 'active', datetime.utcnow().isoformat())
         )
         account_id = cursor.lastrowid
         message = f"Account @{username} has been authorized successfully!"
@@ -1564,8 +6562,10 @@ def auth_callback_redirect():
     # Clean up oauth_state
     conn.execute('DELETE FROM oauth_state WHERE state = ?', (state,))
     
+    bump_cache_version(conn, 'accounts')
     conn.commit()
     conn.close()
+    audit('account.reauthorized' if existing else 'account.authorized', 'account', account_id, {'username': username})
     
     # Return success HTML page
     return f'''<!DOCTYPE html>
@@ -1648,6 +6648,9 @@ def init_database():
     try:
         conn = get_db()
         
+        if SQLITE_WAL:
+            conn.execute('PRAGMA journal_mode = WAL')
+        
         # Create api_key table
         conn.execute('''
             CREATE TABLE IF NOT EXISTS api_key (
@@ -1680,6 +6683,8 @@ def init_database():
                 content TEXT NOT NULL,
                 status TEXT DEFAULT 'pending',
                 twitter_id TEXT,
+                content_hash TEXT,
+                priority INTEGER DEFAULT 0,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 posted_at DATETIME,
                 FOREIGN KEY (twitter_account_id) REFERENCES twitter_account (id)
@@ -1716,6 +6721,133 @@ def init_database():
         except:
             pass  # Column already exists
         
+        # Add credential prober columns to twitter_account
+        for column in ('last_verified_at DATETIME', 'next_verify_at DATETIME', 'verify_error TEXT'):
+            try:
+                conn.execute(f'ALTER TABLE twitter_account ADD COLUMN {column}')
+                print(f"Added {column.split()[0]} column to twitter_account table")
+            except:
+                pass  # Column already exists
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_account_next_verify ON twitter_account (next_verify_at)')
+        
+        # Add twitter_user_id column to twitter_account (saves a username lookup per list call)
+        try:
+            conn.execute('ALTER TABLE twitter_account ADD COLUMN twitter_user_id TEXT')
+            print("Added twitter_user_id column to twitter_account table")
+        except:
+            pass  # Column already exists
+        
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_account_twitter_user ON twitter_account (twitter_user_id)')
+        
+        # Add content_hash column to tweet for duplicate detection
+        try:
+            conn.execute('ALTER TABLE tweet ADD COLUMN content_hash TEXT')
+            print("Added content_hash column to tweet table")
+        except:
+            pass  # Column already exists
+        
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tweet_account_hash ON tweet (twitter_account_id, content_hash)')
+        
+        # Add priority column to tweet for dispatch ordering
+        try:
+            conn.execute('ALTER TABLE tweet ADD COLUMN priority INTEGER DEFAULT 0')
+            print("Added priority column to tweet table")
+        except:
+            pass  # Column already exists
+        
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tweet_dispatch ON tweet (status, priority, twitter_account_id, created_at)')
+        
+        # Add thread columns to tweet (reply chains posted by the thread poster)
+        for column in ('thread_id INTEGER', 'thread_position INTEGER', 'in_reply_to_tweet_id TEXT'):
+            try:
+                conn.execute(f'ALTER TABLE tweet ADD COLUMN {column}')
+                print(f"Added {column.split()[0]} column to tweet table")
+            except:
+                pass  # Column already exists
+        
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tweet_thread ON tweet (thread_id, thread_position)')
+        
+        # Add remote deletion columns to tweet (deleted tweets are kept as tombstones with their twitter_id)
+        for column in ('deleted_at DATETIME', 'delete_error TEXT'):
+            try:
+                conn.execute(f'ALTER TABLE tweet ADD COLUMN {column}')
+                print(f"Added {column.split()[0]} column to tweet table")
+            except:
+                pass  # Column already exists
+        
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tweet_account_posted ON tweet (twitter_account_id, status, posted_at)')
+        
+        # Add next_metrics_at column to tweet (metrics collector schedule; NULL = not collected)
+        try:
+            conn.execute('ALTER TABLE tweet ADD COLUMN next_metrics_at DATETIME')
+            print("Added next_metrics_at column to tweet table")
+            conn.execute(
+                "UPDATE tweet SET next_metrics_at = COALESCE(posted_at, ?) WHERE status = 'posted' AND twitter_id IS NOT NULL",
+                (datetime.utcnow().isoformat(),)
+            )
+        except:
+            pass  # Column already exists
+        
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tweet_next_metrics ON tweet (status, next_metrics_at) WHERE next_metrics_at IS NOT NULL')
+        
+        # Add claimed_at column to tweet (when the dispatcher took a tweet; only read while status = 'posting')
+        try:
+            conn.execute('ALTER TABLE tweet ADD COLUMN claimed_at DATETIME')
+            print("Added claimed_at column to tweet table")
+        except:
+            pass  # Column already exists
+        
+        # Metrics snapshots (written only when a count changes) and the latest values per tweet
+        metric_columns = ', '.join(f'{field} INTEGER' for field in METRIC_FIELDS)
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS tweet_metrics (
+                tweet_id INTEGER NOT NULL,
+                fetched_at DATETIME NOT NULL,
+                {metric_columns},
+                PRIMARY KEY (tweet_id, fetched_at)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS tweet_metrics_latest (
+                tweet_id INTEGER PRIMARY KEY,
+                twitter_account_id INTEGER NOT NULL,
+                {metric_columns},
+                fetched_at DATETIME NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_metrics_latest_account ON tweet_metrics_latest (twitter_account_id)')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS tweet_metrics_ad AFTER DELETE ON tweet BEGIN
+                DELETE FROM tweet_metrics WHERE tweet_id = old.id;
+                DELETE FROM tweet_metrics_latest WHERE tweet_id = old.id;
+            END
+        ''')
+        
+        # Create tweet_thread table
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS tweet_thread (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                twitter_account_id INTEGER NOT NULL,
+                status TEXT DEFAULT 'pending',
+                in_reply_to_tweet_id TEXT,
+                last_error TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME,
+                FOREIGN KEY (twitter_account_id) REFERENCES twitter_account (id)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tweet_thread_status ON tweet_thread (status, created_at)')
+        
+        # Backfill hashes for tweets created before the column existed
+        while True:
+            rows = conn.execute('SELECT id, content FROM tweet WHERE content_hash IS NULL LIMIT 1000').fetchall()
+            if not rows:
+                break
+            conn.executemany(
+                'UPDATE tweet SET content_hash = ? WHERE id = ?',
+                [(content_hash(row['content']), row['id']) for row in rows]
+            )
+        
         # Create twitter_list table
         conn.execute('''
             CREATE TABLE IF NOT EXISTS twitter_list (
@@ -1744,6 +6876,271 @@ def init_database():
             )
         ''')
         
+        # Reconciliation checkpoint per list (pagination token and members seen so far while in progress)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS list_sync (
+                list_id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,
+                pagination_token TEXT,
+                seen_account_ids TEXT,
+                unmanaged_count INTEGER DEFAULT 0,
+                pages INTEGER DEFAULT 0,
+                member_count INTEGER,
+                added INTEGER DEFAULT 0,
+                removed INTEGER DEFAULT 0,
+                error TEXT,
+                synced_at DATETIME,
+                FOREIGN KEY (list_id) REFERENCES twitter_list(id) ON DELETE CASCADE
+            )
+        ''')
+
+        # Full-text index over tweet content (external content table kept in sync by triggers)
+        try:
+            fts_exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tweet_fts'"
+            ).fetchone()
+            conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS tweet_fts USING fts5(
+                    content,
+                    content='tweet',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS tweet_fts_ai AFTER INSERT ON tweet BEGIN
+                    INSERT INTO tweet_fts(rowid, content) VALUES (new.id, new.content);
+                END
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS tweet_fts_ad AFTER DELETE ON tweet BEGIN
+                    INSERT INTO tweet_fts(tweet_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                END
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS tweet_fts_au AFTER UPDATE OF content ON tweet BEGIN
+                    INSERT INTO tweet_fts(tweet_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                    INSERT INTO tweet_fts(rowid, content) VALUES (new.id, new.content);
+                END
+            ''')
+            if not fts_exists:
+                # Index tweets that existed before the FTS table
+                conn.execute("INSERT INTO tweet_fts(tweet_fts) VALUES ('rebuild')")
+                print("Created tweet_fts full-text index")
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search disabled (FTS5 not available): {e}")
+
+        # Daily rollups for reports, kept current by triggers. A tweet counts on its posted day
+        # (created day until posted) under its current status; list rows count posts by members at posting time.
+        rollup_exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tweet_daily'"
+        ).fetchone()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS tweet_daily (
+                twitter_account_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                status TEXT NOT NULL,
+                tweet_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (twitter_account_id, day, status)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tweet_daily_day ON tweet_daily (day, status)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS list_daily (
+                list_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                posted_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (list_id, day)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_list_daily_day ON list_daily (day)')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS tweet_daily_ai AFTER INSERT ON tweet BEGIN
+                INSERT INTO tweet_daily (twitter_account_id, day, status, tweet_count)
+                VALUES (new.twitter_account_id, date(COALESCE(new.posted_at, new.created_at)), new.status, 1)
+                ON CONFLICT DO UPDATE SET tweet_count = tweet_count + 1;
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS tweet_daily_ad AFTER DELETE ON tweet BEGIN
+                UPDATE tweet_daily SET tweet_count = tweet_count - 1
+                WHERE twitter_account_id = old.twitter_account_id
+                  AND day = date(COALESCE(old.posted_at, old.created_at)) AND status = old.status;
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS tweet_daily_au AFTER UPDATE OF status, posted_at, twitter_account_id ON tweet
+            WHEN old.status IS NOT new.status OR old.posted_at IS NOT new.posted_at
+              OR old.twitter_account_id IS NOT new.twitter_account_id
+            BEGIN
+                UPDATE tweet_daily SET tweet_count = tweet_count - 1
+                WHERE twitter_account_id = old.twitter_account_id
+                  AND day = date(COALESCE(old.posted_at, old.created_at)) AND status = old.status;
+                INSERT INTO tweet_daily (twitter_account_id, day, status, tweet_count)
+                VALUES (new.twitter_account_id, date(COALESCE(new.posted_at, new.created_at)), new.status, 1)
+                ON CONFLICT DO UPDATE SET tweet_count = tweet_count + 1;
+            END
+        ''')
+        # Count the first posting only: a failed remote delete moves 'deleting' back to 'posted'
+        conn.execute('DROP TRIGGER IF EXISTS list_daily_au')
+        conn.execute('''
+            CREATE TRIGGER list_daily_au AFTER UPDATE OF status ON tweet
+            WHEN new.status = 'posted' AND old.status NOT IN ('posted', 'deleting', 'deleted')
+            BEGIN
+                INSERT INTO list_daily (list_id, day, posted_count)
+                SELECT list_id, date(COALESCE(new.posted_at, new.created_at)), 1
+                FROM list_membership WHERE account_id = new.twitter_account_id
+                ON CONFLICT DO UPDATE SET posted_count = posted_count + 1;
+            END
+        ''')
+        if not rollup_exists:
+            # Count tweets that existed before the rollups (list rows use current membership)
+            conn.execute('''
+                INSERT INTO tweet_daily (twitter_account_id, day, status, tweet_count)
+                SELECT twitter_account_id, date(COALESCE(posted_at, created_at)), status, COUNT(*)
+                FROM tweet GROUP BY 1, 2, 3
+            ''')
+            conn.execute('''
+                INSERT INTO list_daily (list_id, day, posted_count)
+                SELECT lm.list_id, date(COALESCE(t.posted_at, t.created_at)), COUNT(*)
+                FROM tweet t JOIN list_membership lm ON lm.account_id = t.twitter_account_id
+                WHERE t.status IN ('posted', 'deleted') GROUP BY 1, 2
+            ''')
+            print("Created daily rollup tables")
+
+        # Create media tables (files stored once per content hash, uploads cached per account)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS media_asset (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sha256 TEXT UNIQUE NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mime_type TEXT NOT NULL,
+                media_category TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS media_upload (
+                asset_id INTEGER NOT NULL,
+                account_id INTEGER NOT NULL,
+                media_id TEXT NOT NULL,
+                expires_at DATETIME NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (asset_id, account_id),
+                FOREIGN KEY (asset_id) REFERENCES media_asset(id) ON DELETE CASCADE
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS tweet_media (
+                tweet_id INTEGER NOT NULL,
+                asset_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                PRIMARY KEY (tweet_id, position),
+                FOREIGN KEY (tweet_id) REFERENCES tweet(id) ON DELETE CASCADE,
+                FOREIGN KEY (asset_id) REFERENCES media_asset(id)
+            )
+        ''')
+        
+        # Create webhook tables (outbox rows are written in the same transaction as the change)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS webhook (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                secret TEXT NOT NULL,
+                events TEXT NOT NULL,
+                is_active BOOLEAN DEFAULT 1,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                last_success_at DATETIME,
+                last_error TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS webhook_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                webhook_id INTEGER NOT NULL,
+                event_type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                next_attempt_at DATETIME NOT NULL,
+                claimed_at DATETIME,
+                last_error TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                delivered_at DATETIME
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_webhook_outbox_due ON webhook_outbox (webhook_id, status, next_attempt_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_webhook_outbox_status ON webhook_outbox (status, next_attempt_at)')
+        
+        # Encrypt signing secrets stored in plaintext before they were encrypted at rest
+        for webhook in conn.execute('SELECT id, secret FROM webhook').fetchall():
+            if decrypt_token(webhook['secret']) == webhook['secret']:
+                conn.execute(
+                    'UPDATE webhook SET secret = ? WHERE id = ?',
+                    (get_fernet().encrypt(webhook['secret'].encode()).decode(), webhook['id'])
+                )
+        
+        # Create rate_limit table (last rate-limit headers seen per account and endpoint)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limit (
+                account_id INTEGER NOT NULL,
+                endpoint TEXT NOT NULL,
+                limit_total INTEGER,
+                remaining INTEGER,
+                reset_at DATETIME,
+                updated_at DATETIME,
+                PRIMARY KEY (account_id, endpoint)
+            )
+        ''')
+        
+        # Create job table for long-running operations
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS job (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                params TEXT,
+                total INTEGER DEFAULT 0,
+                succeeded INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                stats TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                started_at DATETIME,
+                finished_at DATETIME
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_job_kind ON job (kind, id)')
+        
+        # Create cache_version table (bumped by writes to invalidate cached GET responses in every worker)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_version (
+                scope TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        # Create event_log table (audit log) in its own database file
+        audit_conn = get_audit_db()
+        audit_conn.execute('PRAGMA auto_vacuum = INCREMENTAL')  # only takes effect on a new file
+        audit_conn.execute('PRAGMA journal_mode = WAL')
+        audit_conn.execute('''
+            CREATE TABLE IF NOT EXISTS event_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                occurred_at DATETIME NOT NULL,
+                event_type TEXT NOT NULL,
+                entity_type TEXT,
+                entity_id TEXT,
+                actor TEXT,
+                data TEXT
+            )
+        ''')
+        audit_conn.execute('CREATE INDEX IF NOT EXISTS idx_event_log_entity ON event_log (entity_type, entity_id, id)')
+        audit_conn.execute('CREATE INDEX IF NOT EXISTS idx_event_log_actor ON event_log (actor, id)')
+        audit_conn.execute('CREATE INDEX IF NOT EXISTS idx_event_log_time ON event_log (occurred_at)')
+        audit_conn.commit()
+        audit_conn.close()
+        
         # Insert API key from environment if not exists
         if VALID_API_KEY:
             key_hash = hashlib.sha256(VALID_API_KEY.encode()).hexdigest()
@@ -1753,13 +7150,82 @@ def init_database():
             except sqlite3.IntegrityError:
                 pass  # Key already exists
         
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         conn.commit()
         conn.close()
         print("Database initialized successfully")
     except Exception as e:
         print(f"Error initializing database: {e}")
 
+def schema_current():
+    """True if both databases exist and the main one is at SCHEMA_VERSION (one header read, no DDL)"""
+    if not os.path.exists(DB_PATH) or not os.path.exists(AUDIT_DB_PATH):
+        return False
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    conn.close()
+    return version >= SCHEMA_VERSION
+
+def apply_journal_mode():
+    """Switch the database to WAL when SQLITE_WAL is set (stored in the file; a header read once it is)"""
+    if not SQLITE_WAL:
+        return
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        if conn.execute('PRAGMA journal_mode').fetchone()[0] != 'wal':
+            conn.execute('PRAGMA journal_mode = WAL')
+    finally:
+        conn.close()
+
+def ensure_schema():
+    """Run init_database() if the schema is missing or older than SCHEMA_VERSION; returns True if it ran"""
+    if schema_current():
+        apply_journal_mode()  # init_database() only sets it when the schema changes
+        return False
+    
+    lock_fd = None
+    if fcntl is not None:
+        # Workers started without --preload race here; the first one migrates, the rest re-check
+        lock_fd = os.open(DB_PATH + '.init.lock', os.O_CREAT | os.O_RDWR, 0o600)
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+    try:
+        if schema_current():
+            apply_journal_mode()
+            return False
+        init_database()
+        return True
+    finally:
+        if lock_fd is not None:
+            os.close(lock_fd)
+
+def create_app(preload=False):
+    """WSGI entry point: check the schema once, then hand out the app
+
+    gunicorn 'app:create_app(preload=True)' --preload runs this once in the master: workers fork with
+    the schema checked and the Fernet cipher built, sharing those pages copy-on-write. Without
+    preload every worker imports cryptography on first use instead of at startup. requests is
+    imported normally: a lazily loaded module is not safe to resolve from several threads at once.
+    Background threads start per worker on its first request either way.
+    """
+    ensure_schema()
+    if preload:
+        get_fernet()
+    return app
+
 if __name__ == '__main__':
+    # python app.py backup [--incremental] [--force] | python app.py restore <backup> <dest>
+    if sys.argv[1:2] == ['backup']:
+        result = run_backup(incremental='--incremental' in sys.argv, force='--force' in sys.argv)
+        print(json.dumps(result, indent=2))
+        sys.exit(0 if result['status'] in ('ok', 'skipped') else 1)
+    if sys.argv[1:2] == ['restore']:
+        if len(sys.argv) != 4:
+            print("Usage: python app.py restore <backup file> <destination>")
+            sys.exit(2)
+        problems = restore_backup(sys.argv[2], sys.argv[3])
+        print("\n".join(problems) if problems else f"Restored {sys.argv[2]} to {sys.argv[3]} (integrity ok)")
+        sys.exit(1 if problems else 0)
+    
     print(f"Database path: {DB_PATH}")
     print(f"Database exists: {os.path.exists(DB_PATH)}")
     print(f"Twitter Callback URL: {TWITTER_CALLBACK_URL}")
@@ -1776,18 +7242,57 @@ if __name__ == '__main__':
     print("\nAvailable endpoints:")
     print("  GET  /api/v1/health (no auth)")
     print("  GET  /api/v1/test")
+    print("  GET  /api/v1/admission - Concurrency limits and busy slots")
     print("  GET  /api/v1/accounts")
     print("  GET  /api/v1/accounts/<id>")
     print("  POST /api/v1/tweet")
+    print("  POST /api/v1/tweets/bulk - Create many tweets")
+    print("  POST /api/v1/import - Stream CSV/NDJSON import")
+    print("  GET  /api/v1/import/<id> - Import report")
     print("  GET  /api/v1/tweets")
+    print("  GET  /api/v1/tweets/search?q= - Full-text search over tweets")
+    print("  GET  /api/v1/tweets/duplicates - Duplicate content report")
     print("  GET  /api/v1/auth/twitter - Start OAuth flow")
     print("  GET/POST /api/v1/auth/callback - OAuth callback")
     print("  GET  /api/v1/stats")
     print("\nTwitter posting endpoints:")
     print("  POST /api/v1/tweet/post/<id> - Post specific tweet")
-    print("  POST /api/v1/tweets/post-pending - Post all pending tweets")
+    print("  POST /api/v1/tweets/post-pending - Post next batch of pending tweets")
+    print("  POST /api/v1/tweets/broadcast - Post from many accounts at once")
+    print("  GET  /api/v1/jobs/<id> - Job status and stats")
+    print("  GET  /api/v1/jobs/<id>/events - Job progress stream (SSE)")
+    print("  GET  /api/v1/events - Event stream for all jobs (SSE)")
+    print("  POST /api/v1/media - Upload media for tweets")
+    print("  GET  /api/v1/media/<id> - Get media details")
+    print("\nMetrics endpoints:")
+    print("  POST /api/v1/metrics/collect - Collect due tweet metrics now")
+    print("  GET  /api/v1/tweets/<id>/metrics - Tweet metrics and history")
+    print("  GET  /api/v1/accounts/<id>/metrics - Account metric totals")
+    print("  GET  /api/v1/lists/<id>/metrics - List metric totals per member")
+    print("\nReport endpoints:")
+    print("  GET  /api/v1/capacity - Backlog drain estimate per account")
+    print("  GET  /api/v1/reports/tweets - Tweet counts per day/month/account")
+    print("  GET  /api/v1/reports/lists - Tweets posted by list members per day/month")
+    print("\nBackup endpoints:")
+    print("  POST /api/v1/admin/backup - Online backup (full or incremental)")
+    print("  GET  /api/v1/admin/backups - List backups")
+    print("\nWebhook endpoints:")
+    print("  POST   /api/v1/webhooks - Register webhook")
+    print("  GET    /api/v1/webhooks - List webhooks")
+    print("  DELETE /api/v1/webhooks/<id> - Delete webhook")
+    print("  GET    /api/v1/webhooks/<id>/deliveries - Recent deliveries")
+    print("  POST   /api/v1/webhooks/<id>/redeliver - Retry dead events")
+    print("\nAudit log endpoints:")
+    print("  GET  /api/v1/audit - Query audit log")
+    print("  POST /api/v1/audit/prune - Apply retention policy")
+    print("\nThread endpoints:")
+    print("  POST /api/v1/threads - Create a thread")
+    print("  GET  /api/v1/threads/<id> - Get thread details")
+    print("  POST /api/v1/threads/<id>/post - Post (or resume) a thread")
+    print("  POST /api/v1/threads/post-pending - Post pending threads in parallel")
     print("\nAccount type management:")
     print("  POST   /api/v1/accounts/<id>/set-type - Set account type (managed/list_owner)")
+    print("  POST   /api/v1/accounts/probe - Verify account credentials")
     print("  GET    /api/v1/accounts?type=list_owner - Get accounts by type")
     print("\nList management endpoints:")
     print("  POST   /api/v1/lists - Create a new list")
@@ -1798,12 +7303,15 @@ if __name__ == '__main__':
     print("\nList membership endpoints:")
     print("  POST   /api/v1/lists/<id>/members - Add accounts to list")
     print("  GET    /api/v1/lists/<id>/members - Get list members")
+    print("  PUT    /api/v1/lists/<id>/members - Set list members")
     print("  DELETE /api/v1/lists/<id>/members/<account_id> - Remove from list")
+    print("  POST   /api/v1/lists/reconcile - Reconcile list membership with Twitter")
     print("\nCleanup endpoints:")
     print("  DELETE /api/v1/accounts/<id> - Delete account and its tweets")
     print("  POST   /api/v1/accounts/cleanup - Delete inactive accounts")
     print("  DELETE /api/v1/tweets/<id> - Delete specific tweet")
     print("  POST   /api/v1/tweets/cleanup - Delete tweets by criteria")
+    print("  POST   /api/v1/tweets/delete-remote - Delete posted tweets on Twitter")
     print("\nMock mode is DISABLED - tweets will be posted to Twitter!")
     
     app.run(debug=True, port=5555)
\ No newline at end of file
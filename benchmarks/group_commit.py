@@ -0,0 +1,112 @@
+"""
+Benchmark POST /api/v1/tweet with and without group commit.
+
+Runs the app in-process against a throwaway database and sends requests from
+many threads, first with one commit per request, then with TWEET_GROUP_COMMIT.
+This is the topology of one threaded gunicorn worker (--threads); sync workers
+serve one request per process and never form a batch.
+
+Usage:
+    python benchmarks/group_commit.py --threads 32 --requests 4000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Keep background workers quiet and make every request valid
+os.environ.setdefault('API_KEY', 'benchmark-key')
+os.environ['ACCOUNT_PROBE_ENABLED'] = 'false'
+os.environ['METRICS_ENABLED'] = 'false'
+os.environ['WEBHOOK_WORKER_ENABLED'] = 'false'
+os.environ['DUPLICATE_POLICY'] = 'allow'
+
+import app as twitter_app  # noqa: E402
+
+
+def setup_database(directory, wal):
+    """Point the app at a fresh database with one account"""
+    twitter_app.DB_PATH = os.path.join(directory, 'benchmark.db')
+    twitter_app.AUDIT_DB_PATH = os.path.join(directory, 'audit.db')
+    twitter_app.EVENT_LOG_PATH = os.path.join(directory, 'events.ndjson')
+    twitter_app.ADMISSION_DIR = os.path.join(directory, 'admission')
+    twitter_app.SQLITE_WAL = wal
+    twitter_app.init_database()
+    
+    conn = twitter_app.get_db()
+    cursor = conn.execute(
+        "INSERT INTO twitter_account (username, access_token, status, created_at) VALUES ('bench', 'x', 'active', ?)",
+        (time.strftime('%Y-%m-%dT%H:%M:%S'),)
+    )
+    conn.commit()
+    account_id = cursor.lastrowid
+    conn.close()
+    return account_id
+
+
+def run(label, group_commit, threads, total, wal):
+    """Send total requests from threads clients and print throughput and latency"""
+    with tempfile.TemporaryDirectory() as directory:
+        account_id = setup_database(directory, wal)
+        twitter_app.TWEET_GROUP_COMMIT = group_commit
+        headers = {'X-API-Key': os.environ['API_KEY']}
+        per_thread = total // threads
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        
+        def client(worker):
+            test_client = twitter_app.app.test_client()
+            mine = []
+            for i in range(per_thread):
+                started = time.perf_counter()
+                response = test_client.post('/api/v1/tweet', headers=headers, json={
+                    'account_id': account_id,
+                    'text': f'benchmark tweet {worker}-{i}'
+                })
+                mine.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 201:
+                    errors.append(response.get_json())
+            with lock:
+                latencies.extend(mine)
+        
+        workers = [threading.Thread(target=client, args=(n,)) for n in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        
+        conn = twitter_app.get_db()
+        rows = conn.execute('SELECT COUNT(*) FROM tweet').fetchone()[0]
+        conn.close()
+    
+    latencies.sort()
+    print(f"{label:<24} {len(latencies) / elapsed:>9.0f} req/s   "
+          f"p50 {statistics.median(latencies):>7.2f} ms   "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:>7.2f} ms   "
+          f"rows {rows}   errors {len(errors)}")
+    if errors:
+        print(f"  first error: {errors[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--wal', action='store_true', help='run with SQLITE_WAL enabled')
+    args = parser.parse_args()
+    
+    print(f"{args.requests} requests from {args.threads} threads (journal: {'WAL' if args.wal else 'rollback'})")
+    run('commit per request', False, args.threads, args.requests, args.wal)
+    run('group commit', True, args.threads, args.requests, args.wal)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark cold start: import time, create_app() and first-request latency per worker.
+
+"cold" starts every worker as a fresh interpreter that imports the app itself
+(gunicorn without --preload). "eager" is the same but imports cryptography
+up front, as the app did before the Fernet cipher was built on first use. "preload"
+imports the app and runs create_app() once, then forks the workers (gunicorn
+--preload); each fork only pays for its first request.
+
+Run with bytecode caching on (PYTHONDONTWRITEBYTECODE unset) to match a server.
+
+Usage:
+    python benchmarks/startup.py --workers 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+# Keep background workers quiet
+os.environ.setdefault('API_KEY', 'benchmark-key')
+os.environ['ACCOUNT_PROBE_ENABLED'] = 'false'
+os.environ['METRICS_ENABLED'] = 'false'
+os.environ['WEBHOOK_WORKER_ENABLED'] = 'false'
+
+
+def point_at(twitter_app, directory):
+    """Use the benchmark database instead of instance/"""
+    twitter_app.DB_PATH = os.path.join(directory, 'benchmark.db')
+    twitter_app.AUDIT_DB_PATH = os.path.join(directory, 'audit.db')
+    twitter_app.EVENT_LOG_PATH = os.path.join(directory, 'events.ndjson')
+    twitter_app.ADMISSION_DIR = os.path.join(directory, 'admission')
+
+
+def first_requests(twitter_app):
+    """Latency (ms) of a worker's first and second authenticated request"""
+    client = twitter_app.app.test_client()
+    headers = {'X-API-Key': os.environ['API_KEY']}
+    timings = []
+    for _ in range(2):
+        started = time.perf_counter()
+        response = client.get('/api/v1/accounts', headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.get_json()
+    return {'first_request_ms': timings[0], 'second_request_ms': timings[1]}
+
+
+def worker(directory, eager):
+    """Run as a fresh interpreter: time the import, create_app() and the first requests"""
+    started = time.perf_counter()
+    if eager:
+        import cryptography.fernet  # noqa: F401
+    import app as twitter_app
+    imported = time.perf_counter()
+
+    point_at(twitter_app, directory)
+    schema_ran = not twitter_app.schema_current()
+    twitter_app.create_app()
+    created = time.perf_counter()
+
+    result = {
+        'import_ms': (imported - started) * 1000,
+        'create_app_ms': (created - imported) * 1000,
+        'schema_ran': schema_ran
+    }
+    result.update(first_requests(twitter_app))
+    print(json.dumps(result))
+
+
+def spawn(directory, eager=False):
+    """One cold worker in a subprocess"""
+    args = [sys.executable, os.path.abspath(__file__), '--worker', directory]
+    if eager:
+        args.append('--eager')
+    output = subprocess.run(args, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def preload(directory, workers):
+    """Import and create_app() once, then fork workers that each serve their first requests"""
+    started = time.perf_counter()
+    import app as twitter_app
+    imported = time.perf_counter()
+    point_at(twitter_app, directory)
+    twitter_app.create_app(preload=True)
+    created = time.perf_counter()
+
+    results = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            os.write(write_fd, json.dumps(first_requests(twitter_app)).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            result = json.loads(pipe.read())
+        os.waitpid(pid, 0)
+        result.update(import_ms=0.0, create_app_ms=0.0, schema_ran=False)
+        results.append(result)
+
+    master = {'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000}
+    return master, results
+
+
+def report(label, results):
+    """Print medians over the workers"""
+    def median(key):
+        return statistics.median(r[key] for r in results)
+    print(f"{label:<8} import {median('import_ms'):7.1f} ms   create_app {median('create_app_ms'):6.1f} ms   "
+          f"first request {median('first_request_ms'):6.1f} ms   second {median('second_request_ms'):5.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--worker', metavar='DIR', help=argparse.SUPPRESS)
+    parser.add_argument('--eager', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.eager)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        fresh = spawn(directory)
+        print(f"Fresh database: create_app {fresh['create_app_ms']:.1f} ms (schema created: {fresh['schema_ran']})")
+        print(f"Per worker, median of {args.workers}, existing database:")
+        report('cold', [spawn(directory) for _ in range(args.workers)])
+        report('eager', [spawn(directory, eager=True) for _ in range(args.workers)])
+
+        if hasattr(os, 'fork'):
+            master, results = preload(directory, args.workers)
+            print(f"Preload master: import {master['import_ms']:.1f} ms, create_app {master['create_app_ms']:.1f} ms, once")
+            report('preload', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,48 +6,52 @@
 APP_DIR="/home/ubuntu/twitter-manager"
 DB_PATH="$APP_DIR/instance/twitter_manager.db"
 BACKUP_DIR="$APP_DIR/backups"
-MAX_BACKUPS=7  # Keep 7 days of backups
-TIMESTAMP=$(date +%Y%m%d_%H%M%S)
-BACKUP_NAME="twitter_manager_backup_$TIMESTAMP.db"
+MAX_BACKUPS=7  # Keep 7 full backups
+BACKUP_MODE="${1:-full}"  # full, or incremental (only the pages changed since the last full backup)
 
 # Colors for output
 GREEN='\033[0;32m'
 RED='\033[0;31m'
 NC='\033[0m'
 
-# Create backup directory if it doesn't exist
-mkdir -p $BACKUP_DIR
-
 # Check if database exists
 if [ ! -f "$DB_PATH" ]; then
     echo -e "${RED}Error: Database not found at $DB_PATH${NC}"
     exit 1
 fi
 
-# Create backup
-echo "Creating backup: $BACKUP_NAME"
-cp $DB_PATH "$BACKUP_DIR/$BACKUP_NAME"
+# Create backup with the SQLite online backup API (safe while the app is writing);
+# the app verifies it with an integrity check, skips it if nothing changed and rotates old ones
+ARGS=""
+if [ "$BACKUP_MODE" = "incremental" ]; then
+    ARGS="--incremental"
+fi
 
-# Compress the backup
-gzip "$BACKUP_DIR/$BACKUP_NAME"
-BACKUP_NAME="$BACKUP_NAME.gz"
+echo "Creating $BACKUP_MODE backup..."
+cd $APP_DIR
+RESULT=$(BACKUP_DIR="$BACKUP_DIR" BACKUP_KEEP=$MAX_BACKUPS venv/bin/python app.py backup $ARGS)
+STATUS=$?
+echo "$RESULT"
 
-# Verify backup was created
-if [ -f "$BACKUP_DIR/$BACKUP_NAME" ]; then
-    echo -e "${GREEN}Backup created successfully: $BACKUP_DIR/$BACKUP_NAME${NC}"
-    
-    # Get backup size
-    BACKUP_SIZE=$(ls -lh "$BACKUP_DIR/$BACKUP_NAME" | awk '{print $5}')
-    echo "Backup size: $BACKUP_SIZE"
-else
+if [ $STATUS -ne 0 ]; then
     echo -e "${RED}Error: Backup creation failed${NC}"
+    echo "$(date): Backup failed" >> "$APP_DIR/logs/backup.log"
     exit 1
 fi
 
-# Rotate old backups (keep only MAX_BACKUPS)
-echo "Rotating old backups (keeping last $MAX_BACKUPS)..."
-cd $BACKUP_DIR
-ls -t twitter_manager_backup_*.db.gz | tail -n +$((MAX_BACKUPS + 1)) | xargs -r rm -v
+if echo "$RESULT" | grep -q '"status": "skipped"'; then
+    echo -e "${GREEN}Database unchanged since the last backup, nothing to do${NC}"
+    echo "$(date): Backup skipped (unchanged)" >> "$APP_DIR/logs/backup.log"
+    exit 0
+fi
+
+BACKUP_FILE=$(echo "$RESULT" | grep '"file"' | sed 's/.*"file": "\(.*\)".*/\1/')
+BACKUP_NAME=$(basename "$BACKUP_FILE")
+echo -e "${GREEN}Backup created successfully: $BACKUP_FILE${NC}"
+
+# Get backup size
+BACKUP_SIZE=$(ls -lh "$BACKUP_FILE" | awk '{print $5}')
+echo "Backup size: $BACKUP_SIZE"
 
 # Optional: Copy to S3 (uncomment and configure if using S3)
 # if command -v aws &> /dev/null; then
@@ -63,4 +67,4 @@ echo ""
 echo "Backup Summary:"
 echo "---------------"
 echo "Current backups in $BACKUP_DIR:"
-ls -lht $BACKUP_DIR/*.gz | head -n $MAX_BACKUPS
\ No newline at end of file
+ls -lht $BACKUP_DIR/twitter_manager_* | head -n 20
\ No newline at end of file
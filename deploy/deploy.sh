@@ -98,6 +98,12 @@ sudo systemctl daemon-reload
 sudo systemctl enable twitter-manager
 sudo systemctl start twitter-manager
 
+# Optional standalone dispatcher (installed, not enabled)
+sudo cp deploy/dispatcher.service /etc/systemd/system/twitter-manager-dispatcher.service
+sudo systemctl daemon-reload
+echo "To post from the dispatcher daemon: set DISPATCHER_DAEMON=true in .env, then run"
+echo "  sudo systemctl enable --now twitter-manager-dispatcher && sudo systemctl restart twitter-manager"
+
 # Step 9: Configure Nginx
 echo -e "${YELLOW}Step 9: Configuring Nginx...${NC}"
 sudo cp deploy/nginx.conf /etc/nginx/sites-available/twitter-manager
@@ -120,6 +126,7 @@ source venv/bin/activate
 git pull
 pip install -r requirements.txt
 sudo systemctl restart twitter-manager
+sudo systemctl try-restart twitter-manager-dispatcher
 sudo systemctl restart nginx
 echo "Application updated successfully!"
 EOF
@@ -0,0 +1,336 @@
+"""
+Standalone tweet dispatcher.
+
+Posts pending tweets from one asyncio event loop, keeping up to DISPATCHER_CONCURRENCY
+requests to Twitter in flight across accounts (DISPATCHER_PER_ACCOUNT per account).
+Tweets are claimed from the tweet table in batches (status "posting") and the results
+are written back in grouped transactions. SIGTERM or SIGINT stops claiming and drains
+the requests already sent; claimed tweets that were not sent yet go back to pending.
+
+Run it next to the web app with DISPATCHER_DAEMON=true so the web tier only enqueues.
+Thread tweets are still posted by the thread endpoints.
+
+Usage:
+    python dispatcher.py [--once] [--mock]
+"""
+import argparse
+import asyncio
+import random
+import signal
+import sqlite3
+import time
+from datetime import datetime
+
+import httpx
+
+import app as twitter_app
+
+TWEETS_URL = 'https://api.twitter.com/2/tweets'
+STATUS_INTERVAL_SECONDS = 60
+WRITE_ATTEMPTS = 10
+
+
+class Dispatcher:
+    """Claim, post and record tweets until stopped (or, with once, until the queue is empty)"""
+
+    def __init__(self, client, once=False):
+        self.client = client
+        self.once = once
+        self.stopping = asyncio.Event()
+        self.tasks = {}  # task -> tweet id
+        self.sent = set()  # tweet ids whose request has gone out, until their task finishes
+        self.holding = {}  # (account id, content hash) -> (tweet id, Event set once its outcome is written)
+        self.account_slots = {}
+        self.limited_until = {}  # account id -> time.monotonic() when its 429 window resets
+        self.unauthorized = set()  # accounts Twitter answered 401 for, until a claim returns them again
+        self.results = asyncio.Queue()
+        self.stats = {'claimed': 0, 'posted': 0, 'failed': 0, 'deferred': 0, 'released': 0, 'abandoned': 0}
+
+    def stop(self):
+        """Signal handler: stop claiming and drain"""
+        if not self.stopping.is_set():
+            print(f"Stopping: draining {len(self.tasks)} claimed tweets (up to {twitter_app.DISPATCHER_DRAIN_SECONDS:g}s)")
+            self.stopping.set()
+
+    async def run(self):
+        """Claim loop; returns once stopped and drained"""
+        writer = asyncio.create_task(self.write_results())
+        batch_size = min(twitter_app.DISPATCH_BATCH_SIZE, twitter_app.DISPATCHER_CONCURRENCY)
+        reported = time.monotonic()
+
+        while not self.stopping.is_set():
+            room = twitter_app.DISPATCHER_CONCURRENCY - len(self.tasks)
+            # Claim in batches: wait until at least half a batch of room is free
+            if room < max(batch_size // 2, 1):
+                await self.pause(wait_for_posts=True)
+                continue
+
+            want = min(batch_size, room)
+            claimed = await asyncio.to_thread(self.claim, want)
+            # Claims skip token_expired accounts, so one that comes back was re-authorized
+            self.unauthorized -= {job['tweet']['twitter_account_id'] for job in claimed}
+            for job in claimed:
+                task = asyncio.create_task(self.post(job))
+                self.tasks[task] = job['tweet']['id']
+                task.add_done_callback(self.finished)
+            self.stats['claimed'] += len(claimed)
+
+            if time.monotonic() - reported >= STATUS_INTERVAL_SECONDS:
+                reported = time.monotonic()
+                print(f"Dispatcher: {len(self.tasks)} in flight, {self.stats}")
+
+            if len(claimed) < want:
+                # Queue drained (or the rest is rate limited)
+                if self.once and not self.tasks:
+                    break
+                await self.pause(wait_for_posts=self.once)
+
+        await self.drain()
+        await self.results.put(None)
+        await writer
+
+    def finished(self, task):
+        """Done callback of a post task"""
+        self.sent.discard(self.tasks.pop(task))
+
+    async def pause(self, wait_for_posts):
+        """Wait for a post to finish (or the poll interval when the queue is empty), or for shutdown"""
+        stop = asyncio.create_task(self.stopping.wait())
+        waiters = {stop} | (set(self.tasks) if wait_for_posts else set())
+        timeout = twitter_app.DISPATCHER_POLL_SECONDS * random.uniform(0.8, 1.2)
+        await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        stop.cancel()
+
+    async def drain(self):
+        """Give sent requests DISPATCHER_DRAIN_SECONDS to finish; unsent claims go back to pending"""
+        for task, tweet_id in list(self.tasks.items()):
+            if tweet_id not in self.sent:
+                task.cancel()
+        if not self.tasks:
+            return
+
+        _, unfinished = await asyncio.wait(list(self.tasks), timeout=twitter_app.DISPATCHER_DRAIN_SECONDS)
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+        if unfinished:
+            # The outcome is unknown; they stay "posting" until claimed again after DISPATCHER_STALE_MINUTES
+            self.stats['abandoned'] += len(unfinished)
+            print(f"Dispatcher: {len(unfinished)} requests did not finish in time and stay claimed")
+
+    def claim(self, limit):
+        """Claim a batch and load what posting it needs (runs in a thread)"""
+        conn = twitter_app.get_db()
+        try:
+            batch = twitter_app.claim_dispatch_batch(conn, limit, twitter_app.DISPATCH_ACCOUNT_CAP)
+            if not batch:
+                return []
+
+            account_ids = sorted({tweet['twitter_account_id'] for tweet in batch})
+            accounts = {
+                row['id']: row for row in conn.execute(
+                    f"SELECT id, username, access_token, access_token_secret FROM twitter_account WHERE id IN ({','.join('?' * len(account_ids))})",
+                    account_ids
+                ).fetchall()
+            }
+            return [{
+                'tweet': dict(tweet),
+                'account': accounts.get(tweet['twitter_account_id']),
+                'duplicate': twitter_app.check_dispatch_duplicate(conn, tweet),
+                'duplicate_key': self.duplicate_key(tweet),
+                'media': twitter_app.get_tweet_media(conn, tweet['id'])
+            } for tweet in batch]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def duplicate_key(tweet):
+        """Copies of a text from one account share this key (None when duplicates are not checked)"""
+        if twitter_app.DUPLICATE_POLICY == 'allow' or not (tweet['content'] or '').strip():
+            return None
+        return tweet['twitter_account_id'], tweet['content_hash'] or twitter_app.content_hash(tweet['content'])
+
+    async def post(self, job):
+        """Post one claimed tweet and queue its result"""
+        tweet = job['tweet']
+        slot = self.account_slots.setdefault(tweet['twitter_account_id'], asyncio.Semaphore(twitter_app.DISPATCHER_PER_ACCOUNT))
+        try:
+            await self.hold_text(job)
+            async with slot:
+                item = await self.send(job)
+        except asyncio.CancelledError:
+            if tweet['id'] not in self.sent:
+                self.stats['released'] += 1
+                self.results.put_nowait(self.result(job, 'deferred', 'Dispatcher stopped before sending'))
+            raise
+
+        self.stats[{'posted': 'posted', 'deferred': 'deferred'}.get(item['outcome'], 'failed')] += 1
+        await self.results.put(item)
+
+    async def hold_text(self, job):
+        """Wait while another claimed copy of the same text is posting, then check again against posted tweets"""
+        key = job['duplicate_key']
+        while key is not None and not job['duplicate']:
+            holder = self.holding.get(key)
+            if holder is None:
+                self.holding[key] = (job['tweet']['id'], asyncio.Event())
+                return
+            await holder[1].wait()
+            job['duplicate'] = await asyncio.to_thread(self.check_duplicate, job['tweet'])
+
+    def check_duplicate(self, tweet):
+        conn = twitter_app.get_db()
+        try:
+            return twitter_app.check_dispatch_duplicate(conn, tweet)
+        finally:
+            conn.close()
+
+    def result(self, job, outcome, result, response=None):
+        """One entry for record_dispatch_results()"""
+        account = job['account']
+        return {
+            'tweet_id': job['tweet']['id'],
+            'account_id': job['tweet']['twitter_account_id'],
+            'username': account['username'] if account else None,
+            'outcome': outcome,
+            'result': result,
+            'response': response
+        }
+
+    async def send(self, job):
+        """The Twitter request for one tweet; returns its result entry"""
+        tweet = job['tweet']
+        account = job['account']
+        account_id = tweet['twitter_account_id']
+
+        if account is None:
+            return self.result(job, 'failed', 'Account not found')
+        if job['duplicate']:
+            return self.result(job, 'failed', job['duplicate'])
+        if self.limited_until.get(account_id, 0) > time.monotonic():
+            return self.result(job, 'deferred', 'Rate limited')
+        if account_id in self.unauthorized:
+            return self.result(job, 'deferred', 'Token rejected')
+        if twitter_app.mock_mode_override['enabled']:
+            self.sent.add(tweet['id'])
+            return self.result(job, 'posted', f"mock_{datetime.now().timestamp()}")
+        if account['access_token_secret'] and account['access_token_secret'].strip():
+            return self.result(job, 'failed', 'OAuth 1.0a not supported. Please re-authorize with OAuth 2.0.')
+
+        try:
+            access_token = twitter_app.decrypt_token(account['access_token'])
+            data = {'text': tweet['content']} if tweet['content'] else {}
+            if job['media']:
+                # Uploads are rare; they reuse the app's (blocking) chunked uploader and its cache
+                data['media'] = {'media_ids': list(await asyncio.gather(*(
+                    asyncio.to_thread(twitter_app.ensure_media_uploaded, asset_id, account_id, access_token)
+                    for asset_id in job['media']
+                )))}
+
+            self.sent.add(tweet['id'])
+            response = await self.client.post(
+                TWEETS_URL,
+                headers={'Authorization': f'Bearer {access_token}'},
+                json=data
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return self.result(job, 'failed', f"Exception during posting: {e}")
+
+        if response.status_code == 201:
+            return self.result(job, 'posted', response.json()['data']['id'], response)
+
+        error = f"Twitter API error (status {response.status_code}): {response.text}"
+        if response.status_code == 429:
+            # Hold the account's other claimed tweets back until the window resets
+            reset = response.headers.get('x-rate-limit-reset')
+            wait = int(reset) - time.time() if reset else twitter_app.TWEET_RATE_WINDOW_MINUTES * 60
+            self.limited_until[account_id] = time.monotonic() + max(wait, 1)
+            return self.result(job, 'deferred', error, response)
+        print(error)
+        if response.status_code == 401:
+            self.unauthorized.add(account_id)
+            return self.result(job, 'unauthorized', error, response)
+        return self.result(job, 'failed', error, response)
+
+    async def write_results(self):
+        """Write queued results, up to DISPATCHER_WRITE_BATCH per transaction"""
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            item = await self.results.get()
+            if item is None:
+                break
+            group = [item]
+            deadline = loop.time() + twitter_app.DISPATCHER_WRITE_MAX_WAIT_MS / 1000
+            while len(group) < twitter_app.DISPATCHER_WRITE_BATCH:
+                try:
+                    item = await asyncio.wait_for(self.results.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    done = True
+                    break
+                group.append(item)
+            await self.write(group)
+
+    async def write(self, group):
+        """One transaction for a group of results, retried while the database is busy"""
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                await asyncio.to_thread(self.write_group, group)
+            except sqlite3.Error as e:
+                print(f"Dispatcher: writing {len(group)} results failed (attempt {attempt}): {e}")
+                await asyncio.sleep(min(attempt, 5))
+                continue
+            # The outcomes are in the database now, so the next claim's duplicate check sees them
+            written = {item['tweet_id'] for item in group}
+            for key, (tweet_id, released) in list(self.holding.items()):
+                if tweet_id in written:
+                    del self.holding[key]
+                    released.set()
+            return
+        # Keep holding their texts: those tweets may be on Twitter but still look claimed
+        print(f"Dispatcher: gave up writing results: {[(item['tweet_id'], item['outcome'], item['result']) for item in group]}")
+
+    def write_group(self, group):
+        conn = twitter_app.get_db()
+        try:
+            twitter_app.record_dispatch_results(conn, group)
+        finally:
+            conn.close()
+
+
+async def dispatch(once=False, transport=None):
+    """Run a dispatcher until SIGTERM/SIGINT (or an empty queue with once); returns its counters"""
+    limits = httpx.Limits(
+        max_connections=twitter_app.DISPATCHER_CONCURRENCY,
+        max_keepalive_connections=twitter_app.DISPATCHER_CONCURRENCY
+    )
+    async with httpx.AsyncClient(timeout=twitter_app.DISPATCHER_TIMEOUT_SECONDS, limits=limits, transport=transport) as client:
+        dispatcher = Dispatcher(client, once=once)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, dispatcher.stop)
+        await dispatcher.run()
+    return dispatcher.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Post pending tweets from an asyncio event loop')
+    parser.add_argument('--once', action='store_true', help='exit when the queue is empty')
+    parser.add_argument('--mock', action='store_true', help='mark tweets posted without calling Twitter')
+    args = parser.parse_args()
+
+    twitter_app.ensure_schema()
+    twitter_app.mock_mode_override['enabled'] = args.mock
+    print(f"Dispatcher started: up to {twitter_app.DISPATCHER_CONCURRENCY} posts in flight, "
+          f"{twitter_app.DISPATCHER_PER_ACCOUNT} per account")
+    stats = asyncio.run(dispatch(once=args.once))
+    twitter_app.flush_audit_buffer()
+    print(f"Dispatcher stopped: {stats}")
+
+
+if __name__ == '__main__':
+    main()